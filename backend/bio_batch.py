@@ -0,0 +1,263 @@
+"""
+Batch regeneration of AI profile texts (POST /employees/generate-bios, or
+python bio_batch.py from the command line).
+
+A batch is a row in the jobs table (kind "bio_batch"), so its progress is
+read like any other job: GET /api/jobs/{id} or the /events stream. The
+employees and all their CV data are loaded up front in a handful of queries.
+Completions then run on the event loop, at most BIO_BATCH_CONCURRENCY at a
+time. When the API still answers 429 after the client's own retries, every
+worker pauses for the time the API asked for (or an exponential backoff)
+before trying again. Results are written in bulk, every BIO_BATCH_WRITE_SIZE
+texts, in the same transaction as the progress on the job row, so a batch
+that stopped half way (failed calls, a restart) can be resumed and only does
+the employees that are not finished.
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import time
+import uuid
+
+from sqlalchemy import update
+
+import crud
+import jobs
+import models
+from database import get_async_session_local
+from utils import bio_writer
+
+BIO_BATCH_CONCURRENCY = 4
+BIO_BATCH_WRITE_SIZE = 10
+BIO_BATCH_ATTEMPTS = 5 # Per employee, counting rate-limited attempts only
+BIO_BATCH_MAX_BACKOFF = 60 # seconds
+
+KIND = "bio_batch"
+
+
+class BatchRunning(Exception):
+    pass
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat()
+
+
+_running = {} # job_id -> asyncio.Task, also keeps the tasks from being garbage collected
+
+
+async def _noop(text: str):
+    pass # Results are stored in bulk by the batch
+
+
+class _Batch:
+    def __init__(self, job_id: str, state: dict):
+        self.job_id = job_id
+        self.state = state # The job's result: params and progress, see create_batch
+        self.params = state["params"]
+        self.semaphore = asyncio.Semaphore(BIO_BATCH_CONCURRENCY)
+        self.write_lock = asyncio.Lock()
+        self.pending = [] # Generated texts not written yet: (employee_id, fingerprint, text)
+        self.paused_until = 0.0 # monotonic time; shared, since the rate limit is per API key
+
+    async def _generate(self, prompt: str, key: str) -> str:
+        for attempt in range(BIO_BATCH_ATTEMPTS):
+            delay = self.paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with self.semaphore:
+                try:
+                    # Joins an identical interactive request for the same employee, if one is running
+                    chunks = bio_writer.generate(key, prompt, _noop).follow()
+                    return "".join([chunk async for chunk in chunks])
+                except bio_writer.GenerationFailed as e:
+                    if not e.rate_limited or attempt == BIO_BATCH_ATTEMPTS - 1:
+                        raise
+                    backoff = e.retry_after or min(2 ** attempt, BIO_BATCH_MAX_BACKOFF) * (1 + random.random())
+                    print(f"Bio batch {self.job_id}: rate limited, pausing {backoff:.1f}s")
+                    self.paused_until = max(self.paused_until, time.monotonic() + backoff)
+
+    async def _process(self, employee):
+        prompt = bio_writer.build_prompt(employee)
+        key = bio_writer.fingerprint(prompt)
+        if not self.params["refresh"] and employee.generated_bio_fingerprint == key:
+            # Already current, e.g. generated from the CV page since the batch started
+            self.pending.append((employee.id, key, employee.generated_bio))
+        else:
+            try:
+                text = await self._generate(prompt, key)
+            except bio_writer.GenerationFailed as e:
+                self.state["failed"][str(employee.id)] = str(e)
+            else:
+                # Not appended in the same expression as the await: _write swaps the list meanwhile
+                self.pending.append((employee.id, key, text))
+                self.state["failed"].pop(str(employee.id), None)
+        if len(self.pending) >= BIO_BATCH_WRITE_SIZE:
+            await self._write()
+
+    async def _write(self, status: str = None, error: str = None):
+        """Stores the pending texts and the progress in one transaction."""
+        async with self.write_lock:
+            rows, self.pending = self.pending, []
+            completed = len(self.state["completed"])
+            self.state["completed"].extend(employee_id for employee_id, _, _ in rows)
+            try:
+                async with get_async_session_local()() as db:
+                    await db.run_sync(self._write_rows, rows, status, error)
+            except BaseException:
+                # Not stored (an error, or cancelled with the batch): not completed either
+                del self.state["completed"][completed:]
+                self.pending = rows + self.pending
+                raise
+
+    def _write_rows(self, db, rows, status, error):
+        if rows:
+            values = [{"id": employee_id, "generated_bio": text, "generated_bio_fingerprint": key}
+                      for employee_id, key, text in rows]
+            if self.params["apply"]:
+                for row in values:
+                    row["bio"] = row["generated_bio"]
+                crud.bump_versions(db, "employees", "projects") # Profile texts are in both responses
+            db.execute(update(models.Employee), values) # Bulk UPDATE by primary key
+        fields = {"result": dict(self.state), "updated_at": _now()}
+        if status:
+            fields.update(status=status, error=error)
+        db.query(models.Job).filter(models.Job.id == self.job_id).update(fields, synchronize_session=False)
+        db.commit()
+
+    async def run(self):
+        try:
+            async with get_async_session_local()() as db:
+                employees = await crud.get_employees_for_bios_async(
+                    db, employee_ids=self.state["employee_ids"])
+            done = set(self.state["completed"])
+            # An unexpected error (say the database in _write) cancels the other
+            # employees, and the group only returns once every task has stopped: no
+            # task is left writing progress after the job is marked failed (and resumable)
+            async with asyncio.TaskGroup() as group:
+                for employee in employees:
+                    if employee.id not in done:
+                        group.create_task(self._process(employee))
+            failed = self.state["failed"]
+            await self._write("failed" if failed else "done",
+                              f"{len(failed)} of {self.state['total']} employees failed, resume to retry" if failed else None)
+        except Exception as e:
+            if isinstance(e, ExceptionGroup):
+                e = e.exceptions[0]
+            print(f"Bio batch {self.job_id} failed: {e}")
+            await self._write("failed", str(e) or e.__class__.__name__)
+
+
+async def create_batch(employee_ids=None, title=None, company=None, project_id=None,
+                       refresh: bool = False, apply: bool = False) -> models.Job:
+    """
+    Records a batch for the employees matching all given criteria. refresh
+    regenerates texts that are current for the CV data; apply also replaces
+    the profile texts (otherwise the results only become the suggestion on
+    the CV page).
+    """
+    async with get_async_session_local()() as db:
+        # The set is fixed now, so a resumed batch does the same employees
+        employees = await crud.get_employees_for_bios_async(
+            db, employee_ids=employee_ids, title=title, company=company, project_id=project_id)
+        state = {
+            "params": {"employee_ids": employee_ids, "title": title, "company": company,
+                       "project_id": project_id, "refresh": refresh, "apply": apply},
+            "employee_ids": [e.id for e in employees],
+            "total": len(employees),
+            "completed": [],
+            "failed": {}, # employee id (as a string, JSON keys) -> error
+        }
+        job = models.Job(id=uuid.uuid4().hex, kind=KIND, status="queued", result=state,
+                         worker=jobs._worker_id(), created_at=_now(), updated_at=_now())
+        db.add(job)
+        await db.commit()
+        return job
+
+
+async def _execute(job_id: str) -> models.Job:
+    try:
+        async with get_async_session_local()() as db:
+            job = await db.get(models.Job, job_id)
+            if job is None or job.kind != KIND:
+                raise LookupError(job_id)
+            if job.status == "done":
+                return job
+            job.status, job.error, job.worker, job.updated_at = "running", None, jobs._worker_id(), _now()
+            await db.commit()
+            state = job.result
+
+        await _Batch(job_id, state).run()
+        async with get_async_session_local()() as db:
+            return await db.get(models.Job, job_id)
+    finally:
+        _running.pop(job_id, None)
+
+
+async def run_batch(job_id: str) -> models.Job:
+    """Runs (or resumes) the batch to the end. Raises BatchRunning if it is already running here."""
+    if job_id in _running:
+        raise BatchRunning()
+    _running[job_id] = asyncio.current_task()
+    return await _execute(job_id)
+
+
+def is_running(job_id: str) -> bool:
+    """Whether the batch is running (or finishing) in this worker."""
+    return job_id in _running
+
+
+def start_batch(job_id: str):
+    """Runs (or resumes) the batch in the background of this worker's event loop."""
+    if job_id in _running:
+        raise BatchRunning()
+    _running[job_id] = asyncio.create_task(_execute(job_id))
+
+
+def _print_progress(job):
+    state = job.result or {}
+    print(f"Bio batch {job.id}: {job.status}, {len(state.get('completed', []))}/{state.get('total', 0)} done, "
+          f"{len(state.get('failed', {}))} failed")
+    for employee_id, error in (state.get("failed") or {}).items():
+        print(f"  employee {employee_id}: {error}")
+
+
+async def _main(args):
+    if args.resume:
+        job_id = args.resume
+    else:
+        job = await create_batch(employee_ids=args.ids or None, title=args.title, company=args.company,
+                                 project_id=args.project, refresh=args.refresh, apply=args.apply)
+        job_id = job.id
+        print(f"Bio batch {job_id}: {job.result['total']} employees")
+
+    async def report():
+        while True:
+            await asyncio.sleep(5)
+            async with get_async_session_local()() as db:
+                _print_progress(await db.get(models.Job, job_id))
+
+    reporter = asyncio.create_task(report())
+    try:
+        job = await run_batch(job_id)
+    finally:
+        reporter.cancel()
+    _print_progress(job)
+    if job.status != "done":
+        print(f"Resume with: python bio_batch.py --resume {job_id}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerate AI profile texts for many employees.")
+    parser.add_argument("ids", nargs="*", type=int, help="Employee ids (default: everyone matching the filters)")
+    parser.add_argument("--title", help="Only employees whose title contains this")
+    parser.add_argument("--company", help="Only employees whose company contains this")
+    parser.add_argument("--project", type=int, help="Only the team of this project")
+    parser.add_argument("--refresh", action="store_true", help="Also regenerate texts that are current")
+    parser.add_argument("--apply", action="store_true", help="Replace the profile texts, not just the suggestions")
+    parser.add_argument("--resume", metavar="JOB_ID", help="Continue a batch that stopped")
+    args = parser.parse_args()
+    if not bio_writer.is_configured():
+        raise SystemExit("OPENAI_API_KEY is not set")
+    asyncio.run(_main(args))
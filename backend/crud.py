@@ -1,12 +1,339 @@
-from sqlalchemy.orm import Session
+import base64
+import datetime
+import functools
+import html
+import json
+import threading
+from typing import Optional
+
+from sqlalchemy import event, select, func, cast, type_coerce, and_, or_, true, literal, literal_column, union_all, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session, selectinload, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
 import schemas
+from database import get_session_local
+from utils import blobs, image_variants, read_cache
+from utils.storage import get_storage, key_from_url, url_for_key
+from utils import search as text_search
+
+# Loader strategies matching what the response schemas serialise.
+# Collections use selectinload (one extra IN-query per relationship, no row
+# multiplication); many-to-one hops use joinedload. This keeps the number of
+# statements per request constant instead of one lazy load per row.
+EMPLOYEE_CV_OPTIONS = (
+    selectinload(models.Employee.work_experiences),
+    selectinload(models.Employee.educations),
+    selectinload(models.Employee.certifications),
+)
+
+EMPLOYEE_DETAIL_OPTIONS = EMPLOYEE_CV_OPTIONS + (
+    selectinload(models.Employee.team_memberships).joinedload(models.ProjectTeamMember.project),
+)
+
+_team_employee = selectinload(models.Project.team_members).joinedload(models.ProjectTeamMember.employee)
+
+PROJECT_OPTIONS = (
+    selectinload(models.Project.images),
+    selectinload(models.Project.attachments),
+    _team_employee.selectinload(models.Employee.work_experiences),
+    _team_employee.selectinload(models.Employee.educations),
+    _team_employee.selectinload(models.Employee.certifications),
+)
+
+# Per-table write counters behind the ETags of the read endpoints (see
+# utils/http_cache.py). Every write bumps the tables whose responses it
+# changes, in the same transaction as the write, so all workers agree.
+# The same call invalidates the read caches (utils/read_cache.py) once the
+# transaction commits, in this process directly and elsewhere via NOTIFY.
+VERSIONED_TABLES = ("projects", "employees", "project_types")
+
+_versions_cache = read_cache.cache("table_versions", VERSIONED_TABLES, maxsize=32, clear_last=True)
+_types_cache = read_cache.cache("project_types", ["project_types"], maxsize=1)
+_tags_cache = read_cache.cache("tag_counts", ["projects"], maxsize=1)
+_summaries_cache = read_cache.cache("project_summaries", ["projects"], maxsize=256)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_read_caches(session):
+    tables = session.info.pop("bumped_tables", None)
+    if tables:
+        read_cache.invalidate(tables)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_bumped_tables(session):
+    session.info.pop("bumped_tables", None)
+
+def bump_versions(db: Session, *tables):
+    db.info.setdefault("bumped_tables", set()).update(tables)
+    if _is_postgres(db):
+        # Delivered to the other workers' listeners when (and only if) the write commits
+        db.execute(select(func.pg_notify(read_cache.NOTIFY_CHANNEL, ",".join(sorted(set(tables))))))
+    now = datetime.datetime.utcnow().isoformat()
+    updated = db.query(models.TableVersion).filter(models.TableVersion.name.in_(tables)).update(
+        {"version": models.TableVersion.version + 1, "updated_at": now}, synchronize_session=False
+    )
+    if updated < len(set(tables)):
+        # Normally seeded at startup (ensure_table_versions)
+        existing = {name for (name,) in db.query(models.TableVersion.name).filter(models.TableVersion.name.in_(tables))}
+        for name in set(tables) - existing:
+            db.add(models.TableVersion(name=name, version=1, updated_at=now))
+
+def get_table_versions(db: Session, tables) -> dict:
+    """{name: (version, updated_at)}; tables never written have version 0."""
+    def load():
+        rows = db.query(models.TableVersion).filter(models.TableVersion.name.in_(tables)).all()
+        versions = {name: (0, None) for name in tables}
+        versions.update({row.name: (row.version, row.updated_at) for row in rows})
+        return versions
+    return _versions_cache.get_or_compute(tuple(sorted(tables)), load)
+
+def ensure_table_versions(db: Session):
+    existing = {name for (name,) in db.query(models.TableVersion.name)}
+    for name in VERSIONED_TABLES:
+        if name not in existing:
+            db.add(models.TableVersion(name=name, version=0, updated_at=datetime.datetime.utcnow().isoformat()))
+    db.commit()
+
+def _load_project(db: Session, project_id: int):
+    return (
+        db.query(models.Project)
+        .options(*PROJECT_OPTIONS)
+        .filter(models.Project.id == project_id)
+        .first()
+    )
 
 def get_project(db: Session, project_id: int):
-    return db.query(models.Project).filter(models.Project.id == project_id).first()
+    project = _load_project(db, project_id)
+    if project:
+        backfill_image_variants(image.url for image in project.images
+                                if image_variants.needs_variants(image.variants, image.width))
+    return project
+
+def _store_image_variants(results: dict):
+    """
+    Records {url: (widths, width)} on the ProjectImage rows, in one transaction.
+    "projects" is bumped once, and only if a row actually changed.
+    """
+    db = get_session_local()()
+    try:
+        changed = False
+        for image in db.query(models.ProjectImage).filter(models.ProjectImage.url.in_(results)):
+            widths, width = results[image.url]
+            if (image.variants, image.width) != (widths, width):
+                image.variants, image.width = widths, width
+                changed = True
+        if changed:
+            bump_versions(db, "projects") # The responses now carry a srcset
+            db.commit()
+    finally:
+        db.close()
+
+def backfill_image_variants(urls):
+    """
+    Lazily creates missing image variants in the background and records them
+    on the ProjectImage rows once the whole batch is done. Until then the
+    response has no srcset.
+    """
+    pending = set(urls)
+    if not pending:
+        return
+    results = {}
+    lock = threading.Lock()
+
+    def finish(url, result=None):
+        with lock:
+            if result is not None:
+                results[url] = result
+            pending.discard(url)
+            if pending or not results:
+                return
+        try:
+            _store_image_variants(results)
+        except Exception as e:
+            print(f"Could not store image variants: {e}")
+
+    for url in list(pending):
+        # Already in progress elsewhere: that call records it
+        if not image_variants.schedule(url, on_done=lambda url, widths, width: finish(url, (widths, width))):
+            finish(url)
+
+# Columns /projects/ can be sorted by. Every sort is made unique with id as a
+# tie-breaker so it can be paginated with a (sort_key, id) keyset cursor.
+PROJECT_SORT_COLUMNS = {
+    "id": models.Project.id,
+    "name": models.Project.name,
+    "type": models.Project.type,
+    "location": models.Project.location,
+    "area_m2": models.Project.area_m2,
+    "contract_value_mnok": models.Project.contract_value_mnok,
+}
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+def _tag_elements(db: Session):
+    """Table-valued function expanding Project.tags into one row per tag."""
+    if _is_postgres(db):
+        return func.jsonb_array_elements_text(type_coerce(models.Project.tags, JSONB)).table_valued("value")
+    # SQLite (local dev)
+    return func.json_each(models.Project.tags).table_valued("value")
+
+def _has_tag(db: Session, tag: str):
+    if _is_postgres(db):
+        # tags @> '["tag"]' - answered by the GIN index ix_projects_tags_gin
+        return type_coerce(models.Project.tags, JSONB).contains([tag])
+    elements = _tag_elements(db)
+    return select(elements.c.value).where(elements.c.value == tag).exists()
+
+def get_tag_counts(db: Session):
+    """All distinct tags with the number of projects using them, in one aggregate query (cached)."""
+    return _tags_cache.get_or_compute("all", lambda: _query_tag_counts(db))
+
+def _query_tag_counts(db: Session):
+    elements = _tag_elements(db)
+    query = (
+        db.query(elements.c.value.label("name"), func.count().label("count"))
+        .select_from(models.Project)
+        .join(elements, true()) # implicitly LATERAL on both Postgres and SQLite
+    )
+    if _is_postgres(db):
+        # jsonb_array_elements_text fails on non-array values such as JSON null
+        query = query.filter(func.jsonb_typeof(type_coerce(models.Project.tags, JSONB)) == "array")
+    return (
+        query.filter(elements.c.value.isnot(None))
+        .group_by(elements.c.value)
+        .order_by(elements.c.value)
+        .all()
+    )
+
+def _filter_projects(db: Session, query, filters: dict):
+    if filters.get("tag"):
+        query = query.filter(_has_tag(db, filters["tag"]))
+    for field in ("type", "location", "contract_type", "performed_by"):
+        if filters.get(field):
+            query = query.filter(getattr(models.Project, field) == filters[field])
+    if filters.get("min_area") is not None:
+        query = query.filter(models.Project.area_m2 >= filters["min_area"])
+    if filters.get("max_area") is not None:
+        query = query.filter(models.Project.area_m2 <= filters["max_area"])
+    if filters.get("min_value") is not None:
+        query = query.filter(models.Project.contract_value_mnok >= filters["min_value"])
+    if filters.get("max_value") is not None:
+        query = query.filter(models.Project.contract_value_mnok <= filters["max_value"])
+    return query
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    raw = json.dumps([sort, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str):
+    """Returns (sort_value, id). Raises ValueError for malformed or foreign cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort or not isinstance(row_id, int):
+        raise ValueError("Cursor does not match the requested sort")
+    return value, row_id
+
+def _paginate_projects(query, sort: str, descending: bool, cursor: Optional[str], limit: int):
+    """
+    Keyset pagination on (sort column, id). NULL sort values go last in both
+    directions. Returns {"items": [...], "next_cursor": str | None}.
+    """
+    if sort not in PROJECT_SORT_COLUMNS:
+        raise ValueError(f"Unknown sort key: {sort}")
+    column = PROJECT_SORT_COLUMNS[sort]
+    id_col = models.Project.id
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        id_after = id_col < last_id if descending else id_col > last_id
+        if sort == "id":
+            query = query.filter(id_after)
+        elif value is None:
+            # Already inside the NULL tail
+            query = query.filter(and_(column.is_(None), id_after))
+        else:
+            past_value = column < value if descending else column > value
+            query = query.filter(or_(past_value, and_(column == value, id_after), column.is_(None)))
 
-def get_projects(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Project).offset(skip).limit(limit).all()
+    ordering = [(column.desc() if descending else column.asc()).nulls_last()]
+    if sort != "id":
+        ordering.append(id_col.desc() if descending else id_col.asc())
+
+    # Fetch one extra row to know whether there is a next page
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, getattr(last, sort), last.id)
+    return {"items": rows, "next_cursor": next_cursor}
+
+def get_projects(db: Session, filters: Optional[dict] = None, sort: str = "id",
+                 descending: bool = False, cursor: Optional[str] = None, limit: int = 100):
+    query = db.query(models.Project).options(*PROJECT_OPTIONS)
+    query = _filter_projects(db, query, filters or {})
+    page = _paginate_projects(query, sort, descending, cursor, limit)
+    backfill_image_variants(
+        image.url for project in page["items"] for image in project.images
+        if image_variants.needs_variants(image.variants, image.width)
+    )
+    return page
+
+def get_project_summaries(db: Session, filters: Optional[dict] = None, sort: str = "id",
+                          descending: bool = False, cursor: Optional[str] = None, limit: int = 100):
+    key = (tuple(sorted((filters or {}).items())), sort, descending, cursor, limit)
+    return _summaries_cache.get_or_compute(
+        key, lambda: _query_project_summaries(db, filters, sort, descending, cursor, limit)
+    )
+
+def _query_project_summaries(db: Session, filters: Optional[dict], sort: str,
+                             descending: bool, cursor: Optional[str], limit: int):
+    # Column-restricted query: no description/CV text and no relationship loading.
+    # The first image is picked with a correlated subquery in the same statement.
+    def first_image_column(column, label):
+        return (
+            select(column)
+            .where(models.ProjectImage.project_id == models.Project.id)
+            .order_by(models.ProjectImage.id)
+            .limit(1)
+            .correlate(models.Project)
+            .scalar_subquery()
+            .label(label)
+        )
+    query = db.query(
+        models.Project.id,
+        models.Project.name,
+        models.Project.type,
+        models.Project.location,
+        models.Project.time_frame,
+        models.Project.contract_type,
+        models.Project.image_url,
+        models.Project.tags,
+        # Not part of the card, but needed to build the keyset cursor
+        models.Project.area_m2,
+        models.Project.contract_value_mnok,
+        first_image_column(models.ProjectImage.url, "first_image"),
+        first_image_column(models.ProjectImage.variants, "first_image_variants"),
+        first_image_column(models.ProjectImage.width, "first_image_width"),
+    )
+    query = _filter_projects(db, query, filters or {})
+    page = _paginate_projects(query, sort, descending, cursor, limit)
+
+    items, backfill = [], []
+    for row in page["items"]:
+        item = dict(row._mapping)
+        variants, width = item.pop("first_image_variants"), item.pop("first_image_width")
+        if item["first_image"] and image_variants.needs_variants(variants, width):
+            backfill.append(item["first_image"])
+        item["first_image_srcset"] = image_variants.srcset(item["first_image"], variants, width)
+        items.append(item)
+    backfill_image_variants(backfill)
+    page["items"] = items
+    return page
 
 def create_project(db: Session, project: schemas.ProjectCreate):
     # Check if project type exists, if not create it (auto-add to ProjectType list)
@@ -15,6 +342,7 @@ def create_project(db: Session, project: schemas.ProjectCreate):
     if not existing_type:
         new_type = models.ProjectType(name=project.type)
         db.add(new_type)
+        bump_versions(db, "project_types")
         # We don't commit here yet, can commit with the project or flush. 
         # Safest to just add it to session.
 
@@ -24,14 +352,19 @@ def create_project(db: Session, project: schemas.ProjectCreate):
     
     db_project = models.Project(**project_data)
     db.add(db_project)
+    bump_versions(db, "projects")
     db.commit()
     db.refresh(db_project)
     
     # Create ProjectImage records for extracted images
     if images:
         for img_url in images:
-            db_image = models.ProjectImage(url=img_url, project_id=db_project.id)
+            variants, width = image_variants.existing_variants(img_url)
+            db_image = models.ProjectImage(url=img_url, project_id=db_project.id,
+                                           content_hash=blobs.digest_from_url(img_url),
+                                           variants=variants, width=width)
             db.add(db_image)
+        bump_versions(db, "projects")
         db.commit()
         db.refresh(db_project) # Refresh again to load relationships if needed
         
@@ -45,40 +378,65 @@ def update_project(db: Session, project_id: int, project: schemas.ProjectUpdate)
         if not existing_type:
             new_type = models.ProjectType(name=project.type)
             db.add(new_type)
+            bump_versions(db, "project_types")
             
         update_data = project.dict(exclude_unset=True)
+        released = [db_project.image_url] if 'image_url' in update_data else []
         
         # Handle images if present
         if 'images' in update_data:
             images = update_data.pop('images')
             # Clear existing images
+            released += [image.url for image in db_project.images]
             db.query(models.ProjectImage).filter(models.ProjectImage.project_id == project_id).delete()
             # Add new images
             if images:
                 for img_url in images:
-                    db_image = models.ProjectImage(url=img_url, project_id=project_id)
+                    variants, width = image_variants.existing_variants(img_url)
+                    db_image = models.ProjectImage(url=img_url, project_id=project_id,
+                                                   content_hash=blobs.digest_from_url(img_url),
+                                                   variants=variants, width=width)
                     db.add(db_image)
         
         for key, value in update_data.items():
             setattr(db_project, key, value)
             
+        bump_versions(db, "projects")
         db.commit()
         db.refresh(db_project)
+        release_blobs(db, released)
     return db_project
 
 def delete_project(db: Session, project_id: int):
-    db_project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    # Load what the response serialises; the instance is detached after the delete.
+    # Not through get_project: no variants for images about to be deleted
+    db_project = _load_project(db, project_id)
     if db_project:
+        images = [db_project.image_url] + [image.url for image in db_project.images]
+        attachments = [attachment.file_path for attachment in db_project.attachments]
         db.delete(db_project)
+        bump_versions(db, "projects")
         db.commit()
+        release_blobs(db, images)
+        release_blobs(db, attachments, grace=blobs.ATTACHMENT_GRACE_SECONDS)
     return db_project
 
 def get_project_types(db: Session):
-    return db.query(models.ProjectType).all()
+    # Plain dicts: cached values outlive the session
+    return _types_cache.get_or_compute(
+        "all", lambda: [{"id": t.id, "name": t.name} for t in db.query(models.ProjectType).all()]
+    )
 
 # Employee CRUD
 def get_employees(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Employee).offset(skip).limit(limit).all()
+    return (
+        db.query(models.Employee)
+        .options(*EMPLOYEE_CV_OPTIONS)
+        .order_by(models.Employee.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
 
 def create_employee(db: Session, employee: schemas.EmployeeCreate):
     emp_data = employee.dict()
@@ -88,6 +446,7 @@ def create_employee(db: Session, employee: schemas.EmployeeCreate):
     
     db_employee = models.Employee(**emp_data)
     db.add(db_employee)
+    bump_versions(db, "employees")
     db.commit()
     db.refresh(db_employee)
     
@@ -98,12 +457,39 @@ def create_employee(db: Session, employee: schemas.EmployeeCreate):
     for item in certifications:
         db.add(models.Certification(**item, employee_id=db_employee.id))
         
+    bump_versions(db, "employees")
     db.commit()
     db.refresh(db_employee)
     return db_employee
 
 def get_employee(db: Session, employee_id: int):
-    return db.query(models.Employee).filter(models.Employee.id == employee_id).first()
+    return (
+        db.query(models.Employee)
+        .options(*EMPLOYEE_DETAIL_OPTIONS)
+        .filter(models.Employee.id == employee_id)
+        .first()
+    )
+
+def get_employees_for_bios(db: Session, employee_ids: Optional[list] = None, title: Optional[str] = None,
+                           company: Optional[str] = None, project_id: Optional[int] = None):
+    """Employees matching all given criteria, with everything the bio prompt reads (a handful of queries)."""
+    query = db.query(models.Employee).options(*EMPLOYEE_DETAIL_OPTIONS)
+    if employee_ids is not None:
+        query = query.filter(models.Employee.id.in_(employee_ids))
+    if title:
+        query = query.filter(models.Employee.title.ilike(f"%{title}%"))
+    if company:
+        query = query.filter(models.Employee.company.ilike(f"%{company}%"))
+    if project_id is not None:
+        members = select(models.ProjectTeamMember.employee_id).where(models.ProjectTeamMember.project_id == project_id)
+        query = query.filter(models.Employee.id.in_(members))
+    return query.order_by(models.Employee.id).all()
+
+def store_generated_bio(db: Session, employee_id: int, fingerprint: str, bio: str):
+    # A suggestion for the edit form, not part of any response: no version bump
+    db.query(models.Employee).filter(models.Employee.id == employee_id).update(
+        {"generated_bio": bio, "generated_bio_fingerprint": fingerprint}, synchronize_session=False)
+    db.commit()
 
 def update_employee(db: Session, employee_id: int, employee: schemas.EmployeeUpdate):
     db_employee = get_employee(db, employee_id)
@@ -148,6 +534,8 @@ def update_employee(db: Session, employee_id: int, employee: schemas.EmployeeUpd
     for key, value in update_data.items():
         setattr(db_employee, key, value)
     
+    # Team memberships are part of the project responses as well
+    bump_versions(db, "employees", "projects")
     db.commit()
     db.refresh(db_employee)
     return db_employee
@@ -163,6 +551,7 @@ def add_team_member(db: Session, project_id: int, member: schemas.ProjectTeamMem
         # Create new employee
         new_emp = models.Employee(**member.new_employee.dict())
         db.add(new_emp)
+        bump_versions(db, "employees")
         db.commit()
         db.refresh(new_emp)
         emp_id = new_emp.id
@@ -177,13 +566,16 @@ def add_team_member(db: Session, project_id: int, member: schemas.ProjectTeamMem
         role=member.role
     )
     db.add(db_member)
+    bump_versions(db, "employees", "projects")
     db.commit()
     db.refresh(db_member)
     return db_member
 
 def create_project_attachment(db: Session, attachment: schemas.ProjectAttachmentCreate, project_id: int):
-    db_attachment = models.ProjectAttachment(**attachment.dict(), project_id=project_id)
+    db_attachment = models.ProjectAttachment(**attachment.dict(), project_id=project_id,
+                                             content_hash=blobs.digest_from_url(attachment.file_path))
     db.add(db_attachment)
+    bump_versions(db, "projects")
     db.commit()
     db.refresh(db_attachment)
     return db_attachment
@@ -192,5 +584,210 @@ def delete_project_attachment(db: Session, attachment_id: int):
     db_attachment = db.query(models.ProjectAttachment).filter(models.ProjectAttachment.id == attachment_id).first()
     if db_attachment:
         db.delete(db_attachment)
+        bump_versions(db, "projects")
         db.commit()
+        release_blobs(db, [db_attachment.file_path], grace=blobs.ATTACHMENT_GRACE_SECONDS)
     return db_attachment
+
+def count_file_references(db: Session, url: str) -> int:
+    """Rows pointing at the file (by content hash for blobs, by URL for older files)."""
+    digest = blobs.digest_from_url(url)
+    if digest:
+        images = db.query(models.ProjectImage).filter(models.ProjectImage.content_hash == digest)
+        attachments = db.query(models.ProjectAttachment).filter(models.ProjectAttachment.content_hash == digest)
+    else:
+        images = db.query(models.ProjectImage).filter(models.ProjectImage.url == url)
+        attachments = db.query(models.ProjectAttachment).filter(models.ProjectAttachment.file_path == url)
+    return (
+        images.count() + attachments.count()
+        + db.query(models.Project).filter(models.Project.image_url == url).count()
+        + db.query(models.Employee).filter(models.Employee.image_url == url).count()
+    )
+
+def release_blobs(db: Session, urls, grace: int = blobs.BLOB_GRACE_SECONDS):
+    """Removes the files behind urls that are no longer referenced. Call after commit."""
+    for url in set(filter(None, urls)):
+        if count_file_references(db, url) == 0:
+            blobs.remove(url, grace=grace)
+
+def sweep_unreferenced_files(db: Session, grace: int = blobs.BLOB_GRACE_SECONDS, dry_run: bool = False) -> list:
+    """
+    Removes every stored file under blobs.FILE_PREFIXES that no row references,
+    with its variants: what release_blobs never sees, such as files of an older
+    layout or left behind by a failed request. Files stored within grace
+    seconds are kept. Returns the URLs removed (or, in a dry run, to remove).
+    """
+    urls, digests = set(), set()
+    for column in (models.ProjectImage.url, models.ProjectAttachment.file_path,
+                   models.Project.image_url, models.Employee.image_url):
+        urls.update(url for (url,) in db.query(column).filter(column.isnot(None)))
+    for column in (models.ProjectImage.content_hash, models.ProjectAttachment.content_hash):
+        digests.update(digest for (digest,) in db.query(column).filter(column.isnot(None)))
+    keep = {key for url in urls if (key := key_from_url(url))}
+    keep.update(variant for key in list(keep) for variant in image_variants.variant_keys(key))
+
+    storage = get_storage()
+    unreferenced = [key for prefix in blobs.FILE_PREFIXES for key in list(storage.list_keys(prefix))
+                    if key not in keep and blobs.digest_from_url(url_for_key(key)) not in digests]
+    # Variants go with their original
+    variants = {variant for key in unreferenced for variant in image_variants.variant_keys(key)}
+    removed = []
+    for key in unreferenced:
+        if key in variants:
+            continue
+        url = url_for_key(key)
+        if dry_run:
+            age = storage.age(key)
+            if age is not None and age >= grace:
+                removed.append(url)
+        elif blobs.remove(url, grace=grace):
+            removed.append(url)
+    return removed
+
+# Full-text search
+# On Postgres, projects.search_vector and employees.search_vector are generated
+# tsvector columns ('norwegian' configuration, GIN indexed, see run_migrations).
+# Other databases fall back to the in-process implementation in utils/search.py.
+SEARCH_CONFIG = "norwegian"
+# ts_headline returns the text as is, so it marks matches with control characters
+# instead of tags; _headline_html escapes the rest and only then adds the <b></b>
+HEADLINE_START, HEADLINE_STOP = "\x02", "\x03"
+HEADLINE_OPTIONS = f"StartSel={HEADLINE_START}, StopSel={HEADLINE_STOP}, MaxWords=35, MinWords=15, MaxFragments=2"
+
+def _project_body(project):
+    return " ".join(filter(None, [project.description, project.relevance, project.challenges, project.role_description]))
+
+def _employee_body(employee):
+    return " ".join(filter(None, [employee.bio, " ".join(employee.key_competencies or [])]))
+
+def _headline_html(snippet):
+    """ts_headline output as HTML like text_search.headline: escaped, matches wrapped in <b></b>."""
+    if not snippet:
+        return snippet
+    return html.escape(snippet).replace(HEADLINE_START, "<b>").replace(HEADLINE_STOP, "</b>")
+
+def _project_hit(project, rank, snippet):
+    return {
+        "kind": "project", "id": project.id, "title": project.name,
+        "subtitle": ", ".join(filter(None, [project.type, project.location])) or None,
+        "snippet": snippet or None, "rank": rank,
+    }
+
+def _employee_hit(employee, rank, snippet):
+    return {
+        "kind": "employee", "id": employee.id, "title": employee.name,
+        "subtitle": ", ".join(filter(None, [employee.title, employee.company])) or None,
+        "snippet": snippet or None, "rank": rank,
+    }
+
+def _search_postgres(db: Session, q: str, kinds: list, limit: int, offset: int):
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    ranked = []
+    if "project" in kinds:
+        vector = literal_column("projects.search_vector")
+        ranked.append(
+            select(literal("project").label("kind"), models.Project.id, func.ts_rank_cd(vector, tsquery).label("rank"))
+            .where(vector.op("@@")(tsquery))
+        )
+    if "employee" in kinds:
+        vector = literal_column("employees.search_vector")
+        ranked.append(
+            select(literal("employee").label("kind"), models.Employee.id, func.ts_rank_cd(vector, tsquery).label("rank"))
+            .where(vector.op("@@")(tsquery))
+        )
+    hits = union_all(*ranked).subquery()
+    page = db.execute(
+        select(hits.c.kind, hits.c.id, hits.c.rank)
+        .order_by(hits.c.rank.desc(), hits.c.kind, hits.c.id)
+        .limit(limit + 1)
+        .offset(offset)
+    ).all()
+
+    # ts_headline is expensive, so it only runs for the rows on this page
+    ids = {"project": [], "employee": []}
+    for row in page[:limit]:
+        ids[row.kind].append(row.id)
+    headlines = {}
+    if ids["project"]:
+        body = func.concat_ws(" ", models.Project.description, models.Project.relevance,
+                              models.Project.challenges, models.Project.role_description)
+        for project, snippet in db.query(models.Project, func.ts_headline(SEARCH_CONFIG, body, tsquery, HEADLINE_OPTIONS)) \
+                .filter(models.Project.id.in_(ids["project"])):
+            headlines[("project", project.id)] = (project, snippet)
+    if ids["employee"]:
+        # key_competencies is a JSON list; render it as "a, b" for the snippet
+        competencies = func.translate(func.replace(cast(models.Employee.key_competencies, Text), '", "', ", "), '[]"', "")
+        body = func.concat_ws(" ", models.Employee.bio, competencies)
+        for employee, snippet in db.query(models.Employee, func.ts_headline(SEARCH_CONFIG, body, tsquery, HEADLINE_OPTIONS)) \
+                .filter(models.Employee.id.in_(ids["employee"])):
+            headlines[("employee", employee.id)] = (employee, snippet)
+
+    items = []
+    for row in page[:limit]:
+        obj, snippet = headlines[(row.kind, row.id)]
+        build = _project_hit if row.kind == "project" else _employee_hit
+        items.append(build(obj, float(row.rank), _headline_html(snippet)))
+    return items, len(page) > limit
+
+def _search_in_process(db: Session, q: str, kinds: list, limit: int, offset: int):
+    terms = text_search.query_terms(q)
+    scored = []
+    if "project" in kinds:
+        for p in db.query(models.Project).all():
+            rank = text_search.rank(terms, {
+                "A": p.name,
+                "B": " ".join(filter(None, [p.type, p.location, p.client, p.contract_type, p.certification, " ".join(p.tags or [])])),
+                "C": _project_body(p),
+            })
+            if rank:
+                scored.append(("project", p, rank))
+    if "employee" in kinds:
+        for e in db.query(models.Employee).all():
+            rank = text_search.rank(terms, {
+                "A": e.name,
+                "B": " ".join(filter(None, [e.title, e.company])),
+                "C": _employee_body(e),
+            })
+            if rank:
+                scored.append(("employee", e, rank))
+    scored.sort(key=lambda hit: (-hit[2], hit[0], hit[1].id))
+    page = scored[offset:offset + limit + 1]
+    items = []
+    for kind, obj, rank in page[:limit]:
+        if kind == "project":
+            items.append(_project_hit(obj, rank, text_search.headline(_project_body(obj), terms)))
+        else:
+            items.append(_employee_hit(obj, rank, text_search.headline(_employee_body(obj), terms)))
+    return items, len(page) > limit
+
+def search(db: Session, q: str, kind: Optional[str] = None, limit: int = 20, offset: int = 0):
+    """Ranked, highlighted search over projects and employees. kind limits it to one of them."""
+    kinds = [kind] if kind else ["project", "employee"]
+    if _is_postgres(db):
+        items, has_more = _search_postgres(db, q, kinds, limit, offset)
+    else:
+        items, has_more = _search_in_process(db, q, kinds, limit, offset)
+    return {"items": items, "next_offset": offset + limit if has_more else None}
+
+# Async forms of the read functions, for the async endpoints in main.py. The
+# same ORM code runs through AsyncSession.run_sync on the event loop (asyncpg,
+# no threadpool hop). Everything the responses serialise is eagerly loaded
+# (see PROJECT_OPTIONS), so nothing is lazy-loaded after they return.
+def _async_form(fn):
+    @functools.wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(fn, *args, **kwargs)
+    wrapper.__name__ = f"{fn.__name__}_async"
+    return wrapper
+
+get_table_versions_async = _async_form(get_table_versions)
+get_project_async = _async_form(get_project)
+get_projects_async = _async_form(get_projects)
+get_project_summaries_async = _async_form(get_project_summaries)
+get_project_types_async = _async_form(get_project_types)
+get_tag_counts_async = _async_form(get_tag_counts)
+get_employees_async = _async_form(get_employees)
+get_employee_async = _async_form(get_employee)
+search_async = _async_form(search)
+get_employees_for_bios_async = _async_form(get_employees_for_bios)
+store_generated_bio_async = _async_form(store_generated_bio)
@@ -0,0 +1,266 @@
+"""
+Bulk import of CVs: a zip file or a directory of PDFs becomes employees
+with their work experience, education and certifications.
+
+Used by POST /employees/import-cvs (a zip, run as a background job, see
+jobs.py) and from the command line:
+
+    python cv_import.py path/to/cvs.zip --dry-run
+    python cv_import.py path/to/folder
+
+The CVs are parsed concurrently through parse_cv_pdf (IMPORT_PARSE_WORKERS
+at a time; the AI calls dominate). Each parsed CV is matched against the
+existing employees, by email (the candidate's own, as the model read it,
+see parse_cv_pdf) or else by name, and against the other CVs in the import,
+so nobody is created twice. An email match only counts when the names agree
+too; an address shared by differently named people is reported as ambiguous.
+CVs read without some of their entries (a required field missing, see
+parse_cv_pdf) or pages (OCR failed) are listed under "incomplete". New
+employees are inserted with one INSERT per table per batch of
+IMPORT_BATCH_SIZE, each batch in a single transaction. A dry run parses and
+matches but writes nothing; its report lists what would be created. Parsed CVs are cached by content hash, so the
+real import after a dry run does not parse them again.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+
+import crud
+import models
+import schemas
+from database import get_session_local
+from utils.cv_parser import parse_cv_pdf
+from utils.uploads import MAX_UPLOAD_BYTES
+
+IMPORT_PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS", "4"))
+IMPORT_BATCH_SIZE = 50
+IMPORT_MAX_FILES = int(os.getenv("IMPORT_MAX_FILES", "1000"))
+# Total uncompressed size extracted from one zip (a zip bomb fits in any upload limit);
+# the temp dir may be in memory (Cloud Run)
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(512 * 1024 * 1024)))
+
+def _normalize_name(name) -> str:
+    """Case, accents and spacing ignored: "ole  NORDMANN" and "Ole Nordmann" match."""
+    text = unicodedata.normalize("NFKD", str(name or ""))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def _normalize_email(email) -> str:
+    return str(email or "").strip().casefold()
+
+
+def _extract_zip(archive: str, target: str) -> list:
+    """
+    Extracts the PDFs in archive into target, flat. Returns [(name in the
+    archive, path, error)]; files not extracted have no path but an error.
+    """
+    files = []
+    total = 0
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            name = info.filename
+            base = os.path.basename(name)
+            if info.is_dir() or not base.lower().endswith(".pdf") or base.startswith(".") or "__MACOSX" in name:
+                continue
+            # file_size is what the archive claims, and zipfile never reads more than that
+            if info.file_size > MAX_UPLOAD_BYTES:
+                files.append((name, None, "File is too large")) # Reported as failed
+            elif total is None or total + info.file_size > IMPORT_MAX_BYTES:
+                total = None # Full: this and every later file are reported as failed
+                files.append((name, None, f"Import is larger than {IMPORT_MAX_BYTES // (1024 * 1024)} MB uncompressed"))
+            else:
+                total += info.file_size
+                # Never a path from the archive: no writing outside target
+                path = os.path.join(target, f"{len(files)}.pdf")
+                with zf.open(info) as src, open(path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                files.append((name, path, None))
+            if len(files) >= IMPORT_MAX_FILES:
+                break
+    return files
+
+
+def _list_directory(directory: str) -> list:
+    files = []
+    for root, _, names in os.walk(directory):
+        for base in sorted(names):
+            if base.lower().endswith(".pdf") and not base.startswith("."):
+                path = os.path.join(root, base)
+                files.append((os.path.relpath(path, directory), path, None))
+    return sorted(files)[:IMPORT_MAX_FILES]
+
+
+def _parse(file) -> dict:
+    _, path, error = file
+    if error:
+        return {"error": error}
+    try:
+        return parse_cv_pdf(path)
+    except Exception as e:
+        print(f"CV import: parsing {path} failed: {e}")
+        return {"error": str(e)}
+
+
+def _employee_from_cv(parsed: dict) -> schemas.EmployeeCreate:
+    # Entries without their required fields were already dropped by parse_cv_pdf
+    data = dict(parsed)
+    data["languages"] = [item for item in data.get("languages") or [] if isinstance(item, str)]
+    data["key_competencies"] = [item for item in data.get("key_competencies") or [] if isinstance(item, str)]
+    return schemas.EmployeeCreate(**data)
+
+
+def _insert_batch(db, employees: list) -> list:
+    """Inserts the employees and their rows, one INSERT per table. Returns the new ids, in order."""
+    rows = [employee.dict(exclude={"work_experiences", "educations", "certifications", "team_memberships"})
+            for employee in employees]
+    ids = db.scalars(
+        insert(models.Employee).returning(models.Employee.id, sort_by_parameter_order=True), rows
+    ).all()
+    for field, model in (("work_experiences", models.WorkExperience),
+                         ("educations", models.Education),
+                         ("certifications", models.Certification)):
+        children = [{**item.dict(), "employee_id": employee_id}
+                    for employee, employee_id in zip(employees, ids)
+                    for item in getattr(employee, field)]
+        if children:
+            db.execute(insert(model), children)
+    crud.bump_versions(db, "employees")
+    return ids
+
+
+def import_cvs(source: str, dry_run: bool = False) -> dict:
+    """Imports the CVs in source (a zip file or a directory). Returns the report."""
+    workdir = None
+    try:
+        if os.path.isdir(source):
+            files = _list_directory(source)
+        elif zipfile.is_zipfile(source):
+            workdir = tempfile.mkdtemp(prefix="cv_import_")
+            files = _extract_zip(source, workdir)
+        else:
+            raise ValueError("Expected a zip file or a directory of PDFs")
+
+        with ThreadPoolExecutor(max_workers=IMPORT_PARSE_WORKERS) as executor:
+            parsed = list(executor.map(_parse, files))
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"dry_run": dry_run, "files": len(files), "created": [], "matched": [],
+              "duplicates": [], "ambiguous": [], "failed": [], "incomplete": []}
+    db = get_session_local()()
+    try:
+        by_email, by_name = {}, {} # normalized email -> [(id, normalized name)], normalized name -> [id]
+        for employee_id, name, email in db.query(models.Employee.id, models.Employee.name, models.Employee.email):
+            if email:
+                by_email.setdefault(_normalize_email(email), []).append((employee_id, _normalize_name(name)))
+            by_name.setdefault(_normalize_name(name), []).append(employee_id)
+
+        new = [] # (file, EmployeeCreate), in file order
+        seen_names = {} # normalized name -> file, for CVs of the same person in this import
+        seen_emails = {} # normalized email -> (file, normalized name)
+        for (name, _, _), result in zip(files, parsed):
+            if "error" in result:
+                report["failed"].append({"file": name, "error": result["error"]})
+                continue
+            try:
+                employee = _employee_from_cv(result)
+            except ValidationError as e:
+                report["failed"].append({"file": name, "error": f"Unexpected CV data: {e.errors()[0]['msg']}"})
+                continue
+            entry = {"file": name, "name": employee.name, "email": employee.email}
+            if result.get("dropped") or result.get("incomplete"):
+                # Imported (or matched) without these: worth a look by hand
+                report["incomplete"].append({**entry, "dropped": result.get("dropped", []),
+                                             "errors": result.get("incomplete", [])})
+            email_key = _normalize_email(employee.email)
+            name_key = _normalize_name(employee.name)
+            email_owners = by_email.get(email_key, []) if email_key else []
+            same_email = [employee_id for employee_id, owner in email_owners if owner == name_key]
+            other_email = [employee_id for employee_id, owner in email_owners if owner != name_key]
+            seen_email = seen_emails.get(email_key) if email_key else None
+            if not name_key:
+                report["failed"].append({"file": name, "error": "No name found in the CV"})
+            elif len(same_email) == 1:
+                report["matched"].append({**entry, "employee_id": same_email[0], "by": "email"})
+            elif other_email and not same_email:
+                # Someone else's address, or a shared one: never matched, created or copied by guessing
+                report["ambiguous"].append({**entry, "employee_ids": other_email, "reason": "email"})
+            elif len(by_name.get(name_key, [])) == 1:
+                report["matched"].append({**entry, "employee_id": by_name[name_key][0], "by": "name"})
+            elif by_name.get(name_key):
+                report["ambiguous"].append({**entry, "employee_ids": by_name[name_key], "reason": "name"})
+            elif name_key in seen_names:
+                report["duplicates"].append({**entry, "same_as": seen_names[name_key]})
+            elif seen_email and seen_email[1] != name_key:
+                report["ambiguous"].append({**entry, "employee_ids": [], "same_email_as": seen_email[0],
+                                            "reason": "email"})
+            else:
+                if email_key:
+                    seen_emails[email_key] = (name, name_key)
+                seen_names[name_key] = name
+                new.append((name, employee))
+
+        for start in range(0, len(new), IMPORT_BATCH_SIZE):
+            batch = new[start:start + IMPORT_BATCH_SIZE]
+            ids = [None] * len(batch)
+            if not dry_run:
+                try:
+                    ids = _insert_batch(db, [employee for _, employee in batch])
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    print(f"CV import: batch failed: {e}")
+                    report["failed"].extend({"file": name, "error": f"Could not save: {e}"} for name, _ in batch)
+                    continue
+            report["created"].extend(
+                {"file": name, "name": employee.name, "email": employee.email, "employee_id": employee_id,
+                 "work_experiences": len(employee.work_experiences), "educations": len(employee.educations),
+                 "certifications": len(employee.certifications)}
+                for (name, employee), employee_id in zip(batch, ids)
+            )
+    finally:
+        db.close()
+
+    report["summary"] = {key: len(report[key]) for key in ("created", "matched", "duplicates", "ambiguous", "failed",
+                                                            "incomplete")}
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a zip file or a directory of CV PDFs as employees.")
+    parser.add_argument("source", help="Zip file or directory")
+    parser.add_argument("--dry-run", action="store_true", help="Parse and match only, write nothing")
+    parser.add_argument("--report", help="Also write the full report to this JSON file")
+    args = parser.parse_args()
+
+    report = import_cvs(args.source, dry_run=args.dry_run)
+    verb = "Would create" if args.dry_run else "Created"
+    for entry in report["created"]:
+        print(f"{verb}: {entry['name']} ({entry['file']})")
+    for entry in report["matched"]:
+        print(f"Exists: {entry['name']} ({entry['file']}) -> employee {entry['employee_id']} by {entry['by']}")
+    for entry in report["duplicates"]:
+        print(f"Duplicate: {entry['name']} ({entry['file']}), same as {entry['same_as']}")
+    for entry in report["ambiguous"]:
+        other = entry.get("same_email_as") or f"employees {entry['employee_ids']}"
+        print(f"Ambiguous: {entry['name']} ({entry['file']}) shares its {entry['reason']} with {other}")
+    for entry in report["failed"]:
+        print(f"Failed: {entry['file']}: {entry['error']}")
+    for entry in report["incomplete"]:
+        problems = [f"{row['field']} entry without {', '.join(row['missing'])} left out" for row in entry["dropped"]]
+        print(f"Incomplete: {entry['name']} ({entry['file']}): {'; '.join(problems + entry['errors'])}")
+    print(json.dumps(report["summary"]))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
@@ -1,7 +1,28 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 import os
+import time
+import threading
+import uuid
+
+# Connection pool settings (Postgres). Cloud Run scales to zero and Cloud SQL
+# drops idle connections, so connections are pinged on checkout and recycled
+# before the server or a proxy closes them.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30")) # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800")) # seconds
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") != "0"
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10")) # seconds
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000")) # 0 = no limit
+# Behind PgBouncer in transaction pooling mode: no session state (startup
+# options, session SETs, LISTEN) and no prepared statements. The statement
+# timeout is set per transaction instead, and LISTEN needs DATABASE_DIRECT_URL.
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") != "0"
 
 def get_database_url():
     """Build database URL, supporting both Cloud SQL Unix socket and standard connections."""
@@ -24,15 +45,197 @@ Base = declarative_base()
 # Lazy initialization of engine and SessionLocal
 _engine = None
 _SessionLocal = None
+_async_engine = None
+_AsyncSessionLocal = None
+
+class PoolStats:
+    """Counters for /metrics/db: checkout waits, usage and connection churn."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.slow_checkouts = 0 # waited more than 100 ms
+        self.timeouts = 0
+        self.connects = 0 # new connections opened
+        self.invalidations = 0 # connections dropped as broken (e.g. failed pre-ping)
+        self.closes = 0
+
+    def record_checkout(self, waited: float):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_total += waited
+            self.checkout_wait_max = max(self.checkout_wait_max, waited)
+            if waited > 0.1:
+                self.slow_checkouts += 1
+
+    def count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+
+pool_stats = PoolStats()
+async_pool_stats = PoolStats()
+
+
+class _MeteredPool:
+    """Records how long each checkout waited (including the pre-ping) in stats."""
+    stats = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            self.stats.count("timeouts")
+            raise
+        finally:
+            self.stats.record_checkout(time.perf_counter() - start)
+
+
+class MeteredQueuePool(_MeteredPool, QueuePool):
+    stats = pool_stats
+
+
+class MeteredAsyncQueuePool(_MeteredPool, AsyncAdaptedQueuePool):
+    stats = async_pool_stats
+
+
+def _pool_options() -> dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def _engine_options(url: str) -> dict:
+    if not url.startswith("postgresql"):
+        return {} # SQLite (local dev): library defaults
+    connect_args = {"connect_timeout": DB_CONNECT_TIMEOUT}
+    if DB_STATEMENT_TIMEOUT_MS and not DB_PGBOUNCER:
+        # Startup parameter: no extra round trip (PgBouncer rejects unknown ones)
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    return {
+        "poolclass": MeteredQueuePool,
+        **_pool_options(),
+        "connect_args": connect_args,
+    }
+
+
+def get_async_database_url(url: str) -> str:
+    """The same database through an asyncio driver (asyncpg, aiosqlite for local SQLite)."""
+    for prefix, driver in (("postgresql+psycopg2://", "postgresql+asyncpg://"),
+                           ("postgresql://", "postgresql+asyncpg://"),
+                           ("sqlite://", "sqlite+aiosqlite://")):
+        if url.startswith(prefix):
+            return driver + url[len(prefix):]
+    raise ValueError(f"No async driver for {url.split(':', 1)[0]}")
+
+
+def _async_engine_options(url: str) -> dict:
+    if not url.startswith("postgresql"):
+        return {}
+    connect_args = {"timeout": DB_CONNECT_TIMEOUT}
+    if DB_PGBOUNCER:
+        # asyncpg prepares every statement; PgBouncer may run the next one on
+        # another server connection, so nothing may be cached or reused by name
+        connect_args.update({
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4().hex}__",
+        })
+    elif DB_STATEMENT_TIMEOUT_MS:
+        connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    return {
+        "poolclass": MeteredAsyncQueuePool,
+        **_pool_options(),
+        "connect_args": connect_args,
+    }
+
+
+def _add_pool_listeners(engine, stats: PoolStats):
+    event.listen(engine, "connect", lambda *args: stats.count("connects"))
+    event.listen(engine, "invalidate", lambda *args: stats.count("invalidations"))
+    event.listen(engine, "close", lambda *args: stats.count("closes"))
+    if DB_PGBOUNCER and DB_STATEMENT_TIMEOUT_MS and engine.dialect.name == "postgresql":
+        # SET LOCAL only lasts for the transaction, so it never leaks to
+        # another client sharing the server connection
+        @event.listens_for(engine, "begin")
+        def set_statement_timeout(conn):
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
 
 def get_engine():
     """Get or create the database engine lazily."""
     global _engine
     if _engine is None:
         DATABASE_URL = get_database_url()
-        _engine = create_engine(DATABASE_URL)
+        _engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+        _add_pool_listeners(_engine, pool_stats)
     return _engine
 
+
+def get_async_engine():
+    """Get or create the asyncio engine (same database, asyncpg) lazily."""
+    global _async_engine
+    if _async_engine is None:
+        url = get_async_database_url(get_database_url())
+        _async_engine = create_async_engine(url, **_async_engine_options(url))
+        _add_pool_listeners(_async_engine.sync_engine, async_pool_stats)
+    return _async_engine
+
+
+def get_async_session_local():
+    """Get or create the AsyncSession factory lazily."""
+    global _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        _AsyncSessionLocal = async_sessionmaker(get_async_engine(), class_=AsyncSession,
+                                                autoflush=False, expire_on_commit=False)
+    return _AsyncSessionLocal
+
+
+def get_direct_database_url():
+    """URL bypassing PgBouncer, for session features such as LISTEN (None if unavailable)."""
+    direct_url = os.getenv("DATABASE_DIRECT_URL")
+    if direct_url or DB_PGBOUNCER:
+        return direct_url
+    return get_database_url()
+
+
+def get_pool_metrics() -> dict:
+    metrics = _pool_metrics(get_engine().pool, pool_stats)
+    if _async_engine is not None:
+        metrics["async"] = _pool_metrics(_async_engine.pool, async_pool_stats)
+    return metrics
+
+
+def _pool_metrics(pool, stats: PoolStats) -> dict:
+    metrics = {
+        "pool": pool.__class__.__name__,
+        "pgbouncer": DB_PGBOUNCER,
+        "checkouts": stats.checkouts,
+        "checkout_wait_avg_ms": round(stats.checkout_wait_total / stats.checkouts * 1000, 2) if stats.checkouts else None,
+        "checkout_wait_max_ms": round(stats.checkout_wait_max * 1000, 2),
+        "slow_checkouts": stats.slow_checkouts,
+        "timeouts": stats.timeouts,
+        "connects": stats.connects,
+        "invalidations": stats.invalidations,
+        "closes": stats.closes,
+    }
+    if isinstance(pool, QueuePool):
+        metrics.update({
+            "size": pool.size(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+        })
+    return metrics
+
 def get_session_local():
     """Get or create the SessionLocal lazily."""
     global _SessionLocal
@@ -56,3 +259,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+async def get_async_db():
+    async with get_async_session_local()() as db:
+        yield db
@@ -0,0 +1,224 @@
+"""
+Background jobs for slow work such as parsing uploaded project PDFs.
+
+Work runs in a process pool so OCR never blocks the web worker's event loop.
+At most PARSE_WORKERS jobs run at a time per web worker, and at most
+PARSE_QUEUE_LIMIT jobs may be queued or running before submit() raises
+QueueFull (surfaced as HTTP 429). Job state and results live in the jobs
+table, so clients can poll any web worker and results survive restarts.
+"""
+import datetime
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import models
+from database import get_session_local
+from utils.uploads import save_upload
+
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+PARSE_QUEUE_LIMIT = int(os.getenv("PARSE_QUEUE_LIMIT", "10"))
+JOB_DIR = os.getenv("JOB_DIR", "job_uploads") # Inputs waiting to be processed (not under static/)
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "1800"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+FINISHED = ("done", "failed")
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat()
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _update_job(job_id: str, **fields):
+    db = get_session_local()()
+    try:
+        db.query(models.Job).filter(models.Job.id == job_id).update({**fields, "updated_at": _now()})
+        db.commit()
+    finally:
+        db.close()
+
+
+# --- Job functions (run inside the pool, must be importable top-level functions) ---
+
+def parse_project_pdf(path: str, smart_crop: str = None) -> dict:
+    from utils.parser import parse_pdf
+    return parse_pdf(path, smart_crop=smart_crop)
+
+
+def import_cv_archive(path: str, dry_run: bool = False) -> dict:
+    from cv_import import import_cvs
+    return import_cvs(path, dry_run=dry_run)
+
+
+class JobRunner:
+    """Bounded dispatcher in front of a process pool."""
+
+    def __init__(self, max_workers: int, queue_limit: int):
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self._lock = threading.Lock()
+        self._pending = deque() # (job_id, fn, input_path)
+        self._running = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: children must not inherit the parent's DB connections
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._pending) + self._running
+
+    def has_capacity(self) -> bool:
+        return self.depth() < self.queue_limit
+
+    def submit(self, job_id: str, fn, input_path: str):
+        with self._lock:
+            if len(self._pending) + self._running >= self.queue_limit:
+                raise QueueFull()
+            self._pending.append((job_id, fn, input_path))
+        self._dispatch()
+
+    def _dispatch(self):
+        started = []
+        with self._lock:
+            while self._pending and self._running < self.max_workers:
+                started.append(self._pending.popleft())
+                self._running += 1
+        for job_id, fn, input_path in started:
+            _update_job(job_id, status="running")
+            try:
+                future = self._get_executor().submit(fn, input_path)
+            except Exception as e:
+                self._finish(job_id, input_path, None, e)
+                continue
+            future.add_done_callback(
+                lambda f, job_id=job_id, input_path=input_path: self._finish(job_id, input_path, f, None)
+            )
+
+    def _finish(self, job_id: str, input_path: str, future, error):
+        try:
+            if error is None:
+                error = future.exception()
+            if error is None:
+                _update_job(job_id, status="done", result=future.result())
+            else:
+                print(f"Job {job_id} failed: {error}")
+                if isinstance(error, BrokenProcessPool):
+                    # A worker died (e.g. out of memory); start a fresh pool for the next job
+                    self._executor = None
+                _update_job(job_id, status="failed", error=str(error) or error.__class__.__name__)
+        except Exception as e:
+            print(f"Could not store result for job {job_id}: {e}")
+        finally:
+            try:
+                os.remove(input_path)
+            except OSError:
+                pass
+            with self._lock:
+                self._running -= 1
+            self._dispatch()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+runner = JobRunner(PARSE_WORKERS, PARSE_QUEUE_LIMIT)
+
+
+def submit_file_job(db, kind: str, fileobj, fn) -> models.Job:
+    """
+    Persists the uploaded file, records a queued job and hands it to the runner.
+    Raises QueueFull when the queue is at its limit, UploadTooLarge when the
+    file is over the upload limit.
+    """
+    if not runner.has_capacity():
+        raise QueueFull()
+
+    job_id = uuid.uuid4().hex
+    os.makedirs(JOB_DIR, exist_ok=True)
+    input_path = os.path.join(JOB_DIR, f"{job_id}.input")
+    save_upload(fileobj, input_path) # Raises UploadTooLarge
+
+    job = models.Job(id=job_id, kind=kind, status="queued", worker=_worker_id(),
+                     created_at=_now(), updated_at=_now())
+    db.add(job)
+    db.commit()
+
+    try:
+        runner.submit(job_id, fn, input_path)
+    except QueueFull:
+        os.remove(input_path)
+        job.status = "failed"
+        job.error = "Queue is full"
+        db.commit()
+        raise
+    db.refresh(job)
+    return job
+
+
+def get_job(db, job_id: str):
+    return db.query(models.Job).filter(models.Job.id == job_id).first()
+
+
+def recover_interrupted_jobs():
+    """
+    Called at startup. Jobs left queued/running by a dead process on this host,
+    or not updated for JOB_STALE_SECONDS anywhere, are marked failed so clients
+    stop waiting. Finished jobs older than JOB_RETENTION_DAYS are removed.
+    """
+    db = get_session_local()()
+    try:
+        hostname = socket.gethostname()
+        stale_before = (datetime.datetime.utcnow() - datetime.timedelta(seconds=JOB_STALE_SECONDS)).isoformat()
+        unfinished = db.query(models.Job).filter(models.Job.status.notin_(FINISHED)).all()
+        for job in unfinished:
+            host, _, pid = (job.worker or "").rpartition(":")
+            dead = host == hostname and pid.isdigit() and not _pid_alive(int(pid))
+            if dead or (job.updated_at or "") < stale_before:
+                job.status = "failed"
+                job.error = "Interrupted by a server restart, " + (
+                    "resume it to continue" if job.kind == "bio_batch" else "please upload again")
+                job.updated_at = _now()
+
+        expire_before = (datetime.datetime.utcnow() - datetime.timedelta(days=JOB_RETENTION_DAYS)).isoformat()
+        db.query(models.Job).filter(
+            models.Job.status.in_(FINISHED), models.Job.updated_at < expire_before
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        print(f"Could not recover jobs: {e}")
+    finally:
+        db.close()
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
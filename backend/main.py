@@ -1,18 +1,25 @@
-from fastapi import FastAPI, Depends, HTTPException, File, UploadFile
+from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, RedirectResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Literal
+import asyncio
 import datetime
+import functools
+import json
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
 
 import models
 import schemas
 import crud
-from database import get_engine, get_session_local, Base
-from utils.parser import parse_pdf
+import jobs
+import bio_batch
+from database import get_engine, get_session_local, get_async_db, get_async_session_local, dispose_async_engine, get_direct_database_url, get_pool_metrics, Base
 from utils.cv_parser import parse_cv_pdf
+from utils import uploads, image_variants, ocr, blobs, storage, http_cache, read_cache, bio_writer
 
 from sqlalchemy import text
 from sqlalchemy.exc import ProgrammingError
@@ -24,10 +31,42 @@ def run_migrations():
         "ALTER TABLE employees ADD COLUMN bio TEXT",
         "ALTER TABLE employees ADD COLUMN languages JSON DEFAULT '[]'",
         "ALTER TABLE employees ADD COLUMN key_competencies JSON DEFAULT '[]'",
+        "ALTER TABLE employees ADD COLUMN generated_bio TEXT",
+        "ALTER TABLE employees ADD COLUMN generated_bio_fingerprint VARCHAR",
         "ALTER TABLE project_team_members ADD COLUMN cv_relevance TEXT",
         "ALTER TABLE project_team_members ADD COLUMN reference_name VARCHAR",
         "ALTER TABLE project_team_members ADD COLUMN reference_phone VARCHAR",
-        "ALTER TABLE project_team_members ADD COLUMN role_summary TEXT"
+        "ALTER TABLE project_team_members ADD COLUMN role_summary TEXT",
+        "ALTER TABLE project_images ADD COLUMN variants JSON",
+        "ALTER TABLE project_images ADD COLUMN width INTEGER",
+        "ALTER TABLE project_images ADD COLUMN content_hash VARCHAR",
+        "ALTER TABLE project_attachments ADD COLUMN content_hash VARCHAR",
+        "CREATE INDEX IF NOT EXISTS ix_project_images_content_hash ON project_images (content_hash)",
+        "CREATE INDEX IF NOT EXISTS ix_project_attachments_content_hash ON project_attachments (content_hash)",
+        # Composite indexes backing /projects/ filters and keyset sorts (see models.Project)
+        "CREATE INDEX IF NOT EXISTS ix_projects_type_location ON projects (type, location)",
+        "CREATE INDEX IF NOT EXISTS ix_projects_contract_type_performed_by ON projects (contract_type, performed_by)",
+        "CREATE INDEX IF NOT EXISTS ix_projects_type_value_id ON projects (type, contract_value_mnok, id)",
+        "CREATE INDEX IF NOT EXISTS ix_projects_name_id ON projects (name, id)",
+        "CREATE INDEX IF NOT EXISTS ix_projects_area_id ON projects (area_m2, id)",
+        "CREATE INDEX IF NOT EXISTS ix_projects_value_id ON projects (contract_value_mnok, id)",
+        # Full-text search (Postgres only): generated tsvector columns with the
+        # 'norwegian' configuration, weighted A (name) / B (facts) / C (free text)
+        """ALTER TABLE projects ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('norwegian', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('norwegian', coalesce(type, '') || ' ' || coalesce(location, '') || ' ' ||
+                coalesce(client, '') || ' ' || coalesce(contract_type, '') || ' ' ||
+                coalesce(certification, '') || ' ' || coalesce(tags::text, '')), 'B') ||
+            setweight(to_tsvector('norwegian', coalesce(description, '') || ' ' || coalesce(relevance, '') || ' ' ||
+                coalesce(challenges, '') || ' ' || coalesce(role_description, '')), 'C')
+        ) STORED""",
+        "CREATE INDEX IF NOT EXISTS ix_projects_search_vector ON projects USING GIN (search_vector)",
+        """ALTER TABLE employees ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('norwegian', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('norwegian', coalesce(title, '') || ' ' || coalesce(company, '')), 'B') ||
+            setweight(to_tsvector('norwegian', coalesce(bio, '') || ' ' || coalesce(key_competencies::text, '')), 'C')
+        ) STORED""",
+        "CREATE INDEX IF NOT EXISTS ix_employees_search_vector ON employees USING GIN (search_vector)"
     ]
     
     try:
@@ -49,23 +88,14 @@ def run_migrations():
 
 load_dotenv()
 
-# Initialize OpenAI client (lazy - only used when needed)
-_openai_client = None
-
-def get_openai_client():
-    """Get OpenAI client, initializing lazily to avoid startup crashes."""
-    global _openai_client
-    if _openai_client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key:
-            _openai_client = OpenAI(api_key=api_key)
-    return _openai_client
-
 app = FastAPI(title="ØMF Prosjektbank v2")
 
 # Configure CORS for frontend
 origins = ["*"]
 
+# Added first, so it runs inside CORSMiddleware: the browser must see the CORS
+# headers on an early 413 too
+app.add_middleware(uploads.MaxBodySizeMiddleware, max_bytes=uploads.MAX_UPLOAD_BYTES)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -83,15 +113,33 @@ def health_check():
 def health():
     return {"status": "ok"}
 
-from fastapi.staticfiles import StaticFiles
-import os
-
-# Ensure static directory exists
-os.makedirs("static/uploaded_images", exist_ok=True)
-os.makedirs("static/project_attachments", exist_ok=True)
-
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+@app.get("/metrics/cache")
+def cache_metrics():
+    # Hit/miss counters of this worker's read caches (see utils/read_cache.py)
+    return read_cache.stats()
+
+@app.get("/metrics/db")
+def db_metrics():
+    # Connection pool usage of this worker (see database.py)
+    return get_pool_metrics()
+
+# Files behind /static/... URLs (see utils/storage.py). Object storage and
+# CDN-fronted files are never streamed through a worker: the client is
+# redirected to a signed (or CDN) URL instead.
+if storage.STORAGE_BACKEND == "local" and not storage.STORAGE_PUBLIC_URL:
+    # Ensure static directory exists
+    os.makedirs("static/uploaded_images", exist_ok=True)
+    os.makedirs("static/project_attachments", exist_ok=True)
+
+    # Mount static files (names are unique, so they are cached for good)
+    app.mount("/static", http_cache.ImmutableStaticFiles(directory="static"), name="static")
+else:
+    @app.get("/static/{key:path}")
+    def static_redirect(key: str):
+        # Signed URLs expire, so browsers may only reuse the redirect for a while
+        max_age = min(300, storage.SIGNED_URL_SECONDS // 2)
+        return RedirectResponse(storage.get_storage().download_url(key), status_code=307,
+                                headers={"Cache-Control": f"private, max-age={max_age}"})
 
 # Dependency
 def get_db():
@@ -102,18 +150,83 @@ def get_db():
     finally:
         db.close()
 
+# The hot read endpoints are `async def` on the asyncio engine (see
+# database.get_async_engine): they serve many concurrent requests per worker
+# on the event loop instead of holding a threadpool thread each. Their
+# dependencies are async too, since sync dependencies also run in the pool.
+def conditional_get(*tables):
+    """
+    Dependency for read endpoints built from the given tables: answers 304 if
+    the client's copy is still current, otherwise adds ETag/Last-Modified.
+    """
+    async def check(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+        versions = await crud.get_table_versions_async(db, tables)
+        url = request.url.path + ("?" + request.url.query if request.url.query else "")
+        etag, last_modified = http_cache.validators(url, versions)
+        headers = {"ETag": etag, "Cache-Control": http_cache.API_CACHE_CONTROL}
+        if last_modified:
+            headers["Last-Modified"] = last_modified
+        if http_cache.is_not_modified(request.headers, etag, last_modified):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+    return Depends(check)
+
 @app.post("/projects/", response_model=schemas.Project)
 def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db)):
     return crud.create_project(db=db, project=project)
 
-@app.get("/projects/", response_model=List[schemas.Project])
-def read_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    projects = crud.get_projects(db, skip=skip, limit=limit)
-    return projects
+async def project_filters(
+    tag: Optional[str] = None,
+    type: Optional[str] = None,
+    location: Optional[str] = None,
+    contract_type: Optional[str] = None,
+    performed_by: Optional[str] = None,
+    min_area: Optional[int] = None,
+    max_area: Optional[int] = None,
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None,
+):
+    """Shared query parameters for filtering project lists."""
+    return {
+        "tag": tag,
+        "type": type,
+        "location": location,
+        "contract_type": contract_type,
+        "performed_by": performed_by,
+        "min_area": min_area,
+        "max_area": max_area,
+        "min_value": min_value,
+        "max_value": max_value,
+    }
+
+async def project_page_params(
+    sort: str = "id", # One of crud.PROJECT_SORT_COLUMNS
+    order: Literal["asc", "desc"] = "asc",
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+):
+    return {"sort": sort, "descending": order == "desc", "cursor": cursor, "limit": limit}
+
+@app.get("/projects/", response_model=schemas.ProjectPage, dependencies=[conditional_get("projects", "employees")])
+async def read_projects(filters: dict = Depends(project_filters), page: dict = Depends(project_page_params),
+                        db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await crud.get_projects_async(db, filters=filters, **page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/projects/summary", response_model=schemas.ProjectSummaryPage, dependencies=[conditional_get("projects")])
+async def read_project_summaries(filters: dict = Depends(project_filters), page: dict = Depends(project_page_params),
+                                 db: AsyncSession = Depends(get_async_db)):
+    # Declared before /projects/{project_id} so "summary" is not parsed as an id
+    try:
+        return await crud.get_project_summaries_async(db, filters=filters, **page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/projects/{project_id}", response_model=schemas.Project)
-def read_project(project_id: int, db: Session = Depends(get_db)):
-    db_project = crud.get_project(db, project_id=project_id)
+@app.get("/projects/{project_id}", response_model=schemas.Project, dependencies=[conditional_get("projects", "employees")])
+async def read_project(project_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_project = await crud.get_project_async(db, project_id=project_id)
     if db_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
     return db_project
@@ -132,38 +245,41 @@ def delete_project(project_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Project not found")
     return db_project
 
-@app.get("/types/", response_model=List[schemas.ProjectType])
-def read_project_types(db: Session = Depends(get_db)):
-    return crud.get_project_types(db)
-
-@app.get("/tags/", response_model=List[str])
-def read_tags(db: Session = Depends(get_db)):
-    # Fetch all tags from all projects and return unique list
-    # Postgres JSONB support allows aggregation but doing it in python for simplicity/portability
-    # or use simple SQL query
-    projects = db.query(models.Project.tags).all()
-    # projects is list of tuples [(['tag1'],), (None,), ...]
-    
-    unique_tags = set()
-    for p in projects:
-        if p.tags: # p.tags is the list
-            for tag in p.tags:
-                unique_tags.add(tag)
-                
-    return sorted(list(unique_tags))
+@app.get("/types/", response_model=List[schemas.ProjectType], dependencies=[conditional_get("project_types")])
+async def read_project_types(db: AsyncSession = Depends(get_async_db)):
+    return await crud.get_project_types_async(db)
+
+@app.get("/tags/", response_model=List[str], dependencies=[conditional_get("projects")])
+async def read_tags(db: AsyncSession = Depends(get_async_db)):
+    # Unique, sorted tag names aggregated in SQL (see crud.get_tag_counts)
+    return [t.name for t in await crud.get_tag_counts_async(db)]
+
+@app.get("/tags/counts", response_model=List[schemas.TagCount], dependencies=[conditional_get("projects")])
+async def read_tag_counts(db: AsyncSession = Depends(get_async_db)):
+    return await crud.get_tag_counts_async(db)
+
+@app.get("/search", response_model=schemas.SearchResults, dependencies=[conditional_get("projects", "employees")])
+async def search(
+    q: str = Query(..., min_length=1),
+    kind: Optional[Literal["project", "employee"]] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await crud.search_async(db, q, kind=kind, limit=limit, offset=offset)
 
 # Employee / Team Endpoints
-@app.get("/employees/", response_model=List[schemas.Employee])
-def read_employees(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_employees(db, skip=skip, limit=limit)
+@app.get("/employees/", response_model=List[schemas.Employee], dependencies=[conditional_get("employees")])
+async def read_employees(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    return await crud.get_employees_async(db, skip=skip, limit=limit)
 
 @app.post("/employees/", response_model=schemas.Employee)
 def create_employee(employee: schemas.EmployeeCreate, db: Session = Depends(get_db)):
     return crud.create_employee(db=db, employee=employee)
 
-@app.get("/employees/{employee_id}", response_model=schemas.EmployeeDetail)
-def read_employee(employee_id: int, db: Session = Depends(get_db)):
-    db_employee = crud.get_employee(db, employee_id=employee_id)
+@app.get("/employees/{employee_id}", response_model=schemas.EmployeeDetail, dependencies=[conditional_get("employees", "projects")])
+async def read_employee(employee_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_employee = await crud.get_employee_async(db, employee_id=employee_id)
     if not db_employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     return db_employee
@@ -175,73 +291,84 @@ def update_employee(employee_id: int, employee: schemas.EmployeeUpdate, db: Sess
         raise HTTPException(status_code=404, detail="Employee not found")
     return db_employee
 
-@app.post("/employees/{employee_id}/generate-bio")
-def generate_employee_bio(employee_id: int, db: Session = Depends(get_db)):
-    # Use schemas.EmployeeDetail or just get the object with relationships
-    db_employee = crud.get_employee(db, employee_id=employee_id)
-    if not db_employee:
-        raise HTTPException(status_code=404, detail="Employee not found")
-    
-    # Extract data for prompt
-    exp_summary = "\n".join([f"- {exp.title} hos {exp.company} ({exp.time_frame})" for exp in db_employee.work_experiences])
-    edu_summary = "\n".join([f"- {edu.degree} fra {edu.institution} ({edu.time_frame})" for edu in db_employee.educations])
-    projects = []
-    for tm in db_employee.team_memberships:
-        proj = tm.project
-        projects.append(f"- {proj.name}: Rolle: {tm.role}. {tm.cv_relevance or ''} {tm.role_summary or ''}")
-    proj_summary = "\n".join(projects)
-
-    competencies = ", ".join(db_employee.key_competencies) if db_employee.key_competencies else "Ikke spesifisert"
-
-    prompt = f"""
-    Du er en profesjonell CV-skriver for entreprenørselskapet Ø.M. Fjeld. 
-    Skriv en profiltekst for {db_employee.name}, som har rollen {db_employee.title}.
-    
-    Teksten skal være:
-    1. Informativ, selgende og sannferdig.
-    2. Appelere til profesjonelle byggherrer i anbudsrunder.
-    3. Fokusere på erfaring, pålitelighet og kompetanse.
-    4. Skrevet i 3. person (f.eks. "{db_employee.name.split()[0]} har...")
-    
-    HER ER BAKGRUNNSDATA:
-    Rolle: {db_employee.title}
-    Nøkkelkompetanse: {competencies}
-    
-    ARBEIDSERFARING:
-    {exp_summary}
-    
-    PROSJEKTERFARING:
-    {proj_summary}
-    
-    UTDANNING:
-    {edu_summary}
-    
-    Skriv teksten på norsk. Hold den konsis, men kraftfull (ca 100-150 ord).
-    """
-
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key or api_key == "your_api_key_here":
-        firstName = db_employee.name.split()[0]
-        return {"bio": f"(DEMO-MODUS - Legg inn API-nøkkel for full versjon)\n\n{db_employee.name} er en svært erfaren {db_employee.title} i Ø.M. Fjeld. Gjennom sin karriere har vedkommende opparbeidet seg solid kompetanse innen planlegging og gjennomføring av komplekse byggeprosjekter. {firstName} er kjent for å levere med høyeste kvalitet og har særlig fokus på god dialog med kunden. Erfaringen inkluderer prosjekter med høy teknisk kompleksitet, hvor {firstName} har vist seg som en handlekraftig og løsningsorientert ressursperson."}
+async def _store_generated_bio(employee_id: int, fingerprint: str, bio: str):
+    # Runs after the request that started the generation may be gone: own session
+    async with get_async_session_local()() as db:
+        await crud.store_generated_bio_async(db, employee_id, fingerprint, bio)
+
+async def _bio_text(employee_id: int, refresh: bool):
+    """Async iterator over the profile text: stored, joined in flight, or newly generated."""
+    # A session of its own, closed before the completion starts: an injected one
+    # would hold a pooled connection until the whole (streamed) response is done
+    async with get_async_session_local()() as db:
+        db_employee = await crud.get_employee_async(db, employee_id=employee_id)
+        if not db_employee:
+            raise HTTPException(status_code=404, detail="Employee not found")
+        if not bio_writer.is_configured():
+            return bio_writer.replay(bio_writer.demo_bio(db_employee))
+
+        prompt = bio_writer.build_prompt(db_employee)
+        key = bio_writer.fingerprint(prompt)
+        if not refresh and db_employee.generated_bio and db_employee.generated_bio_fingerprint == key:
+            return bio_writer.replay(db_employee.generated_bio)
+    on_complete = functools.partial(_store_generated_bio, employee_id, key)
+    return bio_writer.generate(key, prompt, on_complete).follow()
 
+@app.post("/employees/{employee_id}/generate-bio")
+async def generate_employee_bio(employee_id: int, refresh: bool = False):
+    # refresh=true asks for a new text even if the CV data is unchanged
+    chunks = await _bio_text(employee_id, refresh)
     try:
-        client = get_openai_client()
-        if not client:
-            return {"bio": "(API-nøkkel mangler - kan ikke generere bio)"}
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "Du er en ekspert på å skrive CV-profiler for bygg- og anleggsbransjen."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
-        )
-        return {"bio": response.choices[0].message.content}
-    except Exception as e:
-        print(f"AI Generation error: {e}")
+        return {"bio": "".join([chunk async for chunk in chunks])}
+    except bio_writer.GenerationFailed as e:
         # Log error but don't crash entirely if it's just an API issue
         return {"bio": f"Kunne ikke generere AI-tekst akkurat nå: {str(e)}"}
 
+@app.post("/employees/{employee_id}/generate-bio/stream")
+async def stream_employee_bio(employee_id: int, refresh: bool = False):
+    """Server-sent events with the text as it is generated, then a done (or error) event."""
+    chunks = await _bio_text(employee_id, refresh)
+
+    async def events():
+        try:
+            async for chunk in chunks:
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+        except bio_writer.GenerationFailed as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.post("/employees/generate-bios", response_model=schemas.Job, status_code=202)
+async def generate_employee_bios(batch: schemas.BioBatchCreate):
+    # Runs in the background of this worker, see bio_batch.py.
+    # Poll GET /api/jobs/{id} or stream GET /api/jobs/{id}/events for the progress.
+    if not bio_writer.is_configured():
+        raise HTTPException(status_code=503, detail="OPENAI_API_KEY is not configured")
+    job = await bio_batch.create_batch(**batch.dict())
+    bio_batch.start_batch(job.id)
+    return job
+
+@app.post("/api/jobs/{job_id}/resume", response_model=schemas.Job, status_code=202)
+async def resume_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    # Continues a bio batch that failed part way; finished employees are not redone
+    job = await db.get(models.Job, job_id)
+    if not job or job.kind != bio_batch.KIND:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # A failed batch is still in this worker until its task has finished; the
+    # status only changes once a fresh run can start, or it would stay "queued"
+    if job.status in ("queued", "running") or bio_batch.is_running(job_id):
+        raise HTTPException(status_code=409, detail="Job is still running")
+    if job.status == "failed":
+        job.status, job.error = "queued", None
+        await db.commit()
+        try:
+            bio_batch.start_batch(job_id)
+        except bio_batch.BatchRunning:
+            raise HTTPException(status_code=409, detail="Job is still running")
+    return job
+
 @app.post("/projects/{project_id}/team", response_model=schemas.ProjectTeamMember)
 def add_team_member(project_id: int, member: schemas.ProjectTeamMemberCreate, db: Session = Depends(get_db)):
     # Verify project exists
@@ -255,21 +382,21 @@ def add_team_member(project_id: int, member: schemas.ProjectTeamMemberCreate, db
         
     return db_member
 
+# Upload endpoints are plain `def` so FastAPI runs them in its threadpool:
+# the file writes and DB calls never block the event loop.
 @app.post("/projects/{project_id}/attachments/", response_model=schemas.ProjectAttachment)
-async def upload_attachment(project_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+def upload_attachment(project_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
     # Verify project
     db_project = crud.get_project(db, project_id=project_id)
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    # Save file
-    safe_filename = file.filename.replace(" ", "_").replace("/", "_")
-    unique_filename = f"{uuid.uuid4().hex}_{safe_filename}"
-    file_path = f"static/project_attachments/{unique_filename}"
-    
+    # Save file (content-addressed: identical files are stored once)
+    file_ext = os.path.splitext(file.filename)[1]
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        file_path, _ = blobs.store_upload(file.file, "project_attachments", file_ext)
+    except uploads.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File is too large")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
 
@@ -286,7 +413,7 @@ async def upload_attachment(project_id: int, file: UploadFile = File(...), db: S
     # Create DB entry
     att_in = schemas.ProjectAttachmentCreate(
         filename=file.filename,
-        file_path="/" + file_path, # URL path
+        file_path=file_path, # URL path
         file_type=file_type,
         upload_date=datetime.datetime.now().isoformat()
     )
@@ -295,64 +422,129 @@ async def upload_attachment(project_id: int, file: UploadFile = File(...), db: S
 
 @app.delete("/attachments/{attachment_id}", response_model=schemas.ProjectAttachment)
 def delete_attachment(attachment_id: int, db: Session = Depends(get_db)):
-    # Get attachment to find path
-    db_att = db.query(models.ProjectAttachment).filter(models.ProjectAttachment.id == attachment_id).first()
+    # The file is removed with its last reference (see crud.release_blobs)
+    db_att = crud.delete_project_attachment(db, attachment_id)
     if not db_att:
         raise HTTPException(status_code=404, detail="Attachment not found")
-        
-    # Remove file
-    local_path = db_att.file_path.lstrip("/")
-    if os.path.exists(local_path):
-        try:
-            os.remove(local_path)
-        except Exception as e:
-            print(f"Error removing file {local_path}: {e}")
-        
-    return crud.delete_project_attachment(db, attachment_id)
+    return db_att
 
 
 @app.post("/employees/upload-cv")
-async def upload_cv_pdf(file: UploadFile = File(...)):
+def upload_cv_pdf(file: UploadFile = File(...)):
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="File must be a PDF")
     
-    content = await file.read()
-    extracted_data = parse_cv_pdf(content)
+    # The parser reads from disk; the upload is never held in memory whole
+    try:
+        with uploads.upload_to_tempfile(file.file) as path:
+            extracted_data = parse_cv_pdf(path)
+    except uploads.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File is too large")
     
     if "error" in extracted_data:
         raise HTTPException(status_code=422, detail=extracted_data["error"])
         
     return extracted_data
 
-@app.post("/api/upload")
-async def parse_project_pdf(file: UploadFile = File(...)):
+@app.post("/employees/import-cvs", response_model=schemas.Job, status_code=202)
+def import_cvs(file: UploadFile = File(...), dry_run: bool = False, db: Session = Depends(get_db)):
+    # A zip of CV PDFs, imported as employees in a background job (see cv_import.py).
+    # The job's result is the report; dry_run=true only reports what would be created.
+    if not (file.filename or "").lower().endswith(".zip"):
+        raise HTTPException(status_code=400, detail="File must be a zip of PDFs")
+
+    run = functools.partial(jobs.import_cv_archive, dry_run=dry_run)
+    try:
+        return jobs.submit_file_job(db, "cv_import", file.file, run)
+    except uploads.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File is too large")
+    except jobs.QueueFull:
+        raise HTTPException(status_code=429, detail="Too many jobs are running, try again shortly",
+                            headers={"Retry-After": "10"})
+
+@app.post("/api/upload", response_model=schemas.Job, status_code=202)
+def parse_project_pdf(
+    file: UploadFile = File(...),
+    smart_crop: Optional[Literal["auto", "text", "off"]] = None,
+    db: Session = Depends(get_db),
+):
+    # Parsing (OCR) takes tens of seconds, so it runs as a background job.
+    # Poll GET /api/jobs/{id} or stream GET /api/jobs/{id}/events for the result.
+    # smart_crop=off skips trimming extracted images (default: PARSE_SMART_CROP).
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="File must be a PDF")
-    
-    content = await file.read()
-    extracted_data = parse_pdf(content)
-    return extracted_data
 
-import uuid
-import shutil
+    parse = functools.partial(jobs.parse_project_pdf, smart_crop=smart_crop)
+    try:
+        return jobs.submit_file_job(db, "project_pdf", file.file, parse)
+    except uploads.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File is too large")
+    except jobs.QueueFull:
+        raise HTTPException(status_code=429, detail="Too many PDFs are being processed, try again shortly",
+                            headers={"Retry-After": "10"})
+
+@app.get("/api/jobs/{job_id}", response_model=schemas.Job)
+def read_job(job_id: str, db: Session = Depends(get_db)):
+    job = jobs.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-sent events with the job state each time it changes, until it finishes."""
+    def snapshot():
+        db = get_session_local()()
+        try:
+            job = jobs.get_job(db, job_id)
+            return schemas.Job.model_validate(job).model_dump() if job else None
+        finally:
+            db.close()
+
+    async def events():
+        last = None
+        while True:
+            job = await run_in_threadpool(snapshot)
+            if job is None:
+                yield "event: error\ndata: Job not found\n\n"
+                return
+            if job != last:
+                yield f"data: {json.dumps(job)}\n\n"
+                last = job
+            if job["status"] in jobs.FINISHED:
+                return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 
 @app.post("/api/upload-image")
-async def upload_image(file: UploadFile = File(...)):
+def upload_image(file: UploadFile = File(...)):
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    # Generate unique filename
-    file_ext = file.filename.split('.')[-1]
-    filename = f"img_{uuid.uuid4().hex}.{file_ext}"
-    file_path = f"static/uploaded_images/{filename}"
-    
+    # Content-addressed: re-uploading the same image stores nothing new
+    file_ext = os.path.splitext(file.filename)[1]
     try:
-        with open(file_path, "wb") as buffer:
-             shutil.copyfileobj(file.file, buffer)
+        url, _ = blobs.store_upload(file.file, "uploaded_images", file_ext)
+    except uploads.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File is too large")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Could not save image: {e}")
-        
-    return {"url": f"/static/uploaded_images/{filename}"}
+
+    image_variants.schedule(url) # Thumbnails are ready by the time the project is saved
+    return {"url": url}
+
+@app.on_event("shutdown")
+def shutdown_event():
+    jobs.runner.shutdown()
+    image_variants.shutdown()
+    ocr.shutdown()
+    read_cache.stop_listener()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await dispose_async_engine()
 
 # Seed initial types if empty
 @app.on_event("startup")
@@ -368,6 +560,22 @@ def startup_event():
     
     # Run migrations
     run_migrations()
+
+    # Fail jobs interrupted by a restart and drop old results
+    jobs.recover_interrupted_jobs()
+
+    # Counters behind the read endpoints' ETags
+    db = get_session_local()()
+    try:
+        crud.ensure_table_versions(db)
+    except Exception as e:
+        db.rollback() # Another worker seeded them concurrently
+        print(f"Could not seed table versions: {e}")
+    finally:
+        db.close()
+
+    # Invalidate the read caches when other workers write
+    read_cache.start_listener(engine, get_direct_database_url())
     
     # Seed project types
     SessionLocal = get_session_local()
@@ -378,11 +586,15 @@ def startup_event():
             "Offentlig", "Skole", "Spesialbygg", "Undervisning"
         ]
         
+        added = False
         for t_name in standard_types:
             exists = db.query(models.ProjectType).filter(models.ProjectType.name == t_name).first()
             if not exists:
                 db.add(models.ProjectType(name=t_name))
+                added = True
         
+        if added: # A restart must not invalidate the cached /types/ responses
+            crud.bump_versions(db, "project_types")
         db.commit()
         print("Project types seeded successfully")
     except Exception as e:
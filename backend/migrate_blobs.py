@@ -0,0 +1,64 @@
+import os
+import shutil
+from database import get_session_local
+import models
+import crud
+from utils import blobs
+from utils.storage import get_storage, key_from_url
+
+# One-off migration: move images and attachments saved as img_<uuid>.ext or
+# <uuid>_<name> into the content-addressed layout of utils/blobs.py, so
+# identical files collapse into one and rows get their content_hash. The old
+# files are deleted afterwards. Safe to run more than once. Old files no row
+# references are not touched here; sweep_blobs.py removes those.
+
+def migrate():
+    db = get_session_local()()
+    storage = get_storage()
+    moved = {} # old URL -> blob URL
+
+    def to_blob(url):
+        if not url or not url.startswith("/static/") or blobs.digest_from_url(url):
+            return url
+        if url not in moved:
+            key = key_from_url(url)
+            if not storage.exists(key):
+                print(f"Missing file, left as is: {key}")
+                return url
+            prefix, ext = os.path.dirname(key), os.path.splitext(key)[1]
+            tmp_path = blobs.staging_path(prefix)
+            with storage.local_file(key) as path:
+                shutil.copyfile(path, tmp_path)
+            moved[url], _ = blobs.store_file(tmp_path, prefix, ext)
+        return moved[url]
+
+    try:
+        for image in db.query(models.ProjectImage):
+            url = to_blob(image.url)
+            if url != image.url:
+                image.url = url
+                image.variants = None # Re-created lazily under the new name
+            image.content_hash = blobs.digest_from_url(url)
+        for attachment in db.query(models.ProjectAttachment):
+            attachment.file_path = to_blob(attachment.file_path)
+            attachment.content_hash = blobs.digest_from_url(attachment.file_path)
+        for project in db.query(models.Project).filter(models.Project.image_url.isnot(None)):
+            project.image_url = to_blob(project.image_url)
+        for employee in db.query(models.Employee).filter(models.Employee.image_url.isnot(None)):
+            employee.image_url = to_blob(employee.image_url)
+        crud.bump_versions(db, "projects", "employees") # URLs in cached responses changed
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Migration failed: {e}")
+        return
+    finally:
+        db.close()
+
+    # Only now that no row points at them any more
+    for url in moved:
+        blobs.remove(url, grace=0)
+    print(f"Migration successful: {len(moved)} files moved into {len(set(moved.values()))} blobs.")
+
+if __name__ == "__main__":
+    migrate()
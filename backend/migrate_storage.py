@@ -0,0 +1,37 @@
+import os
+import shutil
+from utils.storage import get_storage, LocalStorage, STATIC_DIR
+
+# One-off migration: copy the files under static/ into the configured storage
+# backend (STORAGE_BACKEND=s3, see utils/storage.py) when moving off local
+# disk. URLs in the database stay the same. Files already in the bucket are
+# skipped, so it is safe to run more than once.
+
+def migrate():
+    storage = get_storage()
+    if isinstance(storage, LocalStorage):
+        print("STORAGE_BACKEND is local, nothing to copy.")
+        return
+
+    copied = skipped = 0
+    for root, _, files in os.walk(STATIC_DIR):
+        for name in files:
+            if name.endswith(".tmp"):
+                continue # Unfinished upload
+            path = os.path.join(root, name)
+            key = os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+            if storage.exists(key):
+                skipped += 1
+                continue
+            try:
+                # put_file consumes its input, so hand it a copy
+                tmp_path = storage.staging_path(key)
+                shutil.copyfile(path, tmp_path)
+                storage.put_file(tmp_path, key)
+                copied += 1
+            except Exception as e:
+                print(f"Could not copy {key}: {e}")
+    print(f"Migration successful: {copied} files copied, {skipped} already present.")
+
+if __name__ == "__main__":
+    migrate()
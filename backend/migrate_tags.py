@@ -0,0 +1,39 @@
+from database import get_engine
+from sqlalchemy import text
+
+# One-off migration: store projects.tags as JSONB and index it with GIN so
+# tag filters (tags @> '["Skole"]') and the /tags/ aggregate use the index.
+# Safe to run more than once.
+
+def migrate():
+    engine = get_engine()
+    with engine.connect() as conn:
+        try:
+            data_type = conn.execute(text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = 'projects' AND column_name = 'tags'"
+            )).scalar()
+            if data_type != "jsonb":
+                conn.execute(text("ALTER TABLE projects ALTER COLUMN tags TYPE JSONB USING tags::jsonb"))
+                conn.execute(text("ALTER TABLE projects ALTER COLUMN tags SET DEFAULT '[]'::jsonb"))
+                print(f"Converted projects.tags from {data_type} to jsonb.")
+
+            # Existing rows may hold NULL or JSON null; normalise to empty lists
+            result = conn.execute(text(
+                "UPDATE projects SET tags = '[]'::jsonb "
+                "WHERE tags IS NULL OR jsonb_typeof(tags) <> 'array'"
+            ))
+            print(f"Normalised tags on {result.rowcount} rows.")
+
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_projects_tags_gin "
+                "ON projects USING GIN (tags jsonb_path_ops)"
+            ))
+            conn.commit()
+            print("Migration successful: tags stored as JSONB with GIN index.")
+        except Exception as e:
+            conn.rollback()
+            print(f"Migration failed: {e}")
+
+if __name__ == "__main__":
+    migrate()
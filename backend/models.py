@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, Text, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, Text, Boolean, ForeignKey, JSON, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from database import Base
+from utils import image_variants
 
 class Project(Base):
     __tablename__ = "projects"
@@ -34,21 +36,47 @@ class Project(Base):
     role_description = Column(Text, nullable=True) # Firmaets rolle i prosjektet
 
     image_url = Column(String, nullable=True)
-    tags = Column(JSON, default=list) # List of strings
+    tags = Column(JSON().with_variant(JSONB(), "postgresql"), default=list) # List of strings, JSONB on Postgres
     
     images = relationship("ProjectImage", back_populates="project", cascade="all, delete-orphan")
     attachments = relationship("ProjectAttachment", back_populates="project", cascade="all, delete-orphan")
     team_members = relationship("ProjectTeamMember", back_populates="project", cascade="all, delete-orphan")
 
+    # Composite indexes for the common /projects/ filter combinations and the
+    # (sort_key, id) keyset sorts. Mirrored in run_migrations for existing databases.
+    __table_args__ = (
+        Index("ix_projects_type_location", "type", "location"),
+        Index("ix_projects_contract_type_performed_by", "contract_type", "performed_by"),
+        Index("ix_projects_type_value_id", "type", "contract_value_mnok", "id"),
+        Index("ix_projects_name_id", "name", "id"),
+        Index("ix_projects_area_id", "area_m2", "id"),
+        Index("ix_projects_value_id", "contract_value_mnok", "id"),
+        # GIN index for tag containment (tags @> '["Skole"]'). Postgres only,
+        # existing databases get it from migrate_tags.py.
+        Index(
+            "ix_projects_tags_gin", "tags",
+            postgresql_using="gin", postgresql_ops={"tags": "jsonb_path_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
 class ProjectImage(Base):
     __tablename__ = "project_images"
     
     id = Column(Integer, primary_key=True, index=True)
     url = Column(String, nullable=False)
     project_id = Column(Integer, ForeignKey("projects.id"))
+    content_hash = Column(String, nullable=True, index=True) # SHA-256 of the file, see utils/blobs.py
+    # Widths of the downscaled variants on disk (see utils/image_variants.py).
+    # NULL until they have been generated.
+    variants = Column(JSON, nullable=True)
+    width = Column(Integer, nullable=True) # Of the original, in pixels; recorded with the variants
     
     project = relationship("Project", back_populates="images")
 
+    @property
+    def srcset(self):
+        return image_variants.srcset(self.url, self.variants, self.width)
+
 class ProjectType(Base):
     """
     To store the unique list of project types for the 'Creatable Select' dropdown.
@@ -71,6 +99,9 @@ class Employee(Base):
     bio = Column(Text, nullable=True) # Profiltekst
     languages = Column(JSON, default=list) # List of strings or objects
     key_competencies = Column(JSON, default=list) # Nøkkelkompetanse
+    # Last AI-generated profile text and the fingerprint of its prompt (see utils/bio_writer.py)
+    generated_bio = Column(Text, nullable=True)
+    generated_bio_fingerprint = Column(String, nullable=True)
 
     # Relationships
     team_memberships = relationship("ProjectTeamMember", back_populates="employee")
@@ -135,7 +166,29 @@ class ProjectAttachment(Base):
     project_id = Column(Integer, ForeignKey("projects.id"))
     filename = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
+    content_hash = Column(String, nullable=True, index=True) # SHA-256 of the file, see utils/blobs.py
     file_type = Column(String, nullable=True) # "word", "pdf", "image"
     upload_date = Column(String, nullable=True) # storing as string ISO for simplicity
 
     project = relationship("Project", back_populates="attachments")
+
+class Job(Base):
+    """Background job (e.g. PDF parsing), see jobs.py."""
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True) # uuid4 hex
+    kind = Column(String, nullable=False) # e.g. "project_pdf"
+    status = Column(String, nullable=False, default="queued", index=True) # queued, running, done, failed
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    worker = Column(String, nullable=True) # "hostname:pid" of the process that owns the job
+    created_at = Column(String, nullable=True) # ISO timestamps (UTC)
+    updated_at = Column(String, nullable=True)
+
+class TableVersion(Base):
+    """Write counter per table, behind the ETags of the read endpoints (see crud.bump_versions)."""
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True) # e.g. "projects"
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(String, nullable=True) # ISO timestamp (UTC) of the last bump
@@ -1,5 +1,10 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
+
+# Tag Schemas
+class TagCount(BaseModel):
+    name: str
+    count: int
 
 # ProjectType Schemas
 class ProjectTypeBase(BaseModel):
@@ -52,6 +57,9 @@ class ProjectImageCreate(ProjectImageBase):
 class ProjectImage(ProjectImageBase):
     id: int
     project_id: int
+    # {"image/webp": "<url> 320w, <url> 800w, ..., <original url> <width>w", "image/jpeg": ...};
+    # null until the variants exist, use url meanwhile
+    srcset: Optional[Dict[str, str]] = None
     class Config:
         from_attributes = True
 
@@ -194,3 +202,64 @@ class Project(ProjectBase):
     
     class Config:
         from_attributes = True
+
+# Card data for the landing page - only the columns the project card renders
+class ProjectSummary(BaseModel):
+    id: int
+    name: str
+    type: str
+    location: str
+    time_frame: Optional[str] = None
+    contract_type: Optional[str] = None
+    image_url: Optional[str] = None
+    first_image: Optional[str] = None # URL of the first ProjectImage, if any
+    first_image_srcset: Optional[Dict[str, str]] = None # Same shape as ProjectImage.srcset
+    tags: Optional[List[str]] = []
+
+    class Config:
+        from_attributes = True
+
+# Keyset-paginated list responses. Pass next_cursor back as ?cursor= to get
+# the following page; it is null on the last page.
+class ProjectPage(BaseModel):
+    items: List[Project]
+    next_cursor: Optional[str] = None
+
+class ProjectSummaryPage(BaseModel):
+    items: List[ProjectSummary]
+    next_cursor: Optional[str] = None
+
+# Search Schemas
+class SearchHit(BaseModel):
+    kind: str # "project" or "employee"
+    id: int
+    title: str
+    subtitle: Optional[str] = None # type/location for projects, title/company for employees
+    snippet: Optional[str] = None # Matched text with <b></b> around hits
+    rank: float
+
+class SearchResults(BaseModel):
+    items: List[SearchHit]
+    next_offset: Optional[int] = None # Pass as ?offset= for the next page
+
+# Job Schemas
+class Job(BaseModel):
+    id: str
+    kind: str
+    status: str # queued, running, done, failed
+    result: Optional[dict] = None # Parser output or import report once status is "done"; progress of a bio batch
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class BioBatchCreate(BaseModel):
+    # Employees matching all given criteria (everyone if none is given)
+    employee_ids: Optional[List[int]] = None
+    title: Optional[str] = None
+    company: Optional[str] = None
+    project_id: Optional[int] = None # The project's team
+    refresh: bool = False # Also regenerate texts that are current for the CV data
+    apply: bool = False # Replace the profile texts, not only the suggestions on the CV page
@@ -0,0 +1,27 @@
+import argparse
+from database import get_session_local
+import crud
+from utils import blobs
+
+# Removes stored images and attachments that no row references any more (see
+# crud.sweep_unreferenced_files): files of the layout before migrate_blobs.py,
+# and files left behind by failed requests. Files stored within the grace
+# period may still be about to be linked and are kept. Safe to run any time.
+
+def sweep(dry_run: bool = False, grace: int = blobs.BLOB_GRACE_SECONDS):
+    db = get_session_local()()
+    try:
+        removed = crud.sweep_unreferenced_files(db, grace=grace, dry_run=dry_run)
+    finally:
+        db.close()
+    for url in removed:
+        print(f"{'Would remove' if dry_run else 'Removed'}: {url}")
+    print(f"Sweep done: {len(removed)} unreferenced files {'found' if dry_run else 'removed'}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove stored files no row references.")
+    parser.add_argument("--dry-run", action="store_true", help="List the files only")
+    parser.add_argument("--grace", type=int, default=blobs.BLOB_GRACE_SECONDS,
+                        help="Keep files stored within this many seconds")
+    args = parser.parse_args()
+    sweep(dry_run=args.dry_run, grace=args.grace)
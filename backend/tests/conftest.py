@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+
+# Settings are read at import time: a throwaway SQLite database, no caches
+# across tests, and no real OpenAI key (tests that need one fake the API).
+_db_dir = tempfile.mkdtemp(prefix="prosjektbank_test_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["READ_CACHE_ENABLED"] = "0"
+os.environ["PDF_CACHE_ENABLED"] = "0"
+os.environ["OPENAI_API_KEY"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from openai import AsyncOpenAI
+
+import main
+from database import get_session_local
+from utils import bio_writer
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client: # Runs the startup event: tables, migrations, seeding
+        yield client
+
+
+@pytest.fixture
+def db(client):
+    db = get_session_local()()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class FakeCompletions:
+    """
+    A local fake of the chat completions API, behind the real AsyncOpenAI
+    client: an httpx transport that answers like the API (streamed chunks as
+    server-sent events, or an error status) and records every call.
+    """
+
+    def __init__(self, chunks=("Kari har ", "lang erfaring ", "som prosjektleder."), delay=0.0, status=200):
+        self.chunks = chunks
+        self.delay = delay # Before the first chunk, so concurrent requests overlap
+        self.status = status
+        self.calls = []
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/v1/chat/completions"
+        self.calls.append(json.loads(request.content))
+        await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return httpx.Response(self.status, json={"error": {"message": "Bad request", "type": "invalid_request_error"}})
+        events = [
+            {"id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": bio_writer.BIO_MODEL,
+             "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]}
+            for chunk in self.chunks
+        ]
+        body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body.encode())
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    fake = FakeCompletions()
+    client = AsyncOpenAI(api_key="test-key", base_url="http://fake-openai.test/v1", max_retries=0,
+                         http_client=httpx.AsyncClient(transport=httpx.MockTransport(fake.handle)))
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(bio_writer, "_client", client)
+    return fake
@@ -0,0 +1,83 @@
+"""Batch regeneration of profile texts (bio_batch.py) against the fake completions API."""
+import time
+
+import bio_batch
+import models
+
+
+def create_employees(client, count: int) -> list:
+    ids = []
+    for i in range(count):
+        response = client.post("/employees/", json={"name": f"Batch Ansatt {i}", "title": "Anleggsleder"})
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    return ids
+
+
+def wait_for_job(client, job_id: str, timeout: float = 10) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} still {job['status']}")
+
+
+def test_batch_stores_every_text(client, db, fake_api):
+    ids = create_employees(client, 12)
+    job = client.post("/employees/generate-bios", json={"employee_ids": ids}).json()
+    job = wait_for_job(client, job["id"])
+    assert job["status"] == "done", job
+    assert sorted(job["result"]["completed"]) == ids
+    assert len(fake_api.calls) == 12
+    texts = db.query(models.Employee.generated_bio).filter(models.Employee.id.in_(ids)).all()
+    assert texts == [(fake_api.text,)] * 12
+
+
+def test_unexpected_error_stops_the_whole_batch(client, fake_api, monkeypatch):
+    fake_api.delay = 0.02 # Keeps several employees in flight when the write fails
+    ids = create_employees(client, 25)
+    writes = []
+    write_rows = bio_batch._Batch._write_rows
+
+    def failing_write_rows(self, db, rows, status, error):
+        writes.append(status)
+        if len(writes) == 1:
+            raise RuntimeError("database is gone")
+        return write_rows(self, db, rows, status, error)
+
+    monkeypatch.setattr(bio_batch._Batch, "_write_rows", failing_write_rows)
+    job = client.post("/employees/generate-bios", json={"employee_ids": ids}).json()
+    failed = wait_for_job(client, job["id"])
+    assert failed["status"] == "failed"
+    assert failed["error"] == "database is gone"
+
+    # Marked failed only after every employee stopped: nothing writes afterwards
+    writes_when_failed = len(writes)
+    time.sleep(0.3)
+    assert len(writes) == writes_when_failed and writes[-1] == "failed"
+    assert job["id"] not in bio_batch._running
+
+    # So a resume is the only batch on the job, and it finishes the rest
+    assert client.post(f"/api/jobs/{job['id']}/resume").status_code == 202
+    done = wait_for_job(client, job["id"])
+    assert done["status"] == "done", done
+    assert sorted(done["result"]["completed"]) == ids
+
+
+def test_resume_while_the_failed_task_is_finishing_changes_nothing(client, db, fake_api, monkeypatch):
+    ids = create_employees(client, 2)
+    job = client.post("/employees/generate-bios", json={"employee_ids": ids}).json()
+    assert wait_for_job(client, job["id"])["status"] == "done"
+    db.query(models.Job).filter(models.Job.id == job["id"]).update({"status": "failed", "error": "Interrupted"})
+    db.commit()
+
+    # The failed run's task has not left _running yet
+    monkeypatch.setitem(bio_batch._running, job["id"], None)
+    assert client.post(f"/api/jobs/{job['id']}/resume").status_code == 409
+    assert client.get(f"/api/jobs/{job['id']}").json()["status"] == "failed"
+
+    monkeypatch.delitem(bio_batch._running, job["id"])
+    assert client.post(f"/api/jobs/{job['id']}/resume").status_code == 202
+    assert wait_for_job(client, job["id"])["status"] == "done"
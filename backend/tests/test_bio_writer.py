@@ -0,0 +1,104 @@
+"""AI profile texts against the local fake of the chat completions API (fake_api in conftest.py)."""
+import asyncio
+import json
+
+from utils import bio_writer
+
+
+def create_employee(client, name="Kari Nordmann") -> dict:
+    response = client.post("/employees/", json={
+        "name": name, "title": "Prosjektleder",
+        "work_experiences": [{"company": "Ø.M. Fjeld", "title": "Prosjektleder", "time_frame": "2015 - 2024"}],
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def generate(client, employee_id: int, **params) -> str:
+    response = client.post(f"/employees/{employee_id}/generate-bio", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()["bio"]
+
+
+def test_concurrent_identical_requests_share_one_call(fake_api):
+    fake_api.delay = 0.2
+    stored = []
+
+    async def on_complete(text):
+        stored.append(text)
+
+    async def request():
+        generation = bio_writer.generate("same-fingerprint", "prompt", on_complete)
+        return "".join([chunk async for chunk in generation.follow()])
+
+    async def run():
+        first = asyncio.create_task(request())
+        await asyncio.sleep(0.05) # Joins while the first is waiting for the API
+        return await asyncio.gather(first, *[request() for _ in range(4)])
+
+    texts = asyncio.run(run())
+    assert texts == [fake_api.text] * 5
+    assert len(fake_api.calls) == 1
+    assert stored == [fake_api.text] # Stored once, by the call that ran
+    assert fake_api.calls[0]["stream"] is True
+
+
+def test_stored_text_is_reused_until_the_cv_changes(client, fake_api):
+    employee = create_employee(client)
+
+    assert generate(client, employee["id"]) == fake_api.text
+    assert len(fake_api.calls) == 1
+
+    # Same CV data, same fingerprint: the stored text, no call
+    assert generate(client, employee["id"]) == fake_api.text
+    assert len(fake_api.calls) == 1
+
+    # refresh asks for a new text anyway
+    generate(client, employee["id"], refresh="true")
+    assert len(fake_api.calls) == 2
+
+    # A CV edit changes the prompt, so the stored text no longer matches
+    response = client.put(f"/employees/{employee['id']}", json={
+        "name": employee["name"],
+        "work_experiences": [{"company": "Veidekke", "title": "Anleggsleder", "time_frame": "2010 - 2015"},
+                             {"company": "Ø.M. Fjeld", "title": "Prosjektleder", "time_frame": "2015 - 2024"}],
+    })
+    assert response.status_code == 200, response.text
+    generate(client, employee["id"])
+    assert len(fake_api.calls) == 3
+    assert "Veidekke" in fake_api.calls[-1]["messages"][-1]["content"]
+
+
+def read_events(response) -> list:
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+def test_stream_sends_the_text_then_done(client, fake_api):
+    employee = create_employee(client, "Ola Hansen")
+
+    response = client.post(f"/employees/{employee['id']}/generate-bio/stream")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = read_events(response)
+    assert events[-1] == ("done", {})
+    assert [data["delta"] for name, data in events[:-1]] == list(fake_api.chunks)
+
+
+def test_stream_reports_a_failed_call_as_an_error_event(client, fake_api):
+    fake_api.status = 400
+    employee = create_employee(client, "Per Berg")
+
+    response = client.post(f"/employees/{employee['id']}/generate-bio/stream")
+    assert response.status_code == 200
+    events = read_events(response)
+    assert events[-1][0] == "error"
+    assert "Bad request" in events[-1][1]["detail"]
+
+    # Failures are never stored: the next request calls the API again
+    fake_api.status = 200
+    assert generate(client, employee["id"]) == fake_api.text
+    assert len(fake_api.calls) == 2
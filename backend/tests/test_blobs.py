@@ -0,0 +1,47 @@
+"""Stored files (utils/blobs.py) and their cleanup in crud."""
+import os
+
+import crud
+import models
+from utils import blobs, image_variants
+from utils.storage import get_storage, url_for_key
+
+
+def test_sweep_removes_only_unreferenced_files(client, db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # Local storage is below ./static
+    storage = get_storage()
+    referenced, _ = blobs.store_bytes(b"in use", "uploaded_images", ".jpg")
+    orphan, _ = blobs.store_bytes(b"left behind", "uploaded_images", ".jpg")
+    for key in ("uploaded_images/img_1234.png", "project_attachments/abcd_plan.pdf"): # Older layout
+        storage.put_bytes(b"old", key)
+    storage.put_bytes(b"small", image_variants.variant_key("uploaded_images/img_1234.png", 320, "webp"))
+    storage.put_bytes(b"small", image_variants.variant_key(referenced[len("/static/"):], 320, "webp"))
+
+    project = models.Project(name="Sweep", type="Bolig", location="Oslo")
+    project.images = [models.ProjectImage(url=referenced, content_hash=blobs.digest_from_url(referenced),
+                                         variants=[320], width=640)] # No background work for later tests
+    db.add(project)
+    db.commit()
+
+    assert crud.sweep_unreferenced_files(db) == [] # All within the grace period
+    removed = crud.sweep_unreferenced_files(db, grace=0, dry_run=True)
+    expected = {orphan, url_for_key("uploaded_images/img_1234.png"), url_for_key("project_attachments/abcd_plan.pdf")}
+    assert set(removed) == expected
+    assert os.path.exists(os.path.join("static", "uploaded_images", "img_1234.png"))
+
+    assert set(crud.sweep_unreferenced_files(db, grace=0)) == expected
+    remaining = sorted(storage.list_keys("uploaded_images")) + sorted(storage.list_keys("project_attachments"))
+    key = referenced[len("/static/"):]
+    assert remaining == sorted([key, image_variants.variant_key(key, 320, "webp")])
+
+
+def test_deleting_a_project_schedules_no_variants(client, db, monkeypatch):
+    project = models.Project(name="Slettes", type="Bolig", location="Oslo")
+    project.images = [models.ProjectImage(url="/static/uploaded_images/never_processed.jpg")]
+    db.add(project)
+    db.commit()
+
+    scheduled = []
+    monkeypatch.setattr(image_variants, "schedule", lambda url, on_done=None: scheduled.append(url))
+    assert client.delete(f"/projects/{project.id}").status_code == 200
+    assert scheduled == []
@@ -0,0 +1,50 @@
+"""CV parsing output (utils/cv_parser.py) as saved by the upload form and the bulk import (cv_import.py)."""
+import cv_import
+from utils import cv_parser
+
+
+def parsed_cv(name: str) -> dict:
+    return {
+        "name": name, "title": "Prosjektleder", "email": None, "bio": None,
+        "languages": ["Norsk"], "key_competencies": [],
+        "work_experiences": [{"company": "Ø.M. Fjeld", "title": "Prosjektleder", "time_frame": 2019},
+                             {"company": None, "title": "Byggeleder"}],
+        "educations": [{"institution": "NTNU", "degree": "Master"}],
+        "certifications": [{"name": "BREEAM AP", "year": 2020}, {"name": None, "year": "2018"}],
+    }
+
+
+def test_entries_without_required_fields_are_dropped(client):
+    result = parsed_cv("Kari Nordmann")
+    dropped = cv_parser._drop_incomplete_entries(result)
+    assert [(row["field"], row["missing"]) for row in dropped] == [("work_experiences", ["company"]),
+                                                                  ("certifications", ["name"])]
+    assert result["certifications"] == [{"name": "BREEAM AP", "year": "2020"}]
+    assert result["work_experiences"][0]["time_frame"] == "2019"
+
+    # What the upload form posts as it is
+    response = client.post("/employees/", json={**result, "dropped": dropped})
+    assert response.status_code == 200, response.text
+    assert [c["name"] for c in response.json()["certifications"]] == ["BREEAM AP"]
+
+
+def test_import_report_lists_incomplete_cvs(client, tmp_path, monkeypatch):
+    for name in ("a.pdf", "b.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+
+    def parse(path):
+        result = parsed_cv("Importert Ansatt A" if path.endswith("a.pdf") else "Importert Ansatt B")
+        if path.endswith("a.pdf"):
+            result["dropped"] = cv_parser._drop_incomplete_entries(result)
+        else:
+            result["work_experiences"].pop()
+            result["certifications"].pop()
+            result["certifications"][0]["year"] = "2020"
+            result["work_experiences"][0]["time_frame"] = "2019"
+        return result
+
+    monkeypatch.setattr(cv_import, "parse_cv_pdf", parse)
+    report = cv_import.import_cvs(str(tmp_path), dry_run=True)
+    assert report["summary"]["created"] == 2
+    assert [(entry["file"], len(entry["dropped"])) for entry in report["incomplete"]] == [("a.pdf", 2)]
+    assert report["summary"]["incomplete"] == 1
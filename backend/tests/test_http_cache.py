@@ -0,0 +1,38 @@
+"""Conditional GET (utils/http_cache.py) and what moves the version counters behind it."""
+import datetime
+
+import main
+import models
+from utils import http_cache
+
+WRITE = "2026-03-02T10:15:30.250000"
+WRITTEN_AT = datetime.datetime(2026, 3, 2, 10, 15, 30, 250000, tzinfo=datetime.timezone.utc)
+
+
+def test_last_modified_is_left_out_within_the_second_of_the_last_write():
+    versions = {"projects": (4, WRITE)}
+    etag, last_modified = http_cache.validators("/projects/", versions, now=WRITTEN_AT + datetime.timedelta(seconds=0.5))
+    assert last_modified is None
+    # So If-Modified-Since alone can't match a later write in the same second
+    assert not http_cache.is_not_modified({"if-modified-since": "Mon, 02 Mar 2026 10:15:30 GMT"}, etag, last_modified)
+
+    _, last_modified = http_cache.validators("/projects/", versions, now=WRITTEN_AT + datetime.timedelta(seconds=1))
+    assert last_modified == "Mon, 02 Mar 2026 10:15:30 GMT"
+    assert http_cache.is_not_modified({"if-modified-since": last_modified}, etag, last_modified)
+
+
+def test_etag_changes_with_every_version():
+    first, _ = http_cache.validators("/projects/", {"projects": (4, WRITE)})
+    second, _ = http_cache.validators("/projects/", {"projects": (5, WRITE)})
+    assert first != second
+    assert not http_cache.is_not_modified({"if-none-match": first}, second, None)
+
+
+def test_restart_keeps_the_project_types_version(client, db):
+    def version():
+        db.expire_all()
+        return db.query(models.TableVersion).filter(models.TableVersion.name == "project_types").one().version
+
+    before = version()
+    main.startup_event() # Every standard type exists already
+    assert version() == before
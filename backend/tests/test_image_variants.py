@@ -0,0 +1,72 @@
+"""
+Image variants (utils/image_variants.py) as recorded on ProjectImage rows:
+new images are saved complete, legacy ones are backfilled with one version
+bump per batch.
+"""
+import io
+import time
+
+import pytest
+from PIL import Image
+
+import models
+from utils import image_variants
+from utils.storage import get_storage, url_for_key
+
+
+@pytest.fixture
+def static_dir(client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # Local storage is below ./static
+    return tmp_path
+
+
+def _store_image(key: str, width: int = 1000) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, width // 2), "teal").save(buffer, "JPEG")
+    get_storage().put_bytes(buffer.getvalue(), key)
+    return url_for_key(key)
+
+
+def _wait_for_variants():
+    deadline = time.monotonic() + 10
+    while image_variants._in_flight:
+        assert time.monotonic() < deadline, "variants not generated in time"
+        time.sleep(0.05)
+
+
+def _projects_version(db) -> int:
+    db.expire_all()
+    return db.query(models.TableVersion).filter(models.TableVersion.name == "projects").one().version
+
+
+def test_new_image_is_saved_with_its_width_and_not_scheduled_again(client, db, static_dir):
+    url = _store_image("uploaded_images/new.jpg")
+    image_variants.generate_variants("uploaded_images/new.jpg") # As after /api/upload-image
+
+    project_id = client.post("/projects/", json={"name": "Nytt bilde", "type": "Bolig", "location": "Lier", "images": [url]}).json()["id"]
+    image = db.query(models.ProjectImage).filter(models.ProjectImage.project_id == project_id).one()
+    assert (image.variants, image.width) == ([320, 800], 1000)
+
+    version = _projects_version(db)
+    assert client.get(f"/projects/{project_id}").status_code == 200
+    _wait_for_variants()
+    assert _projects_version(db) == version
+
+
+def test_legacy_images_are_backfilled_with_one_version_bump(client, db, static_dir):
+    urls = [_store_image(f"uploaded_images/legacy_{i}.jpg") for i in range(3)]
+    project_id = client.post("/projects/", json={"name": "Gamle bilder", "type": "Bolig", "location": "Lier", "images": urls}).json()["id"]
+    assert all(image.variants is None
+               for image in db.query(models.ProjectImage).filter(models.ProjectImage.project_id == project_id))
+
+    version = _projects_version(db)
+    assert client.get(f"/projects/{project_id}").status_code == 200
+    _wait_for_variants()
+    assert _projects_version(db) == version + 1
+    images = db.query(models.ProjectImage).filter(models.ProjectImage.project_id == project_id).all()
+    assert [(image.variants, image.width) for image in images] == [([320, 800], 1000)] * 3
+
+    # Nothing left to do
+    assert client.get(f"/projects/{project_id}").status_code == 200
+    _wait_for_variants()
+    assert _projects_version(db) == version + 1
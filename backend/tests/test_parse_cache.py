@@ -0,0 +1,49 @@
+"""Parser results are cached by content hash, but never when a stage degraded."""
+import pytest
+from PIL import Image
+
+from utils import pdf_cache, page_text
+from utils.parser import parse_pdf
+
+
+@pytest.fixture
+def parse_cache(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path) # The parser writes debug_parsed_text.txt to the working directory
+    monkeypatch.setattr(pdf_cache, "PDF_CACHE_ENABLED", True)
+    monkeypatch.setattr(pdf_cache, "PDF_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def scanned_pdf(tmp_path):
+    """A PDF page that is only an image, so its text has to come from OCR."""
+    path = tmp_path / "scanned.pdf"
+    Image.new("RGB", (200, 200), "white").save(path, "PDF")
+    return str(path)
+
+
+class FakeOcr:
+    def __init__(self):
+        self.calls = 0
+        self.text = None # None: the page failed or timed out
+
+    def __call__(self, path, page_numbers, pdf=None):
+        self.calls += 1
+        return {n: self.text for n in page_numbers}
+
+
+def test_result_with_failed_ocr_is_not_cached(monkeypatch, parse_cache, scanned_pdf):
+    ocr = FakeOcr()
+    monkeypatch.setattr(page_text, "ocr_pages", ocr)
+
+    result = parse_pdf(scanned_pdf, smart_crop="off")
+    assert result["incomplete"] == ["OCR failed for page 1"]
+
+    # The retry parses again, and this time OCR works
+    ocr.text = "Prosjektnavn: Fjordlia barnehage"
+    result = parse_pdf(scanned_pdf, smart_crop="off")
+    assert ocr.calls == 2
+    assert "incomplete" not in result
+
+    # Complete results are cached
+    assert parse_pdf(scanned_pdf, smart_crop="off") == result
+    assert ocr.calls == 2
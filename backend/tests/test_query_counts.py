@@ -0,0 +1,95 @@
+"""
+The read endpoints load everything they serialise with a fixed number of
+statements (see the loader options in crud.py), however many projects,
+images, attachments and team members there are.
+"""
+import contextlib
+
+import pytest
+from sqlalchemy import event
+
+import models
+from database import get_engine, get_async_engine
+
+# Statements per request, including the table versions behind the ETag
+MAX_STATEMENTS = {
+    "/projects/": 8,
+    "/projects/{id}": 8,
+    "/employees/": 5,
+    "/employees/{id}": 6,
+}
+
+
+@contextlib.contextmanager
+def count_statements():
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    engines = [get_engine(), get_async_engine().sync_engine]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", record)
+
+
+def seed(db, projects: int):
+    """Projects with images, attachments and a team whose members have full CVs."""
+    project_ids, employee_ids = [], []
+    for i in range(projects):
+        employee = models.Employee(name=f"Ansatt {i}", title="Prosjektleder", languages=[], key_competencies=[])
+        employee.work_experiences = [models.WorkExperience(company="Ø.M. Fjeld", title="Prosjektleder", time_frame=str(2000 + j))
+                                     for j in range(3)]
+        employee.educations = [models.Education(institution="NTNU", degree="Master")]
+        employee.certifications = [models.Certification(name="BREEAM AP", year="2020")]
+        project = models.Project(name=f"Prosjekt {i}", type="Skole", location="Oslo", tags=["Skole"])
+        # Variants already recorded, so the reads schedule no background work
+        project.images = [models.ProjectImage(url=f"/static/uploaded_images/test_{i}_{j}.jpg", variants=[320], width=640)
+                          for j in range(2)]
+        project.attachments = [models.ProjectAttachment(filename=f"{i}.pdf", file_path=f"/static/attachments/test_{i}.pdf", file_type="pdf")]
+        project.team_members = [models.ProjectTeamMember(employee=employee, role="Prosjektleder")]
+        db.add(project)
+        db.flush()
+        project_ids.append(project.id)
+        employee_ids.append(employee.id)
+    db.commit()
+    return project_ids, employee_ids
+
+
+def statements_per_endpoint(client, project_id: int, employee_id: int) -> dict:
+    counts = {}
+    for name, url in (("/projects/", "/projects/?limit=500"),
+                      ("/projects/{id}", f"/projects/{project_id}"),
+                      ("/employees/", "/employees/?limit=500"),
+                      ("/employees/{id}", f"/employees/{employee_id}")):
+        with count_statements() as statements:
+            response = client.get(url)
+        assert response.status_code == 200, response.text
+        counts[name] = len(statements)
+    return counts
+
+
+def test_statement_count_is_bounded(client, db):
+    project_ids, employee_ids = seed(db, 2)
+    few = statements_per_endpoint(client, project_ids[0], employee_ids[0])
+
+    project_ids, employee_ids = seed(db, 20)
+    many = statements_per_endpoint(client, project_ids[0], employee_ids[0])
+
+    for name, bound in MAX_STATEMENTS.items():
+        assert many[name] <= bound, f"GET {name}: {many[name]} statements"
+    # No lazy loads: more rows, more related rows, the same statements
+    assert many == few
+
+
+def test_list_responses_are_complete(client, db):
+    project_ids, _ = seed(db, 3)
+    page = client.get("/projects/?limit=500").json()
+    project = next(item for item in page["items"] if item["id"] == project_ids[0])
+    assert len(project["images"]) == 2 and project["images"][0]["srcset"]
+    assert len(project["attachments"]) == 1
+    member = project["team_members"][0]
+    assert len(member["employee"]["work_experiences"]) == 3
+    assert member["employee"]["certifications"][0]["name"] == "BREEAM AP"
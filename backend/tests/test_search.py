@@ -0,0 +1,96 @@
+"""
+/search on SQLite, i.e. the in-process fallback in utils/search.py, and the
+HTML contract of the snippets both backends share.
+"""
+import pytest
+
+import crud
+from utils import search as text_search
+
+
+@pytest.fixture(scope="module")
+def indexed(client):
+    # Words no other test uses, so the hits are only these rows
+    projects = [
+        {"name": "Fjordlia barnehage", "type": "Barnehage", "location": "Drammen",
+         "description": "Totalentreprise med BREEAM Very Good, passivhus <script>alert(1)</script> & massivtre."},
+        {"name": "Kvitfjell sykehjem", "type": "Helse og omsorg", "location": "Hamar",
+         "challenges": "Trang tomt i Fjordlia, drift av sykehjemmet under byggingen."},
+    ] + [
+        {"name": f"Ravnåsen bolig {i}", "type": "Bolig", "location": "Lier", "description": "Rekkehus i massivtre."}
+        for i in range(5)
+    ]
+    for project in projects:
+        assert client.post("/projects/", json=project).status_code == 200
+    response = client.post("/employees/", json={
+        "name": "Sigrid Fjordlia", "title": "Prosjektleder",
+        "bio": "Sigrid har ledet flere barnehager i massivtre.",
+        "key_competencies": ["Tømrerarbeid", "Passivhusprosjektering"],
+    })
+    assert response.status_code == 200
+
+
+def search(client, **params) -> dict:
+    response = client.get("/search", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_stemmed_and_ranked(client, indexed):
+    # "barnehager" and "barnehage" share a stem; a name hit (A) outranks a body hit (C)
+    items = search(client, q="barnehager")["items"]
+    assert [(item["kind"], item["title"]) for item in items] == [
+        ("project", "Fjordlia barnehage"),
+        ("employee", "Sigrid Fjordlia"),
+    ]
+    assert items[0]["rank"] > items[1]["rank"]
+    assert items[0]["subtitle"] == "Barnehage, Drammen"
+
+
+def test_every_term_must_match(client, indexed):
+    assert [item["title"] for item in search(client, q="fjordlia sykehjem")["items"]] == ["Kvitfjell sykehjem"]
+    assert search(client, q="fjordlia kontorbygg")["items"] == []
+
+
+def test_stop_words_are_ignored(client, indexed):
+    assert search(client, q="og i på")["items"] == []
+    assert len(search(client, q="sykehjem og")["items"]) == 1
+
+
+def test_kind_filter(client, indexed):
+    items = search(client, q="fjordlia", kind="employee")["items"]
+    assert [item["title"] for item in items] == ["Sigrid Fjordlia"]
+    # key_competencies are searchable too
+    assert [item["title"] for item in search(client, q="tømrerarbeid")["items"]] == ["Sigrid Fjordlia"]
+
+
+def test_snippet_is_highlighted_and_escaped(client, indexed):
+    project = search(client, q="passivhus", kind="project")["items"][0]
+    assert "<b>passivhus</b>" in project["snippet"]
+    assert "<script>" not in project["snippet"]
+    assert "&lt;script&gt;" in project["snippet"] and "&amp;" in project["snippet"]
+
+
+def test_pagination(client, indexed):
+    first = search(client, q="ravnåsen", limit=2)
+    assert len(first["items"]) == 2 and first["next_offset"] == 2
+    titles = [item["title"] for item in first["items"]]
+    offset = first["next_offset"]
+    while offset is not None:
+        page = search(client, q="ravnåsen", limit=2, offset=offset)
+        titles += [item["title"] for item in page["items"]]
+        offset = page["next_offset"]
+    assert sorted(titles) == [f"Ravnåsen bolig {i}" for i in range(5)]
+
+
+def test_stemmer():
+    assert text_search.stem("barnehagene") == text_search.stem("barnehage")
+    assert text_search.stem("skolene") == "skol"
+    assert text_search.query_terms("Skole og skoler i Oslo") == ["skol", "oslo"]
+
+
+def test_postgres_headline_is_escaped_like_the_fallback():
+    # ts_headline marks matches with HEADLINE_START/STOP and leaves the text unescaped
+    snippet = f"{crud.HEADLINE_START}skole{crud.HEADLINE_STOP} <img src=x onerror=alert(1)> & {crud.HEADLINE_START}BREEAM{crud.HEADLINE_STOP}"
+    assert crud._headline_html(snippet) == "<b>skole</b> &lt;img src=x onerror=alert(1)&gt; &amp; <b>BREEAM</b>"
+    assert crud._headline_html(None) is None
@@ -0,0 +1,18 @@
+"""
+Upload size limit (utils/uploads.py): oversized bodies get a 413 the
+cross-origin frontend can read.
+"""
+from utils import uploads
+
+ORIGIN = "http://localhost:3000"
+
+
+def test_announced_oversized_upload_is_rejected_with_cors_headers(client):
+    # Early rejection on Content-Length, before any of the body is read
+    response = client.post("/api/upload-image", content=b"x",
+                           headers={"Origin": ORIGIN, "Content-Type": "application/octet-stream",
+                                    "Content-Length": str(uploads.MAX_UPLOAD_BYTES + 1)})
+    assert response.status_code == 413
+    assert response.json() == {"detail": "File is too large"}
+    assert response.headers["access-control-allow-origin"] in ("*", ORIGIN)
+
@@ -0,0 +1,200 @@
+import os
+import asyncio
+import hashlib
+import openai
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+
+# AI-written profile texts for the CV bank (POST /employees/{id}/generate-bio).
+# The prompt is built from the employee's CV rows, and its fingerprint (a hash
+# of prompt, model and settings) is stored next to the generated text on the
+# employee. Asking again with unchanged CV data returns the stored text; any
+# edit to the work experience, education, team memberships or project names
+# changes the prompt and with it the fingerprint, so stale texts never match.
+# Identical requests arriving while a completion is running share that call.
+# OPENAI_BASE_URL points the client at any compatible API (a proxy, Azure, or
+# a local fake for testing).
+load_dotenv()
+
+BIO_MODEL = os.getenv("BIO_MODEL", "gpt-4o")
+BIO_TEMPERATURE = 0.7
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60")) # seconds, per request (and between streamed chunks)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3")) # Connection errors, 408/409/429/5xx, with backoff
+# Bump when the prompt wording changes, so stored texts are regenerated
+BIO_PROMPT_VERSION = "1"
+
+SYSTEM_PROMPT = "Du er en ekspert på å skrive CV-profiler for bygg- og anleggsbransjen."
+
+
+def is_configured() -> bool:
+    api_key = os.getenv("OPENAI_API_KEY")
+    return bool(api_key) and api_key != "your_api_key_here"
+
+
+# Lazy initialization, so startup never needs a key
+_client = None
+
+
+def get_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL,
+                              timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES)
+    return _client
+
+
+def build_prompt(employee) -> str:
+    """The prompt for employee, with work_experiences, educations and team_memberships loaded."""
+    exp_summary = "\n".join([f"- {exp.title} hos {exp.company} ({exp.time_frame})" for exp in employee.work_experiences])
+    edu_summary = "\n".join([f"- {edu.degree} fra {edu.institution} ({edu.time_frame})" for edu in employee.educations])
+    projects = []
+    for tm in employee.team_memberships:
+        proj = tm.project
+        projects.append(f"- {proj.name}: Rolle: {tm.role}. {tm.cv_relevance or ''} {tm.role_summary or ''}")
+    proj_summary = "\n".join(projects)
+
+    competencies = ", ".join(employee.key_competencies) if employee.key_competencies else "Ikke spesifisert"
+
+    return f"""
+    Du er en profesjonell CV-skriver for entreprenørselskapet Ø.M. Fjeld.
+    Skriv en profiltekst for {employee.name}, som har rollen {employee.title}.
+
+    Teksten skal være:
+    1. Informativ, selgende og sannferdig.
+    2. Appelere til profesjonelle byggherrer i anbudsrunder.
+    3. Fokusere på erfaring, pålitelighet og kompetanse.
+    4. Skrevet i 3. person (f.eks. "{employee.name.split()[0]} har...")
+
+    HER ER BAKGRUNNSDATA:
+    Rolle: {employee.title}
+    Nøkkelkompetanse: {competencies}
+
+    ARBEIDSERFARING:
+    {exp_summary}
+
+    PROSJEKTERFARING:
+    {proj_summary}
+
+    UTDANNING:
+    {edu_summary}
+
+    Skriv teksten på norsk. Hold den konsis, men kraftfull (ca 100-150 ord).
+    """
+
+
+def fingerprint(prompt: str) -> str:
+    """Identifies the completion for prompt: the same fingerprint means the same request to the model."""
+    material = "\0".join([BIO_PROMPT_VERSION, BIO_MODEL, str(BIO_TEMPERATURE), SYSTEM_PROMPT, prompt])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def demo_bio(employee) -> str:
+    firstName = employee.name.split()[0]
+    return f"(DEMO-MODUS - Legg inn API-nøkkel for full versjon)\n\n{employee.name} er en svært erfaren {employee.title} i Ø.M. Fjeld. Gjennom sin karriere har vedkommende opparbeidet seg solid kompetanse innen planlegging og gjennomføring av komplekse byggeprosjekter. {firstName} er kjent for å levere med høyeste kvalitet og har særlig fokus på god dialog med kunden. Erfaringen inkluderer prosjekter med høy teknisk kompleksitet, hvor {firstName} har vist seg som en handlekraftig og løsningsorientert ressursperson."
+
+
+async def replay(text: str):
+    """A finished text in the shape of generate(...).follow()."""
+    yield text
+
+
+class GenerationFailed(Exception):
+    def __init__(self, message: str, rate_limited: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.rate_limited = rate_limited # Still 429 after the client's own retries
+        self.retry_after = retry_after # Seconds the API asked us to wait, if it said
+
+
+def _failure(error: Exception) -> GenerationFailed:
+    if isinstance(error, GenerationFailed):
+        return error
+    if not isinstance(error, openai.RateLimitError):
+        return GenerationFailed(str(error))
+    retry_after = None
+    for header, seconds in (("retry-after-ms", 0.001), ("retry-after", 1)):
+        try:
+            retry_after = float(error.response.headers[header]) * seconds
+            break
+        except (KeyError, ValueError):
+            pass
+    return GenerationFailed(str(error), rate_limited=True, retry_after=retry_after)
+
+
+class _Generation:
+    """One streamed completion, followed by every request with the same fingerprint."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+        self.task = None
+
+    def _publish(self, chunk: str = None, error: GenerationFailed = None, done: bool = False):
+        if chunk:
+            self.chunks.append(chunk)
+        if done:
+            self.done, self.error = True, error
+        # Wake everyone waiting on the current event, later waiters get a fresh one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self):
+        """Yields the text from the first chunk on, also when joining late."""
+        sent = 0
+        while True:
+            changed = self._changed # Before reading the state, so no update is missed
+            while sent < len(self.chunks):
+                yield self.chunks[sent]
+                sent += 1
+            if self.done:
+                if self.error:
+                    raise GenerationFailed(str(self.error), self.error.rate_limited, self.error.retry_after)
+                return
+            await changed.wait()
+
+
+_in_flight = {} # fingerprint -> _Generation
+
+
+async def _run(generation: _Generation, key: str, prompt: str, on_complete):
+    try:
+        stream = await get_client().chat.completions.create(
+            model=BIO_MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=BIO_TEMPERATURE,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                generation._publish(chunk.choices[0].delta.content)
+        text = "".join(generation.chunks)
+        if not text.strip():
+            raise GenerationFailed("Empty response from the model")
+        try:
+            await on_complete(text)
+        except Exception as e:
+            print(f"Could not store generated bio: {e}")
+        generation._publish(done=True)
+    except Exception as e:
+        print(f"AI Generation error: {e}")
+        generation._publish(done=True, error=_failure(e))
+    finally:
+        _in_flight.pop(key, None)
+
+
+def generate(key: str, prompt: str, on_complete) -> _Generation:
+    """
+    Starts the completion for prompt, or joins the one already running under
+    key. It runs to the end even if every caller disconnects, and
+    await on_complete(text) stores the result; failures are never stored.
+    """
+    generation = _in_flight.get(key)
+    if generation is None:
+        generation = _in_flight[key] = _Generation()
+        generation.task = asyncio.create_task(_run(generation, key, prompt, on_complete))
+    return generation
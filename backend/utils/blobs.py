@@ -0,0 +1,100 @@
+import os
+import re
+import hashlib
+from utils.pdf_cache import file_digest
+from utils.storage import get_storage, key_from_url, url_for_key
+from utils.image_variants import variant_keys
+
+# Content-addressed storage for uploaded images and attachments: a file is
+# stored once as <prefix>/<sha256><ext> in the storage backend (see
+# utils/storage.py), however often it is uploaded or extracted. Rows
+# referencing it (ProjectImage, ProjectAttachment) carry the hash in
+# content_hash; crud.release_blobs() removes a file once nothing references
+# it any more.
+#
+# A blob that was just stored may not be referenced yet (an uploaded image is
+# only linked when the project is saved), so files stored or re-stored within
+# the grace period are never removed. Attachments are linked in the upload
+# request itself and only need to cover concurrent uploads.
+BLOB_GRACE_SECONDS = int(os.getenv("BLOB_GRACE_SECONDS", "3600"))
+ATTACHMENT_GRACE_SECONDS = 60
+# Where files referenced by rows are stored; crud.sweep_unreferenced_files()
+# removes whatever in them nothing references (older layouts included)
+FILE_PREFIXES = ("uploaded_images", "project_attachments")
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _blob_key(prefix: str, digest: str, ext: str) -> str:
+    return f"{prefix}/{digest}{ext.lower()}"
+
+
+def staging_path(prefix: str) -> str:
+    """A temp path to write a file to before store_file (cheapest place for the backend)."""
+    return get_storage().staging_path(f"{prefix}/upload")
+
+
+def store_file(tmp_path: str, prefix: str, ext: str):
+    """
+    Moves a file (from staging_path) into the store. Returns (url, digest).
+    """
+    storage = get_storage()
+    digest = file_digest(tmp_path)
+    key = _blob_key(prefix, digest, ext)
+    if storage.exists(key):
+        # Same content already stored: nothing to write, just mark it as fresh
+        os.remove(tmp_path)
+        storage.touch(key)
+    else:
+        storage.put_file(tmp_path, key)
+    return url_for_key(key), digest
+
+
+def store_upload(fileobj, prefix: str, ext: str):
+    """Streams an upload into the store (see uploads.save_upload). Returns (url, digest)."""
+    from utils.uploads import save_upload
+    tmp_path = staging_path(prefix)
+    save_upload(fileobj, tmp_path) # Raises UploadTooLarge
+    return store_file(tmp_path, prefix, ext)
+
+
+def store_bytes(data: bytes, prefix: str, ext: str):
+    """Stores in-memory content, skipping the write if it is already stored. Returns (url, digest)."""
+    storage = get_storage()
+    digest = hashlib.sha256(data).hexdigest()
+    key = _blob_key(prefix, digest, ext)
+    if storage.exists(key):
+        storage.touch(key)
+    else:
+        storage.put_bytes(data, key)
+    return url_for_key(key), digest
+
+
+def digest_from_url(url: str):
+    """The content hash of a blob URL, or None for files stored before content addressing."""
+    if not url:
+        return None
+    stem, _ = os.path.splitext(os.path.basename(url))
+    return stem if _DIGEST_RE.match(stem) else None
+
+
+def remove(url: str, grace: int = BLOB_GRACE_SECONDS) -> bool:
+    """
+    Deletes the file behind a /static/... URL and its image variants, unless
+    stored within grace seconds. Returns whether it was deleted.
+    """
+    key = key_from_url(url)
+    if not key:
+        return False
+    storage = get_storage()
+    try:
+        age = storage.age(key)
+        if age is not None and age < grace:
+            return False
+        storage.delete(key)
+        for variant in variant_keys(key):
+            storage.delete(variant)
+        return age is not None
+    except Exception as e:
+        print(f"Error removing file {key}: {e}")
+        return False
@@ -1,11 +1,12 @@
-
 import os
 import re
 import json
-from io import BytesIO
 import pdfplumber
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 from dotenv import load_dotenv
+from utils import pdf_cache
+from utils.page_text import extract_page_texts
 
 load_dotenv()
 
@@ -21,30 +22,267 @@ def get_openai_client():
             _openai_client = OpenAI(api_key=api_key)
     return _openai_client
 
-def parse_cv_pdf(file_content: bytes) -> dict:
+# Bump when the prompt or output of parse_cv_pdf changes, to invalidate cached results
+PARSER_VERSION = "7"
+
+# Token budget. CVs up to CV_SINGLE_CALL_TOKENS are structured in one call
+# as before. Longer ones (full project lists) are split at their section
+# headings into chunks of at most CV_CHUNK_TOKENS, extracted in parallel
+# (CV_PARSE_CONCURRENCY calls at a time) and merged in document order.
+CV_SINGLE_CALL_TOKENS = int(os.getenv("CV_SINGLE_CALL_TOKENS", "6000"))
+CV_CHUNK_TOKENS = int(os.getenv("CV_CHUNK_TOKENS", "3000"))
+CV_MAX_TOKENS = int(os.getenv("CV_MAX_TOKENS", "100000")) # Refused above this, instead of dozens of calls
+CV_PARSE_CONCURRENCY = int(os.getenv("CV_PARSE_CONCURRENCY", "4"))
+CV_MODEL = "gpt-4o"
+# A CV page with less text is OCR'd. Lower than for project sheets: the last
+# page of a CV may legitimately hold a single line (e.g. languages).
+CV_MIN_PAGE_CHARS = 20
+
+# Section headings as they appear on a line of their own in Norwegian and
+# English CVs. Text before the first heading is the "profile" (name, title,
+# summary).
+SECTION_HEADINGS = {
+    "experience": r"(relevant |tidligere )?(arbeids|yrkes)?erfaring( og prosjekter)?|arbeidsgivere|ansettelser|"
+                  r"(work |professional |relevant )?experience|employment( history)?|career",
+    "projects": r"(utvalgte |relevante |viktige )?(prosjekt|referanseprosjekt)(er|erfaring)|prosjektliste|"
+                r"(selected |key )?projects|project experience",
+    "education": r"utdann(ing|else)|skolegang|education",
+    "certifications": r"kurs( og (sertifisering|sertifikat)er)?|(sertifisering|sertifikat)er|certifications?|courses",
+    "competencies": r"(nøkkel|kjerne)?kompetanse(områder)?|ferdigheter|(key |core )?(skills|competencies)",
+    "languages": r"språk(kunnskaper)?|languages?",
+}
+_HEADING_RES = {section: re.compile(rf"(?:{pattern})\s*:?", re.IGNORECASE)
+                for section, pattern in SECTION_HEADINGS.items()}
+
+# What each kind of chunk should fill in; the other fields are left empty
+SECTION_FIELDS = {
+    "profile": ("name", "title", "email", "bio", "languages", "key_competencies", "work_experiences", "educations",
+                "certifications"),
+    "experience": ("work_experiences",),
+    "projects": ("work_experiences",),
+    "education": ("educations",),
+    "certifications": ("certifications",),
+    "competencies": ("key_competencies",),
+    "languages": ("languages",),
+}
+LIST_FIELDS = ("languages", "key_competencies", "work_experiences", "educations", "certifications")
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)*\.[a-z]{2,}", re.IGNORECASE)
+# Entries extracted twice (e.g. a job listed both under experience and projects) are kept once.
+# The description is part of the key: two projects for the same client, in the same role and
+# year, are different entries.
+ENTRY_KEYS = {
+    "work_experiences": ("company", "title", "time_frame", "description"),
+    "educations": ("institution", "degree", "time_frame"),
+    "certifications": ("name", "year"),
+}
+# Fields the employee schemas require; entries the model left without them are
+# dropped (and listed under "dropped"), so the result can be saved as it is
+REQUIRED_FIELDS = {
+    "work_experiences": ("company", "title"),
+    "educations": ("institution", "degree"),
+    "certifications": ("name",),
+}
+
+def parse_cv_pdf(path: str) -> dict:
     """
     Parses a CV PDF using text extraction followed by AI structuring.
+    Results for identical files are served from the content-hash cache;
+    errors, and results missing pages whose OCR failed, are never cached.
+    Entries missing a required field are left out and listed under "dropped",
+    so the result can be posted to /employees/ as it is.
     """
-    text = ""
+    return pdf_cache.cached("cv_pdf", PARSER_VERSION, path, _parse_cv_pdf,
+                            is_valid=lambda result: "error" not in result and not result.get("incomplete"))
+
+def _parse_cv_pdf(path: str) -> dict:
     try:
-        with pdfplumber.open(BytesIO(file_content)) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
+        with pdfplumber.open(path) as pdf:
+            # Scanned pages (no text layer) are OCR'd, see utils/page_text.py
+            page_texts, _, ocr_failed = extract_page_texts(pdf, path, min_chars=CV_MIN_PAGE_CHARS)
     except Exception as e:
         print(f"pdfplumber extraction failed: {e}")
         return {"error": "Could not read PDF content"}
+    text = "".join(page_text + "\n" for page_text in page_texts)
 
     if not text.strip():
-        return {"error": "PDF is empty or contains only images"}
+        return {"error": "PDF is empty, and no text could be read from its images"}
+
+    client = get_openai_client()
+    if not client:
+        return {"error": "OpenAI API key not configured"}
+
+    result = _structure(client, text)
+    if "error" not in result:
+        if ocr_failed:
+            # Parsed without those pages; not cached, so a retry can recover them
+            result["incomplete"] = [f"OCR failed for page {i + 1}" for i in ocr_failed]
+        result["email"] = _own_email(result.get("email"), text)
+        dropped = _drop_incomplete_entries(result)
+        if dropped:
+            result["dropped"] = dropped
+    return result
+
+def _drop_incomplete_entries(result: dict) -> list:
+    """
+    Removes the entries missing a required field (see REQUIRED_FIELDS) and
+    turns numbers (years) into the strings the schemas expect. Returns the
+    removed entries as [{"field", "missing", "entry"}].
+    """
+    dropped = []
+    for field, required in REQUIRED_FIELDS.items():
+        kept = []
+        for item in result.get(field) or []:
+            if not isinstance(item, dict):
+                continue
+            item = {key: str(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+                    for key, value in item.items()}
+            missing = [key for key in required if not (isinstance(item.get(key), str) and item[key].strip())]
+            if missing:
+                dropped.append({"field": field, "missing": missing, "entry": item})
+            else:
+                kept.append(item)
+        result[field] = kept
+    return dropped
+
+def _own_email(email, text: str):
+    """
+    The candidate's email as the model read it, if it is an address that is
+    actually in the text. Used to match imported CVs to employees, so never
+    guessed: company, footer and reference addresses are left out by the
+    prompt, and anything the model made up is dropped here.
+    """
+    if not isinstance(email, str):
+        return None
+    match = EMAIL_RE.fullmatch(email.strip())
+    if not match or match.group(0).casefold() not in {m.group(0).casefold() for m in EMAIL_RE.finditer(text)}:
+        return None
+    return match.group(0)
+
+def _structure(client, text: str) -> dict:
+    tokens = count_tokens(text)
+    if tokens > CV_MAX_TOKENS:
+        return {"error": f"CV is too long to parse ({tokens} tokens)"}
+    if tokens <= CV_SINGLE_CALL_TOKENS:
+        return _extract(client, text)
+
+    chunks = chunk_sections(split_sections(text), CV_CHUNK_TOKENS)
+    print(f"CV of {tokens} tokens split into {len(chunks)} chunks")
+    def extract(part: int) -> dict:
+        sections, chunk = chunks[part]
+        return _extract(client, chunk, part, len(chunks), sections)
+
+    with ThreadPoolExecutor(max_workers=CV_PARSE_CONCURRENCY) as executor:
+        # map keeps document order whatever order the calls finish in
+        results = list(executor.map(extract, range(len(chunks))))
+    for result in results:
+        if "error" in result:
+            return result
+    return merge_results(results)
+
+
+# --- Token counting ---
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Tokens of text for CV_MODEL; estimated if tiktoken or its encoding file is unavailable."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(CV_MODEL)
+        except Exception as e:
+            # tiktoken downloads the encoding on first use; without network, estimate
+            print(f"tiktoken unavailable, estimating tokens: {e}")
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 3 + 1 # Norwegian text averages a little over 3 characters per token
 
-    prompt = f"""
+
+# --- Chunking ---
+
+def _heading(line: str):
+    line = line.strip()
+    if not line or len(line) > 50:
+        return None
+    for section, pattern in _HEADING_RES.items():
+        if pattern.fullmatch(line):
+            return section
+    return None
+
+def split_sections(text: str) -> list:
+    """[(section, text)] in document order, split at the lines that are a section heading."""
+    sections = [["profile", []]]
+    for line in text.splitlines():
+        section = _heading(line)
+        if section:
+            sections.append([section, []])
+        sections[-1][1].append(line)
+    return [(section, "\n".join(lines)) for section, lines in sections if "\n".join(lines).strip()]
+
+def _split_long(text: str, max_tokens: int) -> list:
+    """Pieces of text of at most max_tokens, cut at blank lines (between entries) where possible."""
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    separator = "\n\n"
+    blocks = re.split(r"\n\s*\n", text)
+    if len(blocks) == 1:
+        separator = "\n"
+        blocks = text.split(separator)
+        if len(blocks) == 1:
+            # One huge line: cut it in half
+            middle = len(text) // 2
+            return _split_long(text[:middle], max_tokens) + _split_long(text[middle:], max_tokens)
+    pieces, current = [], []
+    for block in blocks:
+        if current and count_tokens(separator.join(current + [block])) > max_tokens:
+            pieces.append(separator.join(current))
+            current = []
+        current.append(block)
+    pieces.append(separator.join(current))
+    return [piece for part in pieces for piece in _split_long(part, max_tokens)] if len(pieces) > 1 else pieces
+
+def chunk_sections(sections: list, max_tokens: int) -> list:
+    """
+    [(section names, text)]: long sections split, consecutive short ones
+    packed together, each chunk within max_tokens. The profile comes first,
+    so the first chunk sees the name and title.
+    """
+    chunks = []
+    for section, text in sections:
+        for piece in _split_long(text, max_tokens):
+            if chunks and count_tokens(chunks[-1][1] + "\n" + piece) <= max_tokens:
+                names, previous = chunks[-1]
+                chunks[-1] = (names if section in names else names + [section], previous + "\n" + piece)
+            else:
+                chunks.append(([section], piece))
+    return chunks
+
+
+# --- Extraction ---
+
+def _prompt(text: str, fields=None, part: int = 0, parts: int = 1, sections=()) -> str:
+    chunk_note = ""
+    if parts > 1:
+        chunk_note = f"""
+    Teksten er del {part + 1} av {parts} av en lang CV (seksjoner: {", ".join(sections)}).
+    Trekk bare ut det som står i denne delen. Fyll ut feltene {", ".join(fields)};
+    la de andre feltene være null eller tomme lister.
+    """
+        if "projects" in sections:
+            chunk_note += """Prosjekter føres som work_experiences: selskap er byggherre eller oppdragsgiver,
+    rolle er rollen i prosjektet, og beskrivelsen starter med prosjektnavnet.
+    """
+    return f"""
     Du er en ekspert på å tolke norske CV-er for bygg- og anleggsbransjen.
     Vennligst trekk ut informasjon fra følgende CV-tekst og returner den i et strukturert JSON-format.
-    
+    {chunk_note}
     JSON-formatet skal følge dette skjemaet:
     {{
       "name": "Navn på personen",
       "title": "Nåværende eller mest relevante tittel (f.eks. Prosjektleder)",
+      "email": "Personens egen e-postadresse, eller null",
       "bio": "En kort, selgende profiltekst i 3. person (100-150 ord)",
       "languages": ["Språk 1", "Språk 2"],
       "key_competencies": ["Kompetanse 1", "Kompetanse 2"],
@@ -53,6 +291,9 @@ def parse_cv_pdf(file_content: bytes) -> dict:
       ],
       "educations": [
         {{ "institution": "Skole/Univ", "degree": "Grad", "time_frame": "Periode", "location": "Sted (valgfritt)" }}
+      ],
+      "certifications": [
+        {{ "name": "Kurs eller sertifisering (f.eks. BREEAM AP, Arbeidsvarsling 1 og 2)", "year": "År som tekst, eller null" }}
       ]
     }}
 
@@ -60,27 +301,71 @@ def parse_cv_pdf(file_content: bytes) -> dict:
     1. Språket i JSON skal være norsk.
     2. Bio skal skrives profesjonelt og appellere til byggherrer.
     3. Hvis du mangler informasjon for et felt, la det være en tom liste eller null.
+    4. E-post er bare personens egen adresse, slik den står i teksten. Firmaadresser (f.eks. post@ eller
+       i bunntekst), referansepersoners og tidligere arbeidsgiveres adresser er ikke personens: bruk null.
 
     CV TEKST:
     {text}
     """
 
+def _extract(client, text: str, part: int = 0, parts: int = 1, sections=("profile",)) -> dict:
+    fields = sorted({field for section in sections for field in SECTION_FIELDS[section]},
+                    key=SECTION_FIELDS["profile"].index)
     try:
-        client = get_openai_client()
-        if not client:
-            return {"error": "OpenAI API key not configured"}
         response = client.chat.completions.create(
-            model="gpt-4o",
+            model=CV_MODEL,
             messages=[
                 {"role": "system", "content": "Du er en assistent som kun svarer i valid JSON."},
-                {"role": "user", "content": prompt}
+                {"role": "user", "content": _prompt(text, fields, part, parts, sections)}
             ],
             response_format={ "type": "json_object" },
             temperature=0.2
         )
-        
+
         extracted_data = json.loads(response.choices[0].message.content)
+        if parts > 1:
+            # Only what this chunk was asked for, so other chunks' fields aren't overridden by guesses
+            extracted_data = {field: extracted_data.get(field) for field in fields}
         return extracted_data
     except Exception as e:
         print(f"AI CV Parsing failed: {e}")
         return {"error": f"AI parsing failed: {str(e)}"}
+
+
+# --- Merging ---
+
+def _normalize(value) -> str:
+    return re.sub(r"\s+", " ", str(value or "")).strip().casefold()
+
+def merge_results(results: list) -> dict:
+    """
+    Combines the chunks' results into one CV, independent of the order the
+    calls finished in: text fields come from the first chunk that has them
+    (the profile), lists are concatenated in document order without
+    duplicates.
+    """
+    merged = {"name": None, "title": None, "email": None, "bio": None,
+              **{field: [] for field in LIST_FIELDS}}
+    seen = {field: set() for field in LIST_FIELDS}
+    for result in results:
+        for field in ("name", "title", "email", "bio"):
+            if not merged[field] and isinstance(result.get(field), str) and result[field].strip():
+                merged[field] = result[field].strip()
+        for field in LIST_FIELDS:
+            items = result.get(field)
+            if not isinstance(items, list):
+                continue
+            for item in items:
+                if field in ENTRY_KEYS:
+                    if not isinstance(item, dict):
+                        continue
+                    key = tuple(_normalize(item.get(part)) for part in ENTRY_KEYS[field])
+                else:
+                    if not isinstance(item, str) or not item.strip():
+                        continue
+                    key = _normalize(item)
+                if key in seen[field]:
+                    continue
+                seen[field].add(key)
+                merged[field].append(item)
+    return merged
@@ -0,0 +1,64 @@
+import os
+import hashlib
+import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi.staticfiles import StaticFiles
+from utils.storage import IMMUTABLE_CACHE_CONTROL
+
+# Conditional GET for the read endpoints. The ETag is derived from the
+# request path and query and the version counters of the tables the response
+# is built from (crud.get_table_versions), so a matching If-None-Match is
+# answered with 304 before the endpoint runs its queries. K_REVISION (set by
+# Cloud Run per deployment) is mixed in, so a new release never matches ETags
+# handed out by the previous one.
+ETAG_SALT = os.getenv("K_REVISION", "")
+API_CACHE_CONTROL = "no-cache" # Browsers may keep responses, but must revalidate them
+
+
+def validators(url: str, versions: dict, now: datetime.datetime = None):
+    """
+    (etag, last_modified) of a response built from tables at the given versions.
+
+    Last-Modified has one-second resolution, so it is left out while the last
+    write is less than a second old: another write in the same second would
+    carry the same date, and a client revalidating with If-Modified-Since
+    alone would get a 304 for stale data. The ETag always changes.
+    """
+    state = ",".join(f"{name}:{version}" for name, (version, _) in sorted(versions.items()))
+    etag = '"' + hashlib.sha256(f"{ETAG_SALT}|{url}|{state}".encode()).hexdigest()[:32] + '"'
+    stamps = [updated_at for _, updated_at in versions.values() if updated_at]
+    if not stamps:
+        return etag, None
+    last_write = datetime.datetime.fromisoformat(max(stamps)).replace(tzinfo=datetime.timezone.utc)
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    if now - last_write < datetime.timedelta(seconds=1):
+        return etag, None
+    return etag, format_datetime(last_write, usegmt=True)
+
+
+def is_not_modified(headers, etag: str, last_modified: str) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        # Takes precedence over If-Modified-Since; weak comparison (RFC 9110)
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    StaticFiles for files that never change under their name (content hashes,
+    uuids), so browsers and CDNs can keep them without revalidating.
+    """
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
@@ -0,0 +1,177 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from utils.storage import get_storage, key_from_url, url_for_key
+
+# Downscaled variants of uploaded/extracted images, stored next to the
+# original (in the same storage backend) as <name>_<width>w.webp and
+# <name>_<width>w.jpg. Cards and thumbnails use these through a srcset
+# instead of multi-MB originals.
+# Widths at or above the original's width are not generated (no upscaling);
+# the original itself, with its width, is the largest candidate of the srcset.
+VARIANT_WIDTHS = (320, 800, 1600)
+VARIANT_FORMATS = {"webp": "WEBP", "jpg": "JPEG"} # extension -> PIL format
+VARIANT_MIME_TYPES = {"webp": "image/webp", "jpg": "image/jpeg"}
+VARIANT_QUALITY = 80
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# Resizing and encoding release the GIL, so a thread pool is enough
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = set()
+
+
+def variant_key(key: str, width: int, ext: str) -> str:
+    stem, _ = os.path.splitext(key)
+    return f"{stem}_{width}w.{ext}"
+
+
+def variant_keys(key: str) -> list:
+    """Every variant key an image could have."""
+    return [variant_key(key, w, ext) for w in VARIANT_WIDTHS for ext in VARIANT_FORMATS]
+
+
+def variant_url(url: str, width: int, ext: str) -> str:
+    return url_for_key(variant_key(key_from_url(url), width, ext))
+
+
+def generate_variants(key: str, source=None) -> list:
+    """
+    Writes the variants for the image stored at key (existing ones are kept).
+    source (a path or file object) saves re-reading an image the caller
+    already has. Returns (widths, width): the generated widths, smallest
+    first, and the original's width.
+    """
+    if source is None:
+        with get_storage().local_file(key) as path:
+            return generate_variants(key, path)
+
+    storage = get_storage()
+    with Image.open(source) as img:
+        original_width = img.width
+        widths = [w for w in VARIANT_WIDTHS if w < original_width]
+        if not widths:
+            return [], original_width
+        todo = [
+            (w, ext) for w in widths for ext in VARIANT_FORMATS
+            if not storage.exists(variant_key(key, w, ext))
+        ]
+        if not todo:
+            return widths, original_width
+
+        # JPEG can decode straight at a reduced scale, much faster than full size
+        largest = max(w for w, _ in todo)
+        img.draft("RGB", (largest, largest * img.height // img.width))
+        img = img.convert("RGB")
+
+        # Largest first, each step resized from the previous one
+        for width in sorted({w for w, _ in todo}, reverse=True):
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS, reducing_gap=2.0)
+            for w, ext in todo:
+                if w != width:
+                    continue
+                target = variant_key(key, width, ext)
+                tmp_path = storage.staging_path(target) # Never serve half-written files
+                img.save(tmp_path, VARIANT_FORMATS[ext], quality=VARIANT_QUALITY)
+                storage.put_file(tmp_path, target)
+    return widths, original_width
+
+
+def existing_variants(url: str):
+    """
+    (widths, width) for a newly saved image row: the widths with both formats
+    stored, or None if the variants were never generated, and the original's
+    width (read from the image header when there are variants).
+    """
+    key = key_from_url(url)
+    if not key:
+        return [], None
+    storage = get_storage()
+    widths = [
+        width for width in VARIANT_WIDTHS
+        if all(storage.exists(variant_key(key, width, ext)) for ext in VARIANT_FORMATS)
+    ]
+    if not widths:
+        # Nothing stored: not generated yet, or the image is narrower than every width
+        return None, None
+    try:
+        with storage.local_file(key) as path, Image.open(path) as img:
+            return widths, img.width
+    except Exception as e:
+        print(f"Could not read the width of {url}: {e}")
+        return None, None # Scheduled on the first read instead
+
+
+def srcset(url: str, widths, width: int = None) -> dict:
+    """
+    {"image/webp": "url 320w, url 800w, original 1500w", "image/jpeg": ...}
+    or None without variants. The browser only picks from the matching
+    <source>, never the <img> src, so the original (of the given width) is
+    in every set: wide and HiDPI layouts still get full resolution.
+    """
+    if not url or not widths:
+        return None
+    original = [f"{url} {width}w"] if width else []
+    return {
+        VARIANT_MIME_TYPES[ext]: ", ".join([f"{variant_url(url, w, ext)} {w}w" for w in widths] + original)
+        for ext in VARIANT_FORMATS
+    }
+
+
+def needs_variants(widths, width) -> bool:
+    """Whether an image row should be (re)scheduled: never processed, or recorded without the original's width."""
+    return widths is None or (bool(widths) and width is None)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image-variants")
+        return _executor
+
+
+def schedule(url: str, on_done=None) -> bool:
+    """
+    Generates the variants for url in the background pool. on_done(url, widths,
+    width) is called afterwards (width is None if the image can't be read).
+    Repeated calls for a url already in progress are ignored. Returns whether
+    it was scheduled, i.e. whether on_done will be called.
+    """
+    key = key_from_url(url)
+    if not key:
+        return False
+    with _executor_lock:
+        if url in _in_flight:
+            return False
+        _in_flight.add(url)
+
+    def run():
+        try:
+            widths, width = generate_variants(key) if get_storage().exists(key) else ([], None)
+        except Exception as e:
+            print(f"Could not create image variants for {url}: {e}")
+            widths, width = [], None # Unreadable image: record it so it isn't retried on every read
+        try:
+            if on_done:
+                on_done(url, widths, width)
+        except Exception as e:
+            print(f"Could not store image variants for {url}: {e}")
+        finally:
+            with _executor_lock:
+                _in_flight.discard(url)
+
+    try:
+        _get_executor().submit(run)
+    except RuntimeError: # Shutting down
+        with _executor_lock:
+            _in_flight.discard(url)
+        return False
+    return True
+
+
+def shutdown():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
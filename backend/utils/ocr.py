@@ -0,0 +1,168 @@
+import os
+import time
+import queue
+import threading
+import multiprocessing
+import pdfplumber
+import pytesseract
+
+# Page OCR for scanned PDFs. Pages are rendered and OCR'd in a process pool
+# (Tesseract and page rendering are CPU bound), then returned by page number
+# so the caller can reassemble them in order. The pool is created once per
+# process and shared by every call (and thread), so a job worker or a bulk
+# import does not start new OCR processes for each document.
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+OCR_PAGE_TIMEOUT = int(os.getenv("OCR_PAGE_TIMEOUT", "60")) # seconds per page
+OCR_RESOLUTION = 300 # 300 DPI is good for OCR
+# Tesseract enforces OCR_PAGE_TIMEOUT itself; this is the backstop for a page
+# that hangs while rendering, or whose worker died. The pool is shared, so a
+# call waiting longer is not stuck as long as the pool keeps finishing pages
+# (its own or others'). A stalled pool is terminated, workers included.
+OCR_STALL_TIMEOUT = OCR_PAGE_TIMEOUT + 30
+
+_pool = None
+_pool_lock = threading.Lock()
+_outstanding = 0 # Pages submitted to the pool and not finished
+_last_progress = 0.0 # monotonic time a page last finished (or the idle pool got work)
+
+# Per worker process: the PDF last OCR'd, kept open for its other pages
+_worker_path = None
+_worker_pdf = None
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: never fork a process that may hold DB connections or threads
+            _pool = multiprocessing.get_context("spawn").Pool(OCR_WORKERS)
+        return _pool
+
+
+def _replace_pool(pool):
+    """
+    Terminates a pool with stuck workers; the next call starts a fresh one.
+    Pages other callers still have in it are reported as failed by them.
+    """
+    global _pool, _outstanding
+    with _pool_lock:
+        if _pool is not pool:
+            return # Already replaced by another call
+        _pool, _outstanding = None, 0
+    pool.terminate() # Kills the workers, also one hung while rendering
+
+
+def _submit(pool, path: str, page_number: int, results: queue.Queue):
+    global _outstanding, _last_progress
+    with _pool_lock:
+        if _outstanding == 0:
+            _last_progress = time.monotonic()
+        _outstanding += 1
+
+    def done(value, failed=False):
+        global _outstanding, _last_progress
+        with _pool_lock:
+            if _pool is pool:
+                _outstanding = max(0, _outstanding - 1)
+                _last_progress = time.monotonic()
+        results.put((page_number, value, failed))
+
+    pool.apply_async(_ocr_page_number, (path, page_number),
+                     callback=done, error_callback=lambda e: done(e, failed=True))
+
+
+def shutdown():
+    global _pool, _outstanding
+    with _pool_lock:
+        pool, _pool, _outstanding = _pool, None, 0
+    if pool is not None:
+        pool.terminate()
+
+
+def _ocr_image(pil_image) -> str:
+    # Use Norwegian ("nor") if available, fallback to eng.
+    # The timeout kills a stuck tesseract process (raises RuntimeError).
+    try:
+        return pytesseract.image_to_string(pil_image, lang='nor', timeout=OCR_PAGE_TIMEOUT)
+    except pytesseract.TesseractError:
+        return pytesseract.image_to_string(pil_image, timeout=OCR_PAGE_TIMEOUT)
+
+
+def ocr_page(page) -> str:
+    """Renders a pdfplumber page and OCRs it."""
+    pil_image = page.to_image(resolution=OCR_RESOLUTION).original
+    return _ocr_image(pil_image)
+
+
+def _ocr_page_number(path: str, page_number: int) -> str:
+    global _worker_path, _worker_pdf
+    if path != _worker_path:
+        # Opened by the worker itself, nothing is pickled
+        if _worker_pdf is not None:
+            _worker_pdf.close()
+        _worker_path, _worker_pdf = None, None
+        _worker_pdf = pdfplumber.open(path)
+        _worker_path = path
+    return ocr_page(_worker_pdf.pages[page_number])
+
+
+def ocr_pages(path: str, page_numbers: list, pdf=None) -> dict:
+    """
+    OCRs the given (0-based) pages. Returns {page_number: text}, with None for
+    pages that failed or timed out.
+
+    A single page, or OCR_WORKERS <= 1, is handled inline on the already open
+    `pdf` when given; otherwise pages are fanned out over the process pool.
+    """
+    results = {n: None for n in page_numbers}
+    if not page_numbers:
+        return results
+
+    workers = min(OCR_WORKERS, len(page_numbers))
+    if workers <= 1:
+        own_pdf = pdf is None
+        if own_pdf:
+            pdf = pdfplumber.open(path)
+        try:
+            for n in page_numbers:
+                try:
+                    results[n] = ocr_page(pdf.pages[n])
+                except Exception as e:
+                    print(f"OCR Failed for page {n + 1}: {e}")
+        finally:
+            if own_pdf:
+                pdf.close()
+        return results
+
+    pool = _get_pool()
+    finished = queue.Queue()
+    try:
+        for n in page_numbers:
+            _submit(pool, path, n, finished)
+    except ValueError as e:
+        # Pool not running: terminated by another call in the meantime
+        print(f"OCR failed: {e}")
+        return results
+
+    pending = set(page_numbers)
+    while pending:
+        try:
+            n, value, failed = finished.get(timeout=1)
+        except queue.Empty:
+            with _pool_lock:
+                replaced = _pool is not pool
+                stalled = time.monotonic() - _last_progress >= OCR_STALL_TIMEOUT
+            if replaced or stalled:
+                break
+            continue
+        pending.discard(n)
+        if failed:
+            print(f"OCR Failed for page {n + 1}: {value!r}")
+        else:
+            results[n] = value
+    for n in sorted(pending):
+        print(f"OCR timed out for page {n + 1}")
+    if pending:
+        # Stuck (or dead) workers: later calls get a fresh pool
+        _replace_pool(pool)
+    return results
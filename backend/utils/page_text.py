@@ -0,0 +1,68 @@
+import hashlib
+from pdfminer.pdftypes import resolve1
+from utils import pdf_cache
+from utils.ocr import ocr_pages, OCR_RESOLUTION
+
+# Page text for the PDF parsers (utils/parser.py for projects,
+# utils/cv_parser.py for CVs). Pages with a text layer are read directly;
+# pages with (almost) none are scanned images and are OCR'd, in parallel
+# (see utils/ocr.py). OCR results are cached per page, keyed by a hash of the
+# page's content streams and images, so the same scanned page is only OCR'd
+# once: when the same file is parsed again after a failed AI step, or when it
+# turns up again in another PDF.
+# Bump when OCR settings change, so cached page texts stop matching
+OCR_VERSION = "1"
+MIN_TEXT_CHARS = 100 # Pages with less text than this are treated as having no text layer
+
+
+def page_digest(page) -> str:
+    """SHA-256 of what a pdfplumber page draws: its content streams and its images, undecoded."""
+    h = hashlib.sha256()
+    page_obj = page.page_obj
+    h.update(repr((page.bbox, page_obj.attrs.get("Rotate"))).encode())
+    contents = resolve1(page_obj.attrs.get("Contents"))
+    for stream in contents if isinstance(contents, list) else [contents]:
+        stream = resolve1(stream)
+        if stream is not None:
+            h.update(stream.get_rawdata() or b"")
+    for image in page.images:
+        h.update(image["stream"].get_rawdata() or b"")
+    return h.hexdigest()
+
+
+def _ocr_cache_key(digest: str) -> str:
+    return hashlib.sha256(f"page_ocr:{OCR_VERSION}:{OCR_RESOLUTION}:{digest}".encode()).hexdigest()
+
+
+def extract_page_texts(pdf, path: str, layout: bool = False, min_chars: int = MIN_TEXT_CHARS):
+    """
+    Returns (texts, ocr_pages, failed_pages): the text of every page of the
+    open pdfplumber document at path, the numbers of the pages that needed
+    OCR, and of those whose OCR failed or timed out. A failed page keeps
+    whatever text layer it had ("" if none), so the text is incomplete and
+    callers should not cache what they make of it.
+    """
+    # extract_text() is None for pages without any text layer
+    texts = [page.extract_text(layout=layout) or "" for page in pdf.pages]
+    needed = [i for i, text in enumerate(texts) if len(text.strip()) < min_chars]
+    if not needed:
+        return texts, needed, []
+
+    keys = {i: _ocr_cache_key(page_digest(pdf.pages[i])) for i in needed}
+    cached = {i: pdf_cache.get(keys[i]) for i in needed}
+    missing = [i for i in needed if cached[i] is None]
+    ocr_texts = ocr_pages(path, missing, pdf=pdf)
+    for i in missing:
+        if ocr_texts[i] is not None:
+            pdf_cache.put(keys[i], ocr_texts[i])
+    if len(missing) < len(needed):
+        print(f"OCR: {len(needed) - len(missing)} of {len(needed)} pages from the cache")
+
+    failed = []
+    for i in needed:
+        text = cached[i] if cached[i] is not None else ocr_texts[i]
+        if text is not None:
+            texts[i] = text
+        else:
+            failed.append(i)
+    return texts, needed, failed
@@ -1,45 +1,282 @@
 
 import re
 import os
-import uuid
 from io import BytesIO
 import pdfplumber
 import pytesseract
 from PIL import Image
-from pypdf import PdfReader # Keep for image extraction
+import numpy as np
+from pdfminer.pdftypes import resolve1, LITERALS_DCT_DECODE, LITERALS_JPX_DECODE
+from utils.page_text import extract_page_texts
+from utils import pdf_cache, image_variants, blobs
+from utils.storage import get_storage, key_from_url
+
+# Bump when the output of parse_pdf changes, to invalidate cached results
+PARSER_VERSION = "3"
+
+# Smart crop trims the title above and the metadata block below page
+# screenshots. "auto" uses the PDF's own word positions and only runs
+# Tesseract on images without a text layer, "text" never runs Tesseract and
+# "off" skips cropping altogether (fastest, for bulk imports).
+SMART_CROP_MODES = ("auto", "text", "off")
+SMART_CROP = os.getenv("PARSE_SMART_CROP", "auto")
+
+def parse_pdf(path: str, smart_crop: str = None) -> dict:
+    smart_crop = smart_crop or SMART_CROP
+    if smart_crop not in SMART_CROP_MODES:
+        raise ValueError(f"smart_crop must be one of {', '.join(SMART_CROP_MODES)}")
+    # Re-uploads of the same PDF are answered from the content-hash cache
+    return pdf_cache.cached("project_pdf", f"{PARSER_VERSION}:{smart_crop}", path,
+                            lambda path: _parse_pdf(path, smart_crop), is_valid=_is_cacheable)
+
+def _is_cacheable(result: dict) -> bool:
+    # A degraded parse (see "incomplete" in _parse_document) is never cached, so a
+    # retry gets another chance; a cached result is only usable while the images
+    # it points to are still stored
+    if result.get("incomplete"):
+        return False
+    storage = get_storage()
+    return all(storage.exists(key_from_url(url)) for url in result.get("extracted_images", []))
+
+# Collage splitting: white bands wider than MIN_GAP px separate sub-images
+GAP_THRESH = 250
+MIN_GAP = 10
+MIN_IMG_SIZE = 50
+
+def _find_gaps(brightness):
+    """
+    Returns (start, end) runs where brightness > GAP_THRESH that are longer than
+    MIN_GAP, using run-length detection on the boolean mask. Like the original
+    scan, a white run touching the far edge is not treated as a gap.
+    """
+    mask = brightness > GAP_THRESH
+    edges = np.diff(mask.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = ((ends - starts) > MIN_GAP) & (ends < len(mask))
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+def _split_spans(length, gaps):
+    """The (start, end) spans between gaps that are larger than MIN_IMG_SIZE."""
+    spans = []
+    last = 0
+    for gs, ge in gaps:
+        if gs - last > MIN_IMG_SIZE: spans.append((last, gs))
+        last = ge
+    if length - last > MIN_IMG_SIZE: spans.append((last, length))
+    return spans
+
+def _split_boxes(lum, x0, y0, x1, y1):
+    """
+    Recursively split the box by white columns first, then rows. lum holds
+    R+G+B per pixel; each level only takes views of it, nothing is copied.
+    """
+    view = lum[y0:y1, x0:x1]
+
+    # 1. Check Vertical Gaps (Split columns)
+    spans = _split_spans(x1 - x0, _find_gaps(view.mean(axis=0) / 3))
+    if len(spans) > 1:
+        boxes = []
+        for s, e in spans: boxes.extend(_split_boxes(lum, x0 + s, y0, x0 + e, y1))
+        return boxes
+
+    # 2. Check Horizontal Gaps (Split rows)
+    spans = _split_spans(y1 - y0, _find_gaps(view.mean(axis=1) / 3))
+    if len(spans) > 1:
+        boxes = []
+        for s, e in spans: boxes.extend(_split_boxes(lum, x0, y0 + s, x1, y0 + e))
+        return boxes
+
+    return [(x0, y0, x1, y1)]
+
+def split_by_gaps(img):
+    """Splits a collage into its sub-images along white gaps."""
+    try:
+        if img.mode != "RGB": img = img.convert("RGB")
+        rgb = np.asarray(img)
+        lum = np.add(rgb[:, :, 0], rgb[:, :, 1], dtype=np.uint16)
+        lum += rgb[:, :, 2]
+        h, w = lum.shape
+        boxes = _split_boxes(lum, 0, 0, w, h)
+        if len(boxes) == 1:
+            return [img]
+        return [img.crop(box) for box in boxes]
+    except Exception as e:
+        print(f"Recursive split failed: {e}")
+        return [img]
+
+CROP_KEYWORDS = ["Type", "Sted", "Bygging", "Beskrivelse", "Areal", "Kontraktsverdi", "Entreprise"]
+CROP_MARGIN = 10
+
+def _image_words(words, placement, w, h):
+    """
+    Text-layer words lying on top of an embedded image, as (text, top, bottom)
+    in the image's pixel coordinates. Returns None when the page has no text
+    layer or the image's placement can't be mapped, so the caller can fall back to OCR.
+    """
+    if not words:
+        return None
+    x0, top, x1, bottom = placement["x0"], placement["top"], placement["x1"], placement["bottom"]
+    if x1 - x0 <= 0 or bottom - top <= 0:
+        return None
+    # A rotated placement can't be mapped from its bounding box alone
+    if abs((x1 - x0) / (bottom - top) - w / h) > 0.1 * w / h:
+        return None
 
-def parse_pdf(file_content: bytes) -> dict:
+    scale = h / (bottom - top)
+    return [
+        (word["text"], (word["top"] - top) * scale, (word["bottom"] - top) * scale)
+        for word in words
+        if word["x1"] > x0 and word["x0"] < x1 and word["bottom"] > top and word["top"] < bottom
+    ]
+
+def _ocr_words(image):
+    """Tesseract word boxes in the image, as (text, top, bottom)."""
+    ocr_data = pytesseract.image_to_data(image, lang='nor', output_type=pytesseract.Output.DICT)
+    return [
+        (text, top, top + height)
+        for text, top, height in zip(ocr_data['text'], ocr_data['top'], ocr_data['height'])
+    ]
+
+def _smart_crop_box(words, w, h, title: str):
+    """
+    Returns (crop_top, crop_bottom) that cuts off the project title at the top
+    and the metadata block (first cutoff keyword) at the bottom, or None.
+    """
+    min_y_cutoff = h # Default to full height
+    max_y_start = 0  # Default to top
+
+    has_cutoff = False
+    has_start_trim = False
+
+    # Check for title to trim top
+    title_words = [tw.lower() for tw in title.split()[:2]] # First 2 words of title
+
+    for text, top, bottom in words:
+        text = text.strip().lower()
+        if len(text) < 3: continue
+
+        # check for cutoff keywords
+        if any(kw.lower() in text for kw in CROP_KEYWORDS) and top < min_y_cutoff:
+            min_y_cutoff = top
+            has_cutoff = True
+
+        # check for title overlap (trim top)
+        if any(tw in text for tw in title_words) and top < h * 0.2: # Title usually in top 20%
+            if bottom > max_y_start:
+                max_y_start = bottom
+                has_start_trim = True
+
+    if not (has_cutoff or has_start_trim):
+        return None
+    crop_top = int(max_y_start) + CROP_MARGIN if has_start_trim else 0
+    crop_bottom = int(min_y_cutoff) - CROP_MARGIN if has_cutoff else h
+    if crop_bottom - crop_top <= 100: # Ensure we don't crop everything
+        return None
+    return crop_top, crop_bottom
+
+# Embedded images smaller than this (compressed bytes or pixels) are icons/logos
+MIN_IMAGE_BYTES = 10240
+MIN_IMAGE_DIM = 200
+
+def _is_image_candidate(img) -> bool:
+    """Cheap checks on the image XObject dictionary, before anything is decoded."""
+    w, h = img["srcsize"]
+    if not w or not h or w < MIN_IMAGE_DIM or h < MIN_IMAGE_DIM: return False
+    # Stencil masks and 1-bit line art never pass the entropy check
+    if img.get("imagemask") or img.get("bits") == 1: return False
+    stream = img["stream"]
+    if stream.rawdata is not None:
+        length = len(stream.rawdata)
+    else:
+        length = resolve1(stream.attrs.get("Length")) or 0
+    return length >= MIN_IMAGE_BYTES
+
+def _literal_name(obj):
+    obj = resolve1(obj)
+    return getattr(obj, "name", obj)
+
+def _raw_image_mode(colorspace):
+    """
+    PIL mode (and RGB palette for Indexed) for raw 8-bit samples in the given
+    pdfplumber colour space, or (None, None) when unsupported.
+    """
+    if not colorspace:
+        return None, None
+    name = _literal_name(colorspace[0])
+    if name in ("DeviceRGB", "CalRGB", "RGB"): return "RGB", None
+    if name in ("DeviceGray", "CalGray", "G"): return "L", None
+    if name in ("DeviceCMYK", "CMYK"): return "CMYK", None
+    if name == "ICCBased" and len(colorspace) > 1:
+        components = resolve1(resolve1(colorspace[1]).get("N"))
+        return {1: "L", 3: "RGB", 4: "CMYK"}.get(components), None
+    if name in ("Indexed", "I") and len(colorspace) > 3:
+        base_mode, _ = _raw_image_mode(colorspace[1:2])
+        lookup = resolve1(colorspace[3])
+        if hasattr(lookup, "get_data"): lookup = lookup.get_data()
+        if isinstance(lookup, str): lookup = lookup.encode("latin-1")
+        if base_mode == "RGB" and isinstance(lookup, bytes):
+            return "P", lookup
+    return None, None
+
+def _decode_image(img):
+    """
+    Decodes a pdfplumber image object to (PIL image, file extension). JPEG and
+    JPEG 2000 streams are opened as-is; other filters are decompressed by
+    pdfminer and read as raw samples. Returns (None, None) when unsupported.
+    """
+    stream = img["stream"]
+    filters = stream.get_filters()
+    data = stream.get_data() # Undoes Flate/LZW/ASCII filters, leaves DCT/JPX encoded
+    last_filter = filters[-1][0] if filters else None
+    if last_filter in LITERALS_DCT_DECODE:
+        return Image.open(BytesIO(data)), ".jpg"
+    if last_filter in LITERALS_JPX_DECODE:
+        return Image.open(BytesIO(data)), ".jp2"
+
+    if img.get("bits") != 8:
+        return None, None
+    mode, palette = _raw_image_mode(img["colorspace"])
+    if not mode:
+        return None, None
+    image = Image.frombytes(mode, img["srcsize"], data)
+    if palette:
+        image.putpalette(palette)
+    return image, ".png"
+
+def _parse_pdf(path: str, smart_crop: str = "auto") -> dict:
+    # One pdfplumber document serves both the text and the image stage.
+    # It reads from the file on demand, so the PDF is never loaded whole.
+    try:
+        pdf = pdfplumber.open(path)
+    except Exception as e:
+        print(f"pdfplumber failed: {e}")
+        return {}
+    try:
+        return _parse_document(pdf, path, smart_crop)
+    finally:
+        pdf.close()
+
+def _parse_document(pdf, path: str, smart_crop: str) -> dict:
     text = ""
+    page_words = []
+    incomplete = [] # Stages that degraded (OCR failures, image extraction errors)
     
     # --- STAGE 1: TEXT EXTRACTION (pdfplumber + OCR) ---
     try:
-        with pdfplumber.open(BytesIO(file_content)) as pdf:
-            for page in pdf.pages:
-                # Use layout=True to preserve visual columns
-                page_text = page.extract_text(layout=True)
-                
-                # Heuristic: If page text is very short/empty, likely an image-only PDF
-                if not page_text or len(page_text.strip()) < 100:
-                    try:
-                        # Attempt OCR
-                        # Render page to image (300 DPI is good for OCR)
-                        pim = page.to_image(resolution=300)
-                        pil_image = pim.original
-                        # Use Norwegian ("nor") if available, fallback to eng
-                        try:
-                            ocr_text = pytesseract.image_to_string(pil_image, lang='nor')
-                        except:
-                            # Fallback if 'nor' not installed (though we installed it)
-                            ocr_text = pytesseract.image_to_string(pil_image)
-                        
-                        text += ocr_text + "\n"
-                    except Exception as e:
-                        print(f"OCR Failed for page: {e}")
-                        # Fallback to whatever text we had
-                        if page_text:
-                            text += page_text + "\n"
-                else:
-                    text += page_text + "\n"
+        # Use layout=True to preserve visual columns. Pages with very short/empty
+        # text are likely image-only; those are OCR'd (see utils/page_text.py).
+        page_texts, ocr_needed, ocr_failed = extract_page_texts(pdf, path, layout=True)
+        incomplete += [f"OCR failed for page {i + 1}" for i in ocr_failed]
+
+        # Word positions let smart crop skip OCR'ing images on pages with a text layer
+        if smart_crop != "off":
+            for i, page in enumerate(pdf.pages):
+                page_words.append(page.extract_words() if i not in ocr_needed else None)
+
+        for page_text in page_texts:
+            if page_text:
+                text += page_text + "\n"
 
     except Exception as e:
         print(f"pdfplumber failed: {e}")
@@ -405,24 +642,31 @@ def parse_pdf(file_content: bytes) -> dict:
     extracted['description'] = find_description(lines, extracted)
 
 
-    # --- STAGE 2: IMAGE EXTRACTION (pypdf) ---
-    # We use pypdf because it's good at extracting raw embedded image streams.
-    # pdfplumber extracts cropped bitmaps which is slower/worse for "original photo" recovery.
+    # --- STAGE 2: IMAGE EXTRACTION (pdfplumber) ---
+    # Images come from the same pdfplumber document as the text. Their raw
+    # streams are decoded (not rendered), so we recover the original photo,
+    # and only after the XObject dictionary passes the cheap size checks.
     extracted_images = []
-    output_dir = "static/uploaded_images"
-    os.makedirs(output_dir, exist_ok=True)
+    output_prefix = "uploaded_images"
+    seen_streams = set()
     
     try:
-        reader = PdfReader(BytesIO(file_content))
-        for page in reader.pages:
-            for image_file_object in page.images:
+        for page_number, page in enumerate(pdf.pages):
+            for placement in page.images:
                 try:
                     # Filter: ignore small images (< 10KB) or small dimensions
-                    if len(image_file_object.data) < 10240: continue
-                    
-                    image = Image.open(BytesIO(image_file_object.data))
+                    if not _is_image_candidate(placement): continue
+
+                    # An image placed several times (or on several pages) is extracted once
+                    stream_id = placement["stream"].objid or id(placement["stream"])
+                    if stream_id in seen_streams: continue
+                    seen_streams.add(stream_id)
+
+                    image, ext = _decode_image(placement)
+                    if image is None:
+                        print(f"Skipping image with unsupported encoding on page {page_number + 1}")
+                        continue
                     w, h = image.size
-                    if w < 200 or h < 200: continue
                     
                     # Entropy / White check
                     # Convert to grayscale
@@ -442,138 +686,20 @@ def parse_pdf(file_content: bytes) -> dict:
                              continue
                     
                     # --- SMART CROP LOGIC ---
-                    try:
-                        # Analyze image for text overlap
-                        # We use a fast configuration for OCR
-                        ocr_data = pytesseract.image_to_data(image, lang='nor', output_type=pytesseract.Output.DICT)
-                        n_boxes = len(ocr_data['text'])
-                        
-                        min_y_cutoff = h # Default to full height
-                        max_y_start = 0  # Default to top
-                        
-                        has_cutoff = False
-                        has_start_trim = False
-                        
-                        keywords_cutoff = ["Type", "Sted", "Bygging", "Beskrivelse", "Areal", "Kontraktsverdi", "Entreprise"]
-                        # Check for title to trim top
-                        title_words = extracted.get('name', '').split()[:2] # First 2 words of title
-                        
-                        for i in range(n_boxes):
-                            text = ocr_data['text'][i].strip()
-                            if len(text) < 3: continue
-                            
-                            top = ocr_data['top'][i]
-                            height = ocr_data['height'][i]
-                            bottom = top + height
-                            
-                            # check for cutoff keywords
-                            for kw in keywords_cutoff:
-                                if kw.lower() in text.lower():
-                                    if top < min_y_cutoff:
-                                        min_y_cutoff = top
-                                        has_cutoff = True
-                            
-                            # check for title overlap (trim top)
-                            if title_words:
-                                for tw in title_words:
-                                    if tw.lower() in text.lower() and top < h * 0.2: # Title usually in top 20%
-                                        if bottom > max_y_start:
-                                            max_y_start = bottom
-                                            has_start_trim = True
-
-                        if has_cutoff or has_start_trim:
-                            # Apply crop
-                            # Add some margin
-                            crop_top = max_y_start + 10 if has_start_trim else 0
-                            crop_bottom = min_y_cutoff - 10 if has_cutoff else h
-                            
-                            if crop_bottom - crop_top > 100: # Ensure we don't crop everything
-                                image = image.crop((0, crop_top, w, crop_bottom))
-                                
-                    except Exception as e:
-                        print(f"Smart crop failed: {e}")
-
-                    # --- RECURSIVE SPLIT LOGIC ---
-                    
-                    def split_recursive(img):
-                        """Recursively split image by white gaps."""
-                        # Simplified to just return img if simple
-                        # (Keeping your complex logic but verifying split chunks)
+                    if smart_crop != "off":
                         try:
-                            import numpy as np
-                            if img.mode != "RGB": img = img.convert("RGB")
-                            arr = np.array(img)
-                            
-                            h, w, _ = arr.shape
-                            GAP_THRESH = 250
-                            MIN_GAP = 10
-                            MIN_IMG_SIZE = 50
-                            
-                            # 1. Check Vertical Gaps (Split columns)
-                            col_avg = np.mean(arr, axis=0) # (width, 3)
-                            col_brightness = np.mean(col_avg, axis=1) # (width,)
-                            
-                            v_gaps = []
-                            is_gap = False
-                            gap_start = 0
-                            
-                            for x, b in enumerate(col_brightness):
-                                if b > GAP_THRESH:
-                                    if not is_gap: is_gap = True; gap_start = x
-                                else:
-                                    if is_gap:
-                                        is_gap = False
-                                        if x - gap_start > MIN_GAP: v_gaps.append((gap_start, x))
-                            
-                            if v_gaps:
-                                chunks = []
-                                last_x = 0
-                                for gs, ge in v_gaps:
-                                    if gs - last_x > MIN_IMG_SIZE: chunks.append(img.crop((last_x, 0, gs, h)))
-                                    last_x = ge
-                                if w - last_x > MIN_IMG_SIZE: chunks.append(img.crop((last_x, 0, w, h)))
-                                
-                                if len(chunks) > 1:
-                                    result = []
-                                    for c in chunks: result.extend(split_recursive(c))
-                                    return result
-
-                            # 2. Check Horizontal Gaps (Split rows)
-                            row_avg = np.mean(arr, axis=1) # (height, 3)
-                            row_brightness = np.mean(row_avg, axis=1) # (height,)
-                            
-                            h_gaps = []
-                            is_gap = False
-                            gap_start = 0
-                            
-                            for y, b in enumerate(row_brightness):
-                                if b > GAP_THRESH:
-                                    if not is_gap: is_gap = True; gap_start = y
-                                else:
-                                    if is_gap:
-                                        is_gap = False
-                                        if y - gap_start > MIN_GAP: h_gaps.append((gap_start, y))
-                            
-                            if h_gaps:
-                                chunks = []
-                                last_y = 0
-                                for gs, ge in h_gaps:
-                                    if gs - last_y > MIN_IMG_SIZE: chunks.append(img.crop((0, last_y, w, gs)))
-                                    last_y = ge
-                                if h - last_y > MIN_IMG_SIZE: chunks.append(img.crop((0, last_y, w, h)))
-                                
-                                if len(chunks) > 1:
-                                    result = []
-                                    for c in chunks: result.extend(split_recursive(c))
-                                    return result
-                                    
-                            return [img]
-                            
+                            words = _image_words(page_words[page_number], placement, w, h)
+                            if words is None and smart_crop == "auto":
+                                # No text layer to go by (scanned page, or image not located): OCR the image
+                                words = _ocr_words(image)
+                            crop = _smart_crop_box(words or [], w, h, extracted.get('name', ''))
+                            if crop:
+                                image = image.crop((0, crop[0], w, crop[1]))
                         except Exception as e:
-                            print(f"Recursive split failed: {e}")
-                            return [img]
+                            print(f"Smart crop failed: {e}")
 
-                    images_to_save = split_recursive(image)
+                    # --- RECURSIVE SPLIT LOGIC ---
+                    images_to_save = split_by_gaps(image)
 
                     # Save extracted images
                     for sub_img in images_to_save:
@@ -581,21 +707,27 @@ def parse_pdf(file_content: bytes) -> dict:
                         sw, sh = sub_img.size
                         if sw < 150 or sh < 150: continue # Skip small icons/fragments
                         
-                        ext = os.path.splitext(image_file_object.name)[1]
-                        if not ext: ext = ".jpg"
-                        
-                        filename = f"img_{uuid.uuid4().hex}{ext}"
-                        filepath = os.path.join(output_dir, filename)
-                        
                         if sub_img.mode != "RGB": sub_img = sub_img.convert("RGB")
-                        sub_img.save(filepath, quality=90)
+                        buffer = BytesIO()
+                        sub_img.save(buffer, Image.registered_extensions()[ext], quality=90)
+                        # Content-addressed: an image extracted before is not written again
+                        url, _ = blobs.store_bytes(buffer.getvalue(), output_prefix, ext)
+                        if url in extracted_images: continue
+                        try:
+                            # Already in a job worker process, so generate thumbnails right away
+                            # (a no-op when the blob and its variants already exist)
+                            buffer.seek(0)
+                            image_variants.generate_variants(key_from_url(url), source=buffer)
+                        except Exception as e:
+                            print(f"Could not create image variants: {e}")
                         
-                        extracted_images.append(f"/static/uploaded_images/{filename}")
+                        extracted_images.append(url)
 
                 except:
                     pass
     except Exception as e:
         print(f"Image extraction warning: {e}")
+        incomplete.append(f"Image extraction failed: {e}")
 
 
     # Cleanup Description
@@ -658,5 +790,7 @@ def parse_pdf(file_content: bytes) -> dict:
         extracted['description'] = "\n".join(lines).strip()
 
     extracted['extracted_images'] = extracted_images
+    if incomplete:
+        extracted['incomplete'] = incomplete
     
     return extracted
@@ -0,0 +1,96 @@
+import os
+import json
+import uuid
+import hashlib
+
+# On-disk cache for parser results, keyed by SHA-256 of the file content plus
+# the parser name and version. Bump a parser's PARSER_VERSION when its output
+# changes so stale entries stop matching. Entries are JSON files; a hit
+# refreshes the file's mtime and the oldest entries are evicted once the
+# directory grows past PDF_CACHE_MAX_BYTES (LRU by size).
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "cache/parsed")
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+PDF_CACHE_ENABLED = os.getenv("PDF_CACHE_ENABLED", "1") != "0"
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of the file, read in chunks."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def cache_key(kind: str, version: str, path: str) -> str:
+    digest = file_digest(path)
+    return hashlib.sha256(f"{kind}:{version}:{digest}".encode()).hexdigest()
+
+
+def _path(key: str) -> str:
+    return os.path.join(PDF_CACHE_DIR, f"{key}.json")
+
+
+def get(key: str):
+    if not PDF_CACHE_ENABLED:
+        return None
+    path = _path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            value = json.load(f)
+        os.utime(path) # Mark as recently used
+        return value
+    except (OSError, ValueError):
+        return None
+
+
+def put(key: str, value):
+    if not PDF_CACHE_ENABLED:
+        return
+    try:
+        os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        # Write to a temp file and rename, so parallel workers never see partial entries
+        tmp_path = os.path.join(PDF_CACHE_DIR, f".{key}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, _path(key))
+        _evict()
+    except OSError as e:
+        print(f"Could not write parser cache entry: {e}")
+
+
+def _evict():
+    entries = []
+    total = 0
+    for entry in os.scandir(PDF_CACHE_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+
+    entries.sort() # Least recently used first
+    for _, size, path in entries:
+        if total <= PDF_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def cached(kind: str, version: str, path: str, parse, is_valid=lambda result: True):
+    """
+    Returns parse(path), served from the cache when a file with the same bytes
+    was parsed before by the same parser version. Results are only stored when
+    is_valid(result) is true, and a cached result failing is_valid is re-parsed.
+    """
+    key = cache_key(kind, version, path)
+    result = get(key)
+    if result is not None and is_valid(result):
+        return result
+    result = parse(path)
+    if result and is_valid(result):
+        put(key, result)
+    return result
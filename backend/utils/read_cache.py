@@ -0,0 +1,177 @@
+import os
+import time
+import select
+import threading
+from collections import OrderedDict
+from sqlalchemy.engine import make_url
+
+# In-process TTL + LRU cache for rarely changing reads (project types, tags,
+# project summaries, the table version counters behind the ETags). Each cache
+# depends on database tables; writes invalidate it through crud.bump_versions:
+#   - in the writing process right after the commit
+#   - in every other worker via Postgres LISTEN/NOTIFY (crud sends a
+#     notification in the write transaction, so it arrives with the commit)
+# The TTL bounds how stale an entry can get if a notification is missed
+# (e.g. while the listener reconnects, or on SQLite where there is no NOTIFY).
+READ_CACHE_ENABLED = os.getenv("READ_CACHE_ENABLED", "1") != "0"
+READ_CACHE_TTL = int(os.getenv("READ_CACHE_TTL", "60")) # seconds
+NOTIFY_CHANNEL = "prosjektbank_cache"
+
+_caches = []
+
+
+class TTLCache:
+    def __init__(self, name: str, tables, maxsize: int = 128, ttl: int = READ_CACHE_TTL, clear_last: bool = False):
+        self.name = name
+        self.tables = set(tables)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clear_last = clear_last
+        self._data = OrderedDict() # key -> (expires, value), least recently used first
+        self._lock = threading.Lock()
+        self._generation = 0 # Bumped by clear(), see get_or_compute
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get_or_compute(self, key, compute):
+        if not READ_CACHE_ENABLED:
+            return compute()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = compute()
+
+        with self._lock:
+            # Cleared while computing: the value may predate the write, don't keep it
+            if generation == self._generation:
+                self._data[key] = (now + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def cache(name: str, tables, **kwargs) -> TTLCache:
+    """Creates and registers a cache that is cleared whenever one of tables is written."""
+    c = TTLCache(name, tables, **kwargs)
+    _caches.append(c)
+    return c
+
+
+def invalidate(tables=None):
+    """Clears the caches depending on tables (all caches if None) in this process."""
+    affected = [c for c in _caches if tables is None or c.tables & set(tables)]
+    # Data before the version counters, so a request never pairs a new ETag with old data
+    for c in sorted(affected, key=lambda c: c.clear_last):
+        c.clear()
+
+
+def stats() -> dict:
+    return {
+        "enabled": READ_CACHE_ENABLED,
+        "listener": _listener.status if _listener else "off",
+        "caches": {c.name: c.stats() for c in _caches},
+    }
+
+
+class _Listener(threading.Thread):
+    """LISTENs on NOTIFY_CHANNEL on its own connection and invalidates the local caches."""
+
+    def __init__(self, engine, url):
+        super().__init__(name="read-cache-listener", daemon=True)
+        self.engine = engine
+        self.url = make_url(url)
+        self.stopped = threading.Event()
+        self.status = "connecting"
+
+    def _connect(self):
+        # A dedicated connection outside the pool, held for the process lifetime
+        dialect = self.engine.dialect
+        cargs, cparams = dialect.create_connect_args(self.url)
+        conn = dialect.connect(*cargs, **cparams)
+        conn.autocommit = True
+        conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+        return conn
+
+    def run(self):
+        backoff = 1
+        while not self.stopped.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                # Notifications may have been missed while disconnected
+                invalidate()
+                self.status = "listening"
+                backoff = 1
+                while not self.stopped.is_set():
+                    if not select.select([conn], [], [], 30)[0]:
+                        # Idle: make sure the connection (and the LISTEN) is still alive
+                        conn.cursor().execute("SELECT 1")
+                        continue
+                    conn.poll()
+                    tables = set()
+                    while conn.notifies:
+                        tables.update(conn.notifies.pop(0).payload.split(","))
+                    if tables:
+                        invalidate(tables)
+            except Exception as e:
+                self.status = f"reconnecting ({e.__class__.__name__})"
+                print(f"Read cache listener error: {e}")
+                self.stopped.wait(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+_listener = None
+
+
+def start_listener(engine, url):
+    """
+    Starts cross-worker invalidation, LISTENing on a connection to url.
+    Only Postgres has LISTEN/NOTIFY; elsewhere (or without url) the TTL applies.
+    """
+    global _listener
+    if not READ_CACHE_ENABLED or engine.dialect.name != "postgresql" or _listener is not None:
+        return
+    if not url:
+        print("Read cache: no direct database connection for LISTEN, relying on the TTL")
+        return
+    _listener = _Listener(engine, url)
+    _listener.start()
+
+
+def stop_listener():
+    if _listener is not None:
+        _listener.stopped.set()
@@ -0,0 +1,143 @@
+import re
+import html
+
+# In-process full-text search used when the database is not Postgres (SQLite
+# in local dev and tests). It mirrors the Postgres 'norwegian' text search
+# configuration closely enough for ranking and highlighting to behave alike:
+# Snowball Norwegian stemming, the Snowball stop word list, AND semantics
+# between query terms and A/B/C field weights.
+
+VOWELS = "aeiouyæåø"
+VALID_S_ENDING = "bcdfghjlmnoprtvyz"
+
+STEP1_SUFFIXES = sorted([
+    "a", "e", "ede", "ande", "ende", "ane", "ene", "hetene", "en", "heten", "ar", "er",
+    "heter", "as", "es", "edes", "endes", "enes", "hetenes", "ens", "hetens", "ers",
+    "ets", "et", "het", "ast",
+], key=len, reverse=True)
+
+STEP3_SUFFIXES = sorted([
+    "leg", "eleg", "ig", "eig", "lig", "elig", "els", "lov", "elov", "slov", "hetslov",
+], key=len, reverse=True)
+
+STOP_WORDS = set("""
+og i jeg det at en et den til er som på de med han av ikke ikkje der så var meg seg
+men ett har om vi min mitt ha hadde hun nå over da ved fra du ut sin dem oss opp man
+kan hans hvor eller hva skal selv sjøl her alle vil bli ble blei blitt kunne inn når
+være kom noen noe ville dere deres kun ja etter ned skulle denne for deg si sine sitt
+mot å meget hvorfor dette disse uten hvordan ingen din ditt blir samme hvilken hvilke
+sånn inni mellom vår hver hvem vors hvis både bare enn fordi før mange også slik vært
+båe begge siden dykk dykkar dei deira deires deim di då eg ein eit eitt elles honom
+hjå ho hoe henne hennar hennes hoss hossen ingi inkje korleis korso kva kvar kvarhelst
+kven kvi kvifor me medan mi mine mykje no nokon noka nokor noko nokre sia sidan so
+somt somme um upp vere vore verte vort varte vart
+""".split())
+
+# Same relative weights as ts_rank's defaults for A, B and C
+WEIGHTS = {"A": 1.0, "B": 0.4, "C": 0.2}
+
+WORD_RE = re.compile(r"[0-9a-zæøåéèüöä]+", re.IGNORECASE)
+
+
+def _r1(word: str) -> int:
+    """Start of region R1, adjusted so at least 3 letters precede it."""
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return max(i + 1, 3)
+    return len(word)
+
+
+def stem(word: str) -> str:
+    """Snowball Norwegian stemmer."""
+    word = word.lower()
+    r1 = _r1(word)
+    if r1 >= len(word):
+        return word
+
+    # Step 1
+    region = word[r1:]
+    for suffix in ("erte", "ert"):
+        if region.endswith(suffix):
+            word = word[: -len(suffix)] + "er"
+            break
+    else:
+        for suffix in STEP1_SUFFIXES:
+            if region.endswith(suffix):
+                word = word[: -len(suffix)]
+                break
+        else:
+            if region.endswith("s") and len(word) >= 2:
+                prev = word[-2]
+                if prev in VALID_S_ENDING or (
+                    prev == "k" and len(word) >= 3 and word[-3] not in VOWELS
+                ):
+                    word = word[:-1]
+
+    # Step 2
+    if word[r1:].endswith(("dt", "vt")):
+        word = word[:-1]
+
+    # Step 3
+    region = word[r1:]
+    for suffix in STEP3_SUFFIXES:
+        if region.endswith(suffix):
+            word = word[: -len(suffix)]
+            break
+    return word
+
+
+def tokenize(text: str) -> list:
+    return WORD_RE.findall((text or "").lower())
+
+
+def query_terms(query: str) -> list:
+    """Stemmed, de-duplicated query terms with stop words removed."""
+    terms = []
+    for token in tokenize(query):
+        if token in STOP_WORDS:
+            continue
+        term = stem(token)
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def rank(terms: list, weighted_texts: dict) -> float:
+    """
+    Scores a document given as {"A": text, "B": text, "C": text}.
+    Every term must occur somewhere (AND semantics); returns 0.0 otherwise.
+    """
+    if not terms:
+        return 0.0
+    score = 0.0
+    matched = set()
+    for weight, text in weighted_texts.items():
+        stems = [stem(t) for t in tokenize(text)]
+        for term in terms:
+            hits = stems.count(term)
+            if hits:
+                matched.add(term)
+                score += WEIGHTS[weight] * hits / (1 + len(stems) / 100)
+    if len(matched) < len(terms):
+        return 0.0
+    return score
+
+
+def headline(text: str, terms: list, max_words: int = 35) -> str:
+    """
+    Returns a window of the text around the first match with matched words
+    wrapped in <b></b>, like Postgres ts_headline. Text is HTML-escaped.
+    """
+    words = (text or "").split()
+    if not words:
+        return ""
+    is_hit = [stem(w) in terms for w in (
+        (tokenize(word) or [""])[0] for word in words
+    )]
+    first = is_hit.index(True) if True in is_hit else 0
+    start = max(0, first - max_words // 3)
+    window = range(start, min(len(words), start + max_words))
+    return " ".join(
+        f"<b>{html.escape(words[i])}</b>" if is_hit[i] else html.escape(words[i])
+        for i in window
+    )
@@ -0,0 +1,227 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import mimetypes
+from contextlib import contextmanager
+
+# Where uploaded and extracted files live. The database always stores
+# /static/<key> URLs; the backend decides where a key's bytes are kept:
+#   local - files under static/, served by the StaticFiles mount (development)
+#   s3    - objects in S3_BUCKET on any S3-compatible store: AWS S3, Google
+#           Cloud Storage (interoperability/HMAC keys, S3_ENDPOINT_URL=
+#           https://storage.googleapis.com) or MinIO for local testing.
+#           /static/<key> answers with a redirect to a presigned URL, or to
+#           STORAGE_PUBLIC_URL/<key> when a CDN or public bucket fronts it.
+# boto3 is only needed (and only imported) for the s3 backend.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STATIC_DIR = "static"
+URL_PREFIX = "/static/"
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION") or None
+S3_PREFIX = os.getenv("S3_PREFIX", "").strip("/")
+STORAGE_PUBLIC_URL = os.getenv("STORAGE_PUBLIC_URL", "").rstrip("/")
+SIGNED_URL_SECONDS = int(os.getenv("STORAGE_SIGNED_URL_SECONDS", "3600"))
+# Keys are content hashes or uuids and are never rewritten with other content
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def key_from_url(url: str):
+    """Storage key of a /static/... URL, or None for external URLs."""
+    if not url or not url.startswith(URL_PREFIX):
+        return None
+    return url[len(URL_PREFIX):]
+
+
+def url_for_key(key: str) -> str:
+    return URL_PREFIX + key
+
+
+def content_type(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+class LocalStorage:
+    """Files on the local disk, below root."""
+
+    def __init__(self, root: str = STATIC_DIR):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def staging_path(self, key: str) -> str:
+        # Next to the target, so put_file is a rename and never a copy
+        directory = os.path.dirname(self.path(key))
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def age(self, key: str):
+        """Seconds since the file was stored or touched, or None if it doesn't exist."""
+        try:
+            return time.time() - os.path.getmtime(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def touch(self, key: str):
+        os.utime(self.path(key))
+
+    def put_file(self, src_path: str, key: str):
+        """Moves src_path to key. Readers never see a half-written file."""
+        target = self.path(key)
+        if os.path.dirname(os.path.abspath(src_path)) != os.path.dirname(os.path.abspath(target)):
+            staged = self.staging_path(key)
+            shutil.move(src_path, staged)
+            src_path = staged
+        os.replace(src_path, target)
+
+    def put_bytes(self, data: bytes, key: str):
+        tmp_path = self.staging_path(key)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def list_keys(self, prefix: str):
+        """Keys of the stored files below prefix (unfinished uploads left out)."""
+        for root, _, names in os.walk(self.path(prefix)):
+            for name in names:
+                if not name.endswith(".tmp"):
+                    yield os.path.relpath(os.path.join(root, name), self.root).replace(os.sep, "/")
+
+    @contextmanager
+    def local_file(self, key: str):
+        yield self.path(key)
+
+    def download_url(self, key: str):
+        # Served by the StaticFiles mount, unless a CDN mirrors the directory
+        return f"{STORAGE_PUBLIC_URL}/{key}" if STORAGE_PUBLIC_URL else None
+
+
+class S3Storage:
+    """Objects in an S3-compatible bucket, keys optionally below prefix."""
+
+    def __init__(self, bucket: str = S3_BUCKET, endpoint_url: str = S3_ENDPOINT_URL,
+                 region: str = S3_REGION, prefix: str = S3_PREFIX):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+        if not bucket:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        self.bucket = bucket
+        self.prefix = f"{prefix}/" if prefix else ""
+        # Credentials come from the usual AWS_* variables / instance metadata
+        self.client = boto3.client(
+            "s3", endpoint_url=endpoint_url, region_name=region,
+            config=Config(signature_version="s3v4", retries={"max_attempts": 3, "mode": "standard"}),
+        )
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def _head(self, key: str):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def staging_path(self, key: str) -> str:
+        fd, path = tempfile.mkstemp(suffix=".tmp")
+        os.close(fd)
+        return path
+
+    def exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def age(self, key: str):
+        head = self._head(key)
+        if head is None:
+            return None
+        return time.time() - head["LastModified"].timestamp()
+
+    def touch(self, key: str):
+        # Copying an object onto itself resets LastModified without a download
+        self.client.copy_object(
+            Bucket=self.bucket, Key=self._key(key),
+            CopySource={"Bucket": self.bucket, "Key": self._key(key)},
+            MetadataDirective="REPLACE", ContentType=content_type(key),
+            CacheControl=IMMUTABLE_CACHE_CONTROL,
+        )
+
+    def put_file(self, src_path: str, key: str):
+        """Uploads src_path (multipart for large files) and removes it."""
+        try:
+            self.client.upload_file(src_path, self.bucket, self._key(key),
+                                    ExtraArgs={"ContentType": content_type(key),
+                                               "CacheControl": IMMUTABLE_CACHE_CONTROL})
+        finally:
+            try:
+                os.remove(src_path)
+            except OSError:
+                pass
+
+    def put_bytes(self, data: bytes, key: str):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data,
+                               ContentType=content_type(key), CacheControl=IMMUTABLE_CACHE_CONTROL)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def list_keys(self, prefix: str):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix.rstrip("/") + "/")):
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):]
+
+    @contextmanager
+    def local_file(self, key: str):
+        """Downloads the object to a temp file for the duration of the block."""
+        path = self.staging_path(key)
+        try:
+            self.client.download_file(self.bucket, self._key(key), path)
+            yield path
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def download_url(self, key: str) -> str:
+        if STORAGE_PUBLIC_URL:
+            return f"{STORAGE_PUBLIC_URL}/{self._key(key)}"
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=SIGNED_URL_SECONDS,
+        )
+
+
+# Lazy initialization, so importing this module never needs boto3 or network
+_storage = None
+
+
+def get_storage():
+    """Get or create the configured storage backend."""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "local":
+            _storage = LocalStorage()
+        elif STORAGE_BACKEND == "s3":
+            _storage = S3Storage()
+        else:
+            raise RuntimeError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _storage
@@ -0,0 +1,88 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+# Uploads are copied to disk in chunks and never read into memory whole;
+# parsers get a file path. Request bodies above MAX_UPLOAD_BYTES are rejected
+# with 413 before (Content-Length) or while (chunked) they are received.
+# Cloud Run caps HTTP/1 request bodies at 32 MB, hence the default.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "32")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def save_upload(fileobj, path: str, max_bytes: int = MAX_UPLOAD_BYTES) -> int:
+    """
+    Copies fileobj to path in chunks. Returns the number of bytes written.
+    Raises UploadTooLarge (and removes the partial file) past max_bytes.
+    """
+    written = 0
+    try:
+        with open(path, "wb") as buffer:
+            while chunk := fileobj.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLarge()
+                buffer.write(chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return written
+
+
+@contextmanager
+def upload_to_tempfile(fileobj, suffix: str = ".pdf"):
+    """Saves the upload to a named temp file and yields its path; the file is removed afterwards."""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        save_upload(fileobj, path)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class MaxBodySizeMiddleware:
+    """ASGI middleware that answers 413 for request bodies larger than max_bytes."""
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Early rejection: the client announced the size up front
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse({"detail": "File is too large"}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            # Chunked uploads: stop as soon as the limit is passed.
+            # FastAPI re-raises HTTPExceptions from body parsing as-is.
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail="File is too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
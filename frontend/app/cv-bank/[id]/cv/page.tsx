@@ -103,12 +103,35 @@ export default function CompleteCVPage() {
     const generateBioWithAI = async () => {
         setIsGeneratingBio(true);
         try {
-            const res = await fetch(`${API_URL}/employees/${employee.id}/generate-bio`, {
+            // Server-sent events: the text arrives in pieces as it is written
+            const res = await fetch(`${API_URL}/employees/${employee.id}/generate-bio/stream`, {
                 method: 'POST',
             });
-            const data = await res.json();
-            if (data.bio) {
-                setEditForm(prev => ({ ...prev, bio: data.bio }));
+            if (!res.ok || !res.body) {
+                throw new Error(`HTTP ${res.status}`);
+            }
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let bio = '';
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop() || '';
+                for (const event of events) {
+                    const lines = event.split('\n');
+                    const type = lines.find(line => line.startsWith('event: '))?.slice(7) || 'message';
+                    const data = JSON.parse(lines.find(line => line.startsWith('data: '))?.slice(6) || '{}');
+                    if (type === 'error') {
+                        throw new Error(data.detail);
+                    }
+                    if (data.delta) {
+                        bio += data.delta;
+                        setEditForm(prev => ({ ...prev, bio }));
+                    }
+                }
             }
         } catch (err) {
             console.error("Failed to generate bio", err);
@@ -5,7 +5,8 @@ import Link from 'next/link';
 import { PlusIcon, MapPinIcon, CalendarIcon, BuildingOfficeIcon } from '@heroicons/react/24/outline';
 import FilterBar from '../components/FilterBar';
 import ThemeToggle from '../components/ThemeToggle';
-import { API_URL, getStaticUrl } from '../lib/api';
+import ResponsiveImage from '../components/ResponsiveImage';
+import { API_URL, ImageSrcset } from '../lib/api';
 
 interface Project {
   id: number;
@@ -14,43 +15,44 @@ interface Project {
   location: string;
   time_frame: string;
   image_url: string;
-  images?: { url: string }[];
+  first_image?: string | null;
+  first_image_srcset?: ImageSrcset | null;
   contract_type?: string;
   tags?: string[];
 }
 
 export default function Home() {
   const [projects, setProjects] = useState<Project[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [activeFilter, setActiveFilter] = useState('');
 
-  useEffect(() => {
-    fetch(`${API_URL}/projects/`)
+  // Filtering and paging happen on the server; the response carries a
+  // next_cursor for the following page (null on the last page).
+  const fetchPage = (cursor: string | null) => {
+    const params = new URLSearchParams();
+    if (activeFilter) params.set('tag', activeFilter);
+    if (cursor) params.set('cursor', cursor);
+    return fetch(`${API_URL}/projects/summary?${params.toString()}`)
       .then((res) => res.json())
       .then((data) => {
-        setProjects(data);
-        setLoading(false);
+        setProjects((prev) => (cursor ? [...prev, ...data.items] : data.items));
+        setNextCursor(data.next_cursor);
       })
-      .catch((err) => {
-        console.error('Failed to fetch projects', err);
-        setLoading(false);
-      });
-  }, []);
-
-  // Filter Logic
-  // Filter Logic
-  const filteredProjects = projects.filter((project) => {
-    if (!activeFilter) return true;
+      .catch((err) => console.error('Failed to fetch projects', err));
+  };
 
-    // Filter by TAGS
-    // We check if the project has the active filter in its tags list
-    // The tags from backend are strings, e.g. ["Barnehage", "Offentlig"]
-    if (project.tags && Array.isArray(project.tags)) {
-      return project.tags.includes(activeFilter);
-    }
+  useEffect(() => {
+    fetchPage(null).finally(() => setLoading(false));
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [activeFilter]);
 
-    return false;
-  });
+  const loadMore = () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    fetchPage(nextCursor).finally(() => setLoadingMore(false));
+  };
 
   if (loading) return <div className="text-center mt-10">Laster prosjekter...</div>;
 
@@ -73,13 +75,15 @@ export default function Home() {
       <FilterBar activeFilter={activeFilter} onFilterChange={setActiveFilter} />
 
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-        {filteredProjects.map((project) => (
+        {projects.map((project) => (
           <div key={project.id} className="bg-white dark:bg-gray-800 rounded-lg shadow-md overflow-hidden border border-gray-100 dark:border-gray-700 hover:shadow-lg transition-shadow">
             {/* Placeholder image if no image_url */}
             <div className="h-48 bg-gray-200 dark:bg-gray-700 w-full object-cover flex items-center justify-center text-gray-500 dark:text-gray-400 overflow-hidden">
-              {(project.images && project.images.length > 0) ? (
-                <img
-                  src={getStaticUrl(project.images[0].url)}
+              {project.first_image ? (
+                <ResponsiveImage
+                  src={project.first_image}
+                  srcset={project.first_image_srcset}
+                  sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
                   alt={project.name}
                   className="h-full w-full object-cover"
                 />
@@ -122,12 +126,24 @@ export default function Home() {
           </div>
         ))}
 
-        {filteredProjects.length === 0 && (
+        {projects.length === 0 && (
           <div className="col-span-full text-center py-10 text-gray-500 dark:text-gray-400 bg-gray-50 dark:bg-gray-800 rounded border border-dashed border-gray-300 dark:border-gray-600">
             Ingen prosjekter funnet for dette filteret.
           </div>
         )}
       </div>
+
+      {nextCursor && (
+        <div className="flex justify-center mt-8">
+          <button
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="border border-omf-cyan text-omf-cyan px-6 py-2 rounded-sm font-semibold uppercase text-sm tracking-wide hover:bg-omf-cyan hover:text-white transition-colors disabled:opacity-50"
+          >
+            {loadingMore ? 'Laster...' : 'Vis flere prosjekter'}
+          </button>
+        </div>
+      )}
     </div>
   );
 }
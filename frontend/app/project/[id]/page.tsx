@@ -1,5 +1,5 @@
 'use client';
-import { API_URL, getStaticUrl } from '@/lib/api';
+import { API_URL, getStaticUrl, getLargestJpegVariant } from '@/lib/api';
 
 import { useEffect, useState, useMemo } from 'react';
 import { useParams, useRouter } from 'next/navigation';
@@ -8,6 +8,7 @@ import dynamic from 'next/dynamic';
 import { PencilSquareIcon, EyeIcon } from '@heroicons/react/24/outline';
 import { ProjectPDF } from '../../../components/ProjectPDF';
 import { PDFPreviewModal } from '../../../components/PDFPreviewModal';
+import ResponsiveImage from '../../../components/ResponsiveImage';
 
 // Removed PDFDownloadLink dynamic import in favor of manual handling
 
@@ -142,7 +143,9 @@ export default function ProjectDetailPage() {
             const loadImages = async () => {
                 // Logic matches the web view: prioritize image_url, fallback to images[0]
                 const mainUrl = project.image_url || (project.images && project.images.length > 0 ? project.images[0].url : null);
-                const galleryUrls = project.images?.map((img: any) => img.url) || [];
+                // The largest JPEG variant is plenty for print and much lighter than
+                // the original (react-pdf can't render WebP or TIFF)
+                const galleryUrls = project.images?.map((img: any) => getLargestJpegVariant(img.srcset) || img.url) || [];
 
                 // Fetch the main image (which might be the same as the first gallery image)
                 const mainBase64 = mainUrl ? await fetchImageAsBase64(mainUrl) : null;
@@ -264,8 +267,10 @@ export default function ProjectDetailPage() {
                     {/* Image - Natural Aspect Ratio */}
                     <div className="bg-gray-100 rounded overflow-hidden relative group min-h-[200px]">
                         {(project.images && project.images.length > 0) ? (
-                            <img
-                                src={resolveImageUrl(project.images[activeImageIndex]?.url || project.images[0].url)}
+                            <ResponsiveImage
+                                src={(project.images[activeImageIndex] || project.images[0]).url}
+                                srcset={(project.images[activeImageIndex] || project.images[0]).srcset}
+                                sizes="(min-width: 1024px) 66vw, 100vw"
                                 alt={project.name}
                                 className="w-full h-auto object-contain max-h-[800px]"
                             />
@@ -286,8 +291,11 @@ export default function ProjectDetailPage() {
                                             onClick={(e) => { e.stopPropagation(); setActiveImageIndex(idx); }}
                                             className={`w-16 h-10 border-2 rounded overflow-hidden shadow transition-transform hover:scale-105 ${activeImageIndex === idx ? 'border-omf-cyan' : 'border-white'}`}
                                         >
-                                            <img
-                                                src={resolveImageUrl(img.url)}
+                                            <ResponsiveImage
+                                                src={img.url}
+                                                srcset={img.srcset}
+                                                sizes="64px"
+                                                alt=""
                                                 className="w-full h-full object-cover"
                                             />
                                         </button>
@@ -41,6 +41,9 @@ export default function CVIngestionModal({ isOpen, onClose, onSuccess }: CVInges
                 body: formData,
             });
 
+            if (response.status === 413) {
+                throw new Error('CV-en er for stor.');
+            }
             if (!response.ok) {
                 throw new Error('Kunne ikke tolke CV-en. Sjekk at det er en gyldig PDF.');
             }
@@ -184,6 +187,12 @@ export default function CVIngestionModal({ isOpen, onClose, onSuccess }: CVInges
                                         ))}
                                     </div>
                                 </div>
+
+                                {parsedData.dropped?.length > 0 && (
+                                    <p className="text-xs text-gray-500 dark:text-gray-400">
+                                        {parsedData.dropped.length} oppføring(er) uten navn, firma eller grad ble utelatt.
+                                    </p>
+                                )}
                             </div>
 
                             <div className="flex gap-4 pt-4 border-t border-gray-100 dark:border-gray-800">
@@ -188,15 +188,26 @@ export default function ProjectForm({ initialData, isEdit = false }: ProjectForm
         body.append('file', file);
 
         try {
-            // 1. Parse PDF
+            // 1. Parse PDF (runs as a background job on the server)
             const res = await fetch(`${API_URL}/api/upload`, {
                 method: 'POST',
                 body: body
             });
 
+            if (res.status === 413) throw new Error("PDF-en er for stor.");
+            if (res.status === 429) throw new Error("Serveren er opptatt med andre PDF-er. Prøv igjen om litt.");
             if (!res.ok) throw new Error("Parsing failed");
 
-            const data = await res.json();
+            let job = await res.json();
+            while (job.status !== 'done' && job.status !== 'failed') {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                const jobRes = await fetch(`${API_URL}/api/jobs/${job.id}`);
+                if (!jobRes.ok) throw new Error("Parsing failed");
+                job = await jobRes.json();
+            }
+            if (job.status === 'failed') throw new Error(job.error || "Parsing failed");
+
+            const data = job.result;
 
             // 2. Prepare Payload (Use parsed data + defaults + filename fallback)
             const projectPayload = {
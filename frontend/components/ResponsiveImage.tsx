@@ -0,0 +1,22 @@
+import { getStaticSrcSet, getStaticUrl, ImageSrcset } from '../lib/api';
+
+interface ResponsiveImageProps {
+    src: string;
+    srcset?: ImageSrcset | null;
+    sizes: string;
+    alt: string;
+    className?: string;
+}
+
+// <picture> that lets the browser pick a WebP/JPEG variant matching the
+// rendered size. Falls back to the original while variants are missing.
+export default function ResponsiveImage({ src, srcset, sizes, alt, className }: ResponsiveImageProps) {
+    return (
+        <picture className="contents">
+            {srcset && Object.entries(srcset).map(([type, set]) => (
+                <source key={type} type={type} srcSet={getStaticSrcSet(set)} sizes={sizes} />
+            ))}
+            <img src={getStaticUrl(src)} alt={alt} className={className} loading="lazy" />
+        </picture>
+    );
+}
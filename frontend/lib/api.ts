@@ -19,3 +19,20 @@ export const getStaticUrl = (path: string): string => {
     }
     return `${API_URL}${path}`;
 };
+
+// Downscaled variants of an uploaded image, keyed by MIME type:
+// { "image/webp": "/static/..._320w.webp 320w, ...", "image/jpeg": "..." }
+export type ImageSrcset = Record<string, string>;
+
+// Prefixes every URL in a srcset string with the API origin
+export const getStaticSrcSet = (srcset: string): string =>
+    srcset.split(', ').map((entry) => getStaticUrl(entry)).join(', ');
+
+// Largest JPEG variant (react-pdf can't render WebP), or null without variants.
+// The set ends with the original, which is skipped: it may be huge, or not a JPEG.
+export const getLargestJpegVariant = (srcset?: ImageSrcset | null): string | null => {
+    const urls = (srcset?.['image/jpeg']?.split(', ') || [])
+        .map((entry) => entry.split(' ')[0])
+        .filter((url) => /_\d+w\.jpg$/.test(url));
+    return urls.length > 0 ? urls[urls.length - 1] : null;
+};